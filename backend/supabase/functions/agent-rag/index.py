@@ -9,7 +9,8 @@ from supabase import create_client
 
 # Adiciona o diretório shared ao path para importar o detector de keywords
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-from keywords_detector import KeywordDetector, filter_chunks_by_query
+from keywords_detector import KeywordDetector, filter_chunks_by_query, get_chunk_keywords_cache
+from context_packer import CONTEXT_SEPARATOR, default_token_budget, pack_context
 
 class RAGRequest(BaseModel):
     message: str
@@ -49,6 +50,7 @@ def generate_rag_response(context: List[str], query: str, user_role: str) -> RAG
         # Aplica detecção de keywords para filtrar contexto mais relevante
         try:
             keyword_filtered_context = filter_chunks_by_query(filtered_context, query)
+            print(f"Keywords cache stats: {get_chunk_keywords_cache().stats()}")
             if keyword_filtered_context:
                 print(f"Keywords filtering reduced context from {len(filtered_context)} to {len(keyword_filtered_context)} chunks")
                 filtered_context = keyword_filtered_context
@@ -93,7 +95,16 @@ def generate_rag_response(context: List[str], query: str, user_role: str) -> RAG
         7. Para referências legais, sempre mencione o número completo da lei/decreto quando disponível
         8. Para termos técnicos, forneça definições claras baseadas no contexto dos documentos"""
 
-        combined_context = "\n\n===\n\n".join(filtered_context)
+        # Limita o contexto ao orçamento de tokens, sem chunks repetidos (a ordem recebida é a relevância)
+        packed = pack_context(
+            [(chunk, -rank) for rank, chunk in enumerate(filtered_context)],
+            default_token_budget()
+        )
+        print(f"Context packed: {len(packed.chunks)}/{len(filtered_context)} chunks, {packed.tokens} tokens "
+              f"({packed.duplicates_dropped} duplicates, {packed.over_budget_dropped} over budget)")
+        filtered_context = packed.chunks
+
+        combined_context = CONTEXT_SEPARATOR.join(filtered_context)
         print(f"Combined context length: {len(combined_context)}")
         print(f"Combined context preview: {combined_context[:200]}...")
 
@@ -1,11 +1,13 @@
 import fitz  # PyMuPDF for PDF processing
+import hashlib
 import json
 import os
 import sys
 import re
 import asyncio
-from typing import Dict, Any, Optional, List, Union
-from dataclasses import dataclass
+from collections import deque
+from typing import Deque, Dict, Any, Iterable, Iterator, Optional, List, Tuple, Union
+from dataclasses import dataclass, replace
 from supabase import create_client
 from openai import AsyncOpenAI
 from docx import Document as DocxDocument
@@ -17,12 +19,56 @@ from io import BytesIO
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
 
 try:
-    from keywords_detector import KeywordDetector, enhance_chunks_with_keywords
+    from keywords_detector import KeywordDetector, KeywordsSummaryAccumulator, serialize_chunk_keywords
     KEYWORDS_AVAILABLE = True
 except ImportError:
     print("Warning: Keywords detector not available, continuing without keyword enhancement")
     KEYWORDS_AVAILABLE = False
 
+try:
+    from bm25_index import update_bm25_snapshot
+    BM25_AVAILABLE = True
+except ImportError:
+    print("Warning: BM25 index not available, continuing without local keyword index")
+    BM25_AVAILABLE = False
+
+try:
+    from reference_index import update_reference_snapshot
+    REFERENCE_INDEX_AVAILABLE = True
+except ImportError:
+    REFERENCE_INDEX_AVAILABLE = False
+
+try:
+    from vector_index import VectorIndex, update_vector_snapshot
+    VECTOR_INDEX_AVAILABLE = True
+except ImportError:
+    VECTOR_INDEX_AVAILABLE = False
+
+try:
+    from search_cache import bump_document_version
+    SEARCH_CACHE_AVAILABLE = True
+except ImportError:
+    SEARCH_CACHE_AVAILABLE = False
+
+from bulk_writer import BulkInsertWriter
+from pipeline import PIPELINE_END, bounded_queue, drain, run_stages
+from pdf_extraction import extract_page_range, page_range_tasks, page_texts
+from process_pool import map_in_pool, process_pool_size
+from storage_backend import get_storage_backend
+
+try:
+    from context_packer import count_tokens
+except ImportError:
+    def count_tokens(text: str) -> int:
+        # Estimativa conservadora para português, sem tokenizador
+        return len(text) // 3 + 1
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Os snapshots dos índices locais são lidos, alterados e regravados inteiros;
+# documentos processados ao mesmo tempo os atualizam um de cada vez
+LOCAL_INDEX_SNAPSHOT_LOCK = asyncio.Lock()
+
 @dataclass
 class Document:
     id: str
@@ -125,7 +171,177 @@ class TextProcessor:
 
         return [chunk for chunk in chunks if chunk.strip()]
 
+    @staticmethod
+    def iter_paragraphs(text: str, separator: str = "\n\n") -> Iterator[str]:
+        """Partes do texto separadas por `separator` (as páginas de um PDF extraído), sem copiar o texto inteiro."""
+        start = 0
+        while True:
+            end = text.find(separator, start)
+            if end == -1:
+                yield text[start:]
+                return
+            yield text[start:end]
+            start = end + len(separator)
+
+class StreamingChunker:
+    """
+    Versão incremental de TextProcessor.chunk_text.
+    
+    Recebe o texto em partes (páginas, parágrafos) com `feed` e devolve os
+    chunks assim que ficam completos; `finish` devolve os restantes. Os
+    chunks são os mesmos de chunk_text sobre as partes juntas, mas só a
+    sentença em andamento e o chunk em montagem ficam em memória.
+    """
+
+    def __init__(self, max_chunk_size: int = 1000):
+        self.max_chunk_size = max_chunk_size
+        # Enquanto o texto cabe num chunk ele é guardado inteiro (chunk_text não o divide)
+        self._short_text: Optional[str] = ""
+        # Sentença ainda sem fim confirmado e chunk em montagem
+        self._tail = ""
+        self._current: List[str] = []
+        self._current_length = 0
+        # Chunk de palavras em montagem quando a sentença atual é longa demais
+        self._long_words: Optional[List[str]] = None
+        self._long_length = 0
+        self._ready: List[str] = []
+
+    def feed(self, text: str) -> List[str]:
+        """Adiciona uma parte do texto e retorna os chunks que ficaram completos."""
+        cleaned = TextProcessor.clean_text(text)
+        if not cleaned:
+            return []
+        
+        if self._short_text is not None:
+            self._short_text = f"{self._short_text} {cleaned}" if self._short_text else cleaned
+            if len(self._short_text) <= self.max_chunk_size:
+                return []
+            cleaned, self._short_text = self._short_text, None
+        
+        # A última sentença pode continuar na próxima parte
+        self._tail = f"{self._tail} {cleaned}" if self._tail else cleaned
+        sentences = TextProcessor.split_into_sentences(self._tail)
+        self._tail = sentences.pop()
+        for sentence in sentences:
+            self._add_sentence(sentence)
+        
+        # Sentença em andamento já longa demais: será dividida por palavras,
+        # então as anteriores à última (que pode fechar a sentença) já podem sair
+        if len(self._tail) > self.max_chunk_size:
+            words = self._tail.split()
+            self._add_long_words(words[:-1])
+            self._tail = words[-1]
+        
+        return self._take_ready()
+
+    def finish(self) -> List[str]:
+        """Retorna os chunks restantes ao fim do texto."""
+        if self._short_text is not None:
+            text, self._short_text = self._short_text, None
+            return [text] if text else []
+        
+        if self._tail:
+            self._add_sentence(self._tail)
+            self._tail = ""
+        if self._current:
+            self._ready.append(' '.join(self._current))
+            self._current = []
+            self._current_length = 0
+        return self._take_ready()
+
+    def _take_ready(self) -> List[str]:
+        ready, self._ready = self._ready, []
+        return [chunk for chunk in ready if chunk.strip()]
+
+    def _add_sentence(self, sentence: str) -> None:
+        sentence_length = len(sentence)
+        
+        # Se uma sentença for muito longa (ou já começou a ser dividida), divide ela
+        if self._long_words is not None or sentence_length > self.max_chunk_size:
+            self._add_long_words(sentence.split())
+            if self._long_words:
+                self._ready.append(' '.join(self._long_words))
+            self._long_words = None
+            self._long_length = 0
+            return
+        
+        # Verifica se adicionar esta sentença excede o limite
+        if self._current_length + sentence_length + 1 > self.max_chunk_size:
+            if self._current:
+                self._ready.append(' '.join(self._current))
+                self._current = []
+                self._current_length = 0
+        
+        self._current.append(sentence)
+        self._current_length += sentence_length + 1
+
+    def _add_long_words(self, words: List[str]) -> None:
+        if self._long_words is None:
+            # Salva chunk atual se existir
+            if self._current:
+                self._ready.append(' '.join(self._current))
+                self._current = []
+                self._current_length = 0
+            self._long_words = []
+            self._long_length = 0
+        
+        for word in words:
+            word_length = len(word)
+            if self._long_length + word_length + 1 > self.max_chunk_size:
+                if self._long_words:
+                    self._ready.append(' '.join(self._long_words))
+                    self._long_words = []
+                    self._long_length = 0
+            
+            self._long_words.append(word)
+            self._long_length += word_length + 1
+
 class PDFProcessor:
+    @staticmethod
+    def clean_page_texts(texts: Iterable[str]) -> List[str]:
+        """Texto limpo das páginas com conteúdo, na ordem recebida."""
+        extracted_text = []
+        for text in texts:
+            if text.strip():
+                # Limpa e processa o texto da página
+                cleaned_text = TextProcessor.clean_text(text)
+                if cleaned_text:
+                    extracted_text.append(cleaned_text)
+        return extracted_text
+
+    @staticmethod
+    def extract_page_texts(pdf, start: int, end: int) -> List[str]:
+        """Texto limpo das páginas [start, end) com conteúdo, na ordem do documento."""
+        return PDFProcessor.clean_page_texts(page_texts(pdf, start, end))
+
+    @staticmethod
+    async def extract_pages(pdf_bytes: bytes) -> List[str]:
+        """
+        Extrai o texto das páginas de um PDF em memória.
+        
+        PDFs com ao menos PDF_PARALLEL_MIN_PAGES páginas têm faixas de páginas
+        extraídas no pool de processos compartilhado da ingestão, usando até
+        PDF_EXTRACTION_WORKERS processos (0 = o pool inteiro, limitado por
+        INGESTION_PROCESS_WORKERS; 1 = serial). As faixas são remontadas na
+        ordem original e limpas aqui.
+        """
+        workers = int(os.environ.get("PDF_EXTRACTION_WORKERS", "0"))
+        min_pages = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "50"))
+        pool_size = process_pool_size()
+        workers = pool_size if workers <= 0 else min(workers, pool_size)
+        
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf:
+            page_count = pdf.page_count
+            print(f"Processing PDF with {page_count} pages")
+            
+            if workers <= 1 or page_count < min_pages:
+                return PDFProcessor.extract_page_texts(pdf, 0, page_count)
+        
+        # Algumas faixas por processo, para equilibrar páginas de tamanhos diferentes
+        tasks = page_range_tasks(pdf_bytes, page_count, workers * 2)
+        range_texts = await asyncio.to_thread(map_in_pool, extract_page_range, tasks, workers)
+        return PDFProcessor.clean_page_texts(text for texts in range_texts for text in texts)
+
     @staticmethod
     async def extract_content(storage_client, file_path: str) -> str:
         """Extrai o conteúdo do PDF mantendo a estrutura do texto."""
@@ -136,32 +352,8 @@ class PDFProcessor:
             if not response.data:
                 raise Exception("Failed to download PDF file")
 
-            # Salva temporariamente o arquivo
-            temp_path = f"/tmp/{os.path.basename(file_path)}"
-            with open(temp_path, "wb") as f:
-                f.write(response.data)
-
-            extracted_text = []
-            
-            # Processa o PDF usando PyMuPDF
-            with fitz.open(temp_path) as pdf:
-                print(f"Processing PDF with {pdf.page_count} pages")
-                
-                for page_num in range(pdf.page_count):
-                    page = pdf[page_num]
-                    
-                    # Extrai texto preservando formatação
-                    text = page.get_text()
-                    
-                    if text.strip():
-                        # Limpa e processa o texto da página
-                        cleaned_text = TextProcessor.clean_text(text)
-                        if cleaned_text:
-                            extracted_text.append(cleaned_text)
-
-            # Remove arquivo temporário
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            # Processa o PDF diretamente da memória, sem arquivo temporário
+            extracted_text = await PDFProcessor.extract_pages(response.data)
             
             full_text = '\n\n'.join(extracted_text)
             print(f"Extracted {len(full_text)} characters from PDF")
@@ -358,110 +550,484 @@ class EmbeddingGenerator:
             self.keyword_detector = KeywordDetector()
         else:
             self.keyword_detector = None
+        # Versão das regras de detecção gravada com cada chunk (reaproveitamento só na mesma versão)
+        self.keywords_version = self.keyword_detector.patterns_version() if self.keyword_detector else None
+        
+        # Paralelismo da detecção de keywords no pool compartilhado (documentos pequenos continuam seriais)
+        self.keyword_workers = int(os.environ.get("KEYWORDS_DETECTION_WORKERS", "0"))
+        self.keyword_batch_size = int(os.environ.get("KEYWORDS_DETECTION_BATCH_SIZE", "250"))
+        
+        # Requisições de embeddings com vários chunks, limitadas por quantidade e por tokens
+        self.embedding_batch_size = int(os.environ.get("EMBEDDING_BATCH_SIZE", "100"))
+        self.embedding_batch_max_tokens = int(os.environ.get("EMBEDDING_BATCH_MAX_TOKENS", "50000"))
+        self.embedding_concurrency = int(os.environ.get("EMBEDDING_CONCURRENCY", "4"))
+        
+        # Inserção em lote dos chunks, com retentativas por lote
+        self.insert_batch_size = int(os.environ.get("EMBEDDINGS_INSERT_BATCH_SIZE", "200"))
+        self.insert_max_retries = int(os.environ.get("EMBEDDINGS_INSERT_MAX_RETRIES", "2"))
+        
+        # Itens em cada fila entre os estágios da ingestão (limita a memória por documento)
+        self.pipeline_queue_size = int(os.environ.get("INGESTION_QUEUE_SIZE", "256"))
+
+    @staticmethod
+    def content_hash(chunk_text: str) -> str:
+        """Hash do conteúdo de um chunk, usado para detectar chunks inalterados."""
+        return hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()
+
+    def reuse_key(self, chunk_text: str, keywords_version: Optional[str]) -> Tuple[str, Optional[str]]:
+        """
+        Chave de reaproveitamento de um chunk: hash do conteúdo e versão das
+        regras de keywords. Chunks gravados com outras regras (ou antes de a
+        versão ser gravada) não casam com a do detector atual e são reprocessados.
+        """
+        return self.content_hash(chunk_text), keywords_version
+
+    async def _load_stored_chunks(self, document_id: str,
+                                  page_size: int = 1000) -> Dict[Tuple[str, Optional[str]], List[Dict]]:
+        """Carrega os chunks já armazenados do documento, agrupados pela chave de reaproveitamento."""
+        stored: Dict[Tuple[str, Optional[str]], List[Dict]] = {}
+        start = 0
+        
+        while True:
+            response = await self.supabase_client.table("document_embeddings")\
+                .select("id, chunk_index, content_chunk, keywords, priority_score, has_composite_keywords, "
+                        "legal_references_count, keywords_version")\
+                .eq("document_id", document_id)\
+                .order("chunk_index")\
+                .range(start, start + page_size - 1)\
+                .execute()
+            
+            rows = response.data or []
+            for row in rows:
+                key = self.reuse_key(row["content_chunk"], row.get("keywords_version"))
+                stored.setdefault(key, []).append(row)
+            
+            if len(rows) < page_size:
+                return stored
+            start += page_size
+
+    @staticmethod
+    def _indexed_row(chunk_text: str, chunk_index: int, enhanced_chunk: Dict) -> Dict:
+        """Linha dos índices locais (BM25 e referências), com as mesmas colunas lidas pela busca."""
+        return {
+            "content_chunk": chunk_text,
+            "chunk_index": chunk_index,
+            "keywords": enhanced_chunk.get("keywords", []),
+            "priority_score": enhanced_chunk.get("priority_score", 1.0),
+            "has_composite_keywords": enhanced_chunk.get("has_composite_keywords", False),
+            "legal_references_count": enhanced_chunk.get("legal_references_count", 0)
+        }
+
+    async def _embed_batch(self, batch: List[Tuple[int, str]],
+                           semaphore: asyncio.Semaphore) -> Dict[int, List[float]]:
+        async with semaphore:
+            response = await self.openai_client.embeddings.create(
+                input=[text for _, text in batch],
+                model=EMBEDDING_MODEL
+            )
+        
+        # Cada item da resposta traz a posição do input correspondente
+        embeddings = {}
+        for item in response.data:
+            embedding = item.embedding
+            if not isinstance(embedding, list) or not all(isinstance(x, (int, float)) for x in embedding):
+                raise ValueError("Invalid embedding format")
+            embeddings[batch[item.index][0]] = embedding
+        
+        if len(embeddings) != len(batch):
+            raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+        return embeddings
+
+    async def embed_chunks(self, items: List[Tuple[int, str]]) -> Tuple[Dict[int, List[float]], Dict[int, str]]:
+        """
+        Gera embeddings para pares (chunk_index, texto) pelo mesmo estágio da
+        ingestão (_embedding_stage): lotes limitados por quantidade e por
+        tokens, com até embedding_concurrency requisições simultâneas.
+        
+        Retorna (embeddings por chunk_index, erro por chunk_index), na ordem
+        dos itens; um lote que falha marca só os seus chunks como erro. Textos
+        curtos demais (menos de 10 caracteres) não geram embedding.
+        """
+        inbox = bounded_queue(self.pipeline_queue_size)
+        outbox = bounded_queue(self.pipeline_queue_size)
+        embeddings: Dict[int, List[float]] = {}
+        errors: Dict[int, str] = {}
+        
+        async def feed() -> None:
+            for chunk_index, text in items:
+                await inbox.put((chunk_index, {"text": text}, None))
+            await inbox.put(PIPELINE_END)
+        
+        async def collect() -> None:
+            async for chunk_index, _, _, embedding, error in drain(outbox):
+                if error is not None:
+                    errors[chunk_index] = error
+                elif embedding is not None:
+                    embeddings[chunk_index] = embedding
+        
+        await run_stages(feed(), self._embedding_stage(inbox, outbox), collect())
+        return embeddings, errors
+
+    async def _chunk_stage(self, content: str, outbox: asyncio.Queue) -> int:
+        """Divide o conteúdo em chunks página a página (parágrafo a parágrafo) e os envia numerados."""
+        chunker = StreamingChunker(max_chunk_size=1000)
+        chunk_count = 0
+        
+        for paragraph in TextProcessor.iter_paragraphs(content):
+            for chunk in chunker.feed(paragraph):
+                await outbox.put((chunk_count, chunk))
+                chunk_count += 1
+        for chunk in chunker.finish():
+            await outbox.put((chunk_count, chunk))
+            chunk_count += 1
+        
+        await outbox.put(PIPELINE_END)
+        print(f"Generated {chunk_count} chunks for processing")
+        return chunk_count
+
+    async def _enhance_group(self, group: List[Tuple[int, str]], outbox: asyncio.Queue,
+                             stored_chunks: Dict[Tuple[str, Optional[str]], List[Dict]],
+                             summary_accumulator: Optional["KeywordsSummaryAccumulator"]) -> int:
+        """Keywords de um grupo de chunks: reaproveitadas dos inalterados, detectadas nos demais."""
+        reused_rows: Dict[int, Dict] = {}
+        changed: List[Tuple[int, str]] = []
+        for chunk_index, chunk in group:
+            rows = stored_chunks.get(self.reuse_key(chunk, self.keywords_version))
+            if rows:
+                reused_rows[chunk_index] = rows.pop(0)
+            else:
+                changed.append((chunk_index, chunk))
+        
+        # Detecção fora do event loop, para não travar os estágios de embeddings e gravação
+        detected = {}
+        if summary_accumulator is not None and changed:
+            changed_keywords = await asyncio.to_thread(
+                self.keyword_detector.process_document_chunks,
+                [chunk for _, chunk in changed],
+                workers=self.keyword_workers,
+                batch_size=self.keyword_batch_size
+            )
+            detected = {
+                chunk_index: replace(chunk_keywords, chunk_index=chunk_index)
+                for (chunk_index, _), chunk_keywords in zip(changed, changed_keywords)
+            }
+        
+        for chunk_index, chunk in group:
+            row = reused_rows.get(chunk_index)
+            if row:
+                enhanced_chunk = {
+                    "text": chunk,
+                    "index": chunk_index,
+                    "keywords": row.get("keywords") or [],
+                    "priority_score": row.get("priority_score", 0.0),
+                    "has_composite_keywords": row.get("has_composite_keywords", False),
+                    "legal_references_count": row.get("legal_references_count", 0)
+                }
+                if summary_accumulator is not None:
+                    summary_accumulator.add_serialized(enhanced_chunk)
+            elif chunk_index in detected:
+                summary_accumulator.add(detected[chunk_index])
+                enhanced_chunk = serialize_chunk_keywords([detected[chunk_index]])[0]
+            else:
+                # Fallback sem keyword enhancement
+                enhanced_chunk = {
+                    "text": chunk,
+                    "keywords": [],
+                    "priority_score": 1.0,
+                    "has_composite_keywords": False,
+                    "legal_references_count": 0
+                }
+            await outbox.put((chunk_index, enhanced_chunk, row))
+        
+        return len(reused_rows)
+
+    async def _keyword_stage(self, inbox: asyncio.Queue, outbox: asyncio.Queue,
+                             stored_chunks: Dict[Tuple[str, Optional[str]], List[Dict]],
+                             summary_accumulator: Optional["KeywordsSummaryAccumulator"]) -> int:
+        """Enriquece os chunks com keywords em grupos que ocupam todos os processos de detecção."""
+        pool_size = process_pool_size()
+        workers = pool_size if self.keyword_workers <= 0 else min(self.keyword_workers, pool_size)
+        group_size = max(1, self.keyword_batch_size) * workers
+        reused_chunks = 0
+        group: List[Tuple[int, str]] = []
+        
+        async for item in drain(inbox):
+            group.append(item)
+            if len(group) >= group_size:
+                reused_chunks += await self._enhance_group(group, outbox, stored_chunks, summary_accumulator)
+                group = []
+        if group:
+            reused_chunks += await self._enhance_group(group, outbox, stored_chunks, summary_accumulator)
+        
+        await outbox.put(PIPELINE_END)
+        return reused_chunks
+
+    async def _embedding_stage(self, inbox: asyncio.Queue, outbox: asyncio.Queue) -> int:
+        """
+        Agrupa os chunks novos/alterados em lotes de embeddings, com até
+        embedding_concurrency requisições em andamento; chunks reaproveitados
+        ou curtos demais seguem direto para a gravação.
+        """
+        concurrency = max(1, self.embedding_concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        in_flight: Deque[Tuple[List[Tuple[int, Dict, Optional[Dict]]], asyncio.Task]] = deque()
+        batch: List[Tuple[int, Dict, Optional[Dict]]] = []
+        batch_tokens = 0
+        requests = 0
+        
+        async def emit_oldest() -> None:
+            items, task = in_flight.popleft()
+            try:
+                embeddings, error = await task, None
+            except Exception as e:
+                # Um lote que falha marca só os seus chunks como erro
+                print(f"Error generating embeddings for batch of {len(items)} chunks: {str(e)}")
+                embeddings, error = {}, str(e)
+            for chunk_index, enhanced_chunk, row in items:
+                await outbox.put((chunk_index, enhanced_chunk, row, embeddings.get(chunk_index), error))
+        
+        async def submit(items: List[Tuple[int, Dict, Optional[Dict]]]) -> None:
+            task = asyncio.create_task(self._embed_batch(
+                [(chunk_index, enhanced_chunk["text"]) for chunk_index, enhanced_chunk, _ in items],
+                semaphore
+            ))
+            in_flight.append((items, task))
+            while len(in_flight) > concurrency:
+                await emit_oldest()
+        
+        try:
+            async for chunk_index, enhanced_chunk, row in drain(inbox):
+                text = enhanced_chunk["text"]
+                if row or not text or len(text.strip()) < 10:
+                    await outbox.put((chunk_index, enhanced_chunk, row, None, None))
+                    continue
+                
+                tokens = count_tokens(text)
+                if batch and (len(batch) >= self.embedding_batch_size
+                              or batch_tokens + tokens > self.embedding_batch_max_tokens):
+                    await submit(batch)
+                    requests += 1
+                    batch = []
+                    batch_tokens = 0
+                batch.append((chunk_index, enhanced_chunk, row))
+                batch_tokens += tokens
+            
+            if batch:
+                await submit(batch)
+                requests += 1
+            while in_flight:
+                await emit_oldest()
+        finally:
+            for _, task in in_flight:
+                task.cancel()
+        
+        await outbox.put(PIPELINE_END)
+        print(f"Generated embeddings in {requests} requests")
+        return requests
+
+    async def _store_stage(self, inbox: asyncio.Queue, document_id: str, writer: BulkInsertWriter,
+                           position_writer: BulkInsertWriter,
+                           pending_index_rows: Optional[Dict[int, Dict]],
+                           indexed_chunks: Optional[List[Dict]]) -> int:
+        """
+        Grava os chunks novos em lote e, também em lote (position_writer), a
+        nova posição dos reaproveitados que mudaram de lugar.
+        Sem índices locais configurados (None), as linhas para eles não são guardadas.
+        """
+        reused_chunks = 0
+        
+        async for i, enhanced_chunk, row, embedding, embedding_error in drain(inbox):
+            try:
+                chunk_text = enhanced_chunk["text"]
+                
+                if not chunk_text or len(chunk_text.strip()) < 10:
+                    print(f"Skipping chunk {i}: too short or empty")
+                    continue
+                
+                # Chunk inalterado: mantém embedding e keywords, só corrige a posição
+                if row:
+                    if row["chunk_index"] != i:
+                        await position_writer.add(i, {"id": row["id"], "chunk_index": i})
+                    reused_chunks += 1
+                    if indexed_chunks is not None:
+                        indexed_chunks.append(self._indexed_row(chunk_text, i, enhanced_chunk))
+                    continue
+                
+                if embedding_error:
+                    raise ValueError(f"Embedding failed: {embedding_error}")
+                
+                # Prepara dados para inserção
+                embedding_data = {
+                    "document_id": document_id,
+                    "content_chunk": chunk_text,
+                    "embedding": embedding,
+                    "chunk_index": i
+                }
+                
+                # Adiciona dados de keywords se disponível
+                if KEYWORDS_AVAILABLE:
+                    embedding_data.update({
+                        "keywords": enhanced_chunk.get("keywords", []),
+                        "priority_score": enhanced_chunk.get("priority_score", 1.0),
+                        "has_composite_keywords": enhanced_chunk.get("has_composite_keywords", False),
+                        "legal_references_count": enhanced_chunk.get("legal_references_count", 0),
+                        "keywords_version": self.keywords_version
+                    })
+                
+                # Armazena embedding (gravado quando o lote enche)
+                await writer.add(i, embedding_data)
+                if pending_index_rows is not None:
+                    pending_index_rows[i] = self._indexed_row(chunk_text, i, enhanced_chunk)
+            
+            except Exception as e:
+                print(f"Error processing chunk {i}: {str(e)}")
+                continue  # Continue processando outros chunks
+        
+        return reused_chunks
 
-    async def generate_and_store(self, content: str, document_id: str) -> int:
-        """Gera e armazena embeddings para o conteúdo com detecção de keywords."""
+    async def generate_and_store(self, content: str, document_id: str, incremental: bool = True) -> int:
+        """
+        Gera e armazena embeddings para o conteúdo com detecção de keywords.
+        
+        O conteúdo passa por estágios ligados por filas limitadas
+        (INGESTION_QUEUE_SIZE): chunks → keywords → lotes de embeddings →
+        gravação em lote. Os estágios rodam sobrepostos e só os chunks em
+        trânsito (com keywords e embeddings) ficam em memória, qualquer que
+        seja o tamanho do documento.
+        
+        O texto em si chega inteiro em ``content``: os extratores montam o
+        documento completo, que também é gravado em documents.content. A
+        memória da ingestão ainda cresce com o tamanho do texto extraído;
+        o que deixa de crescer é a parte dos chunks, keywords e embeddings.
+        
+        Com ``incremental``, os chunks novos são comparados por hash com os já
+        armazenados (com a mesma versão das regras de keywords, ver
+        reuse_key): chunks inalterados mantêm embedding e keywords (só o
+        chunk_index é atualizado se mudou), apenas os novos/alterados passam
+        pela detecção e pela OpenAI, e os que sumiram do documento são removidos.
+        """
         try:
-            # Gera chunks básicos
-            chunks = TextProcessor.chunk_text(content, max_chunk_size=1000)
-            print(f"Generated {len(chunks)} chunks for processing")
+            stored_chunks = await self._load_stored_chunks(document_id) if incremental else {}
+            summary_accumulator = (
+                KeywordsSummaryAccumulator() if KEYWORDS_AVAILABLE and self.keyword_detector else None
+            )
+            
+            # Chunks novos vão para o banco em lotes; linhas com erro são reportadas uma a uma
+            storage = get_storage_backend(self.supabase_client)
+            writer = BulkInsertWriter(
+                storage.insert_chunk_rows,
+                batch_size=self.insert_batch_size,
+                max_retries=self.insert_max_retries,
+                label="chunks"
+            )
+            # Posições dos chunks reaproveitados que mudaram: um UPDATE por lote
+            position_writer = BulkInsertWriter(
+                storage.update_chunk_positions,
+                batch_size=self.insert_batch_size,
+                max_retries=self.insert_max_retries,
+                label="reused chunk positions"
+            )
+            
+            # Linhas dos índices locais (BM25 e referências) só são guardadas se algum
+            # snapshot estiver configurado; senão cresceriam com o documento sem uso
+            local_indexes = (
+                (BM25_AVAILABLE and os.environ.get("BM25_INDEX_SNAPSHOT"))
+                or (REFERENCE_INDEX_AVAILABLE and os.environ.get("REFERENCE_INDEX_SNAPSHOT"))
+            )
+            pending_index_rows: Optional[Dict[int, Dict]] = {} if local_indexes else None
+            indexed_chunks: Optional[List[Dict]] = [] if local_indexes else None
+            
+            chunk_queue = bounded_queue(self.pipeline_queue_size)
+            keyword_queue = bounded_queue(self.pipeline_queue_size)
+            store_queue = bounded_queue(self.pipeline_queue_size)
+            total_chunks, reused_rows, _, reused_chunks = await run_stages(
+                self._chunk_stage(content, chunk_queue),
+                self._keyword_stage(chunk_queue, keyword_queue, stored_chunks, summary_accumulator),
+                self._embedding_stage(keyword_queue, store_queue),
+                self._store_stage(store_queue, document_id, writer, position_writer,
+                                  pending_index_rows, indexed_chunks)
+            )
+            
+            insert_result = await writer.close()
+            await position_writer.close()
             
-            if not chunks:
+            if not total_chunks:
                 print("Warning: No chunks generated from content")
                 return 0
+            if incremental:
+                print(f"Reusing {reused_rows} unchanged chunks, {total_chunks - reused_rows} new or changed")
             
-            # Processa chunks com detecção de keywords se disponível
-            if KEYWORDS_AVAILABLE and self.keyword_detector:
-                enhanced_chunks = enhance_chunks_with_keywords(chunks)
-                print(f"Enhanced {len(enhanced_chunks)} chunks with keyword detection")
+            if summary_accumulator is not None:
+                print(f"Enhanced {total_chunks} chunks with keyword detection")
                 
-                # Gera resumo de keywords do documento
-                chunk_keywords_list = self.keyword_detector.process_document_chunks(chunks)
-                keywords_summary = self.keyword_detector.generate_keywords_summary(chunk_keywords_list)
-                
-                # Armazena resumo de keywords do documento
+                # Gera e armazena resumo de keywords do documento
+                keywords_summary = summary_accumulator.to_summary()
                 await self.supabase_client.table("document_keywords_summary").upsert({
                     "document_id": document_id,
                     "keywords_summary": keywords_summary,
-                    "total_chunks": len(chunks),
+                    "total_chunks": total_chunks,
                     "high_priority_chunks": keywords_summary.get("chunks_with_high_priority", 0)
                 }).execute()
             else:
-                # Fallback sem keyword enhancement
-                enhanced_chunks = [
-                    {
-                        "text": chunk,
-                        "keywords": [],
-                        "priority_score": 1.0,
-                        "has_composite_keywords": False,
-                        "legal_references_count": 0
-                    }
-                    for chunk in chunks
-                ]
-                print(f"Processing {len(enhanced_chunks)} chunks without keyword enhancement")
+                print(f"Processing {total_chunks} chunks without keyword enhancement")
             
-            successful_insertions = 0
+            successful_insertions = len(insert_result.inserted)
             
-            for i, enhanced_chunk in enumerate(enhanced_chunks):
+            # Remove chunks que não existem mais no documento
+            stale_ids = [row["id"] for rows in stored_chunks.values() for row in rows]
+            for start in range(0, len(stale_ids), 500):
+                await self.supabase_client.table("document_embeddings")\
+                    .delete()\
+                    .in_("id", stale_ids[start:start + 500])\
+                    .execute()
+            
+            # O índice vetorial relê do banco os embeddings atuais do documento,
+            # antes de esperar pela vez de atualizar os snapshots
+            current_vectors = None
+            if VECTOR_INDEX_AVAILABLE and os.environ.get("VECTOR_INDEX_SNAPSHOT"):
                 try:
-                    chunk_text = enhanced_chunk["text"]
-                    
-                    if not chunk_text or len(chunk_text.strip()) < 10:
-                        print(f"Skipping chunk {i}: too short or empty")
-                        continue
-                    
-                    # Gera embedding para o chunk
-                    response = await self.openai_client.embeddings.create(
-                        input=chunk_text,
-                        model="text-embedding-3-small"
-                    )
-                    
-                    embedding = response.data[0].embedding
-                    
-                    if not isinstance(embedding, list) or not all(isinstance(x, (int, float)) for x in embedding):
-                        raise ValueError("Invalid embedding format")
-                    
-                    # Prepara dados para inserção
-                    embedding_data = {
-                        "document_id": document_id,
-                        "content_chunk": chunk_text,
-                        "embedding": embedding,
-                        "chunk_index": i
-                    }
-                    
-                    # Adiciona dados de keywords se disponível
-                    if KEYWORDS_AVAILABLE:
-                        embedding_data.update({
-                            "keywords": enhanced_chunk.get("keywords", []),
-                            "priority_score": enhanced_chunk.get("priority_score", 1.0),
-                            "has_composite_keywords": enhanced_chunk.get("has_composite_keywords", False),
-                            "legal_references_count": enhanced_chunk.get("legal_references_count", 0)
-                        })
-                    
-                    # Armazena embedding
-                    await self.supabase_client.table("document_embeddings").insert(embedding_data).execute()
-                    
-                    successful_insertions += 1
-                    
-                    if KEYWORDS_AVAILABLE:
-                        priority = enhanced_chunk.get('priority_score', 1.0)
-                        print(f"Successfully processed chunk {i + 1}/{len(enhanced_chunks)} (priority: {priority:.2f})")
-                    else:
-                        print(f"Successfully processed chunk {i + 1}/{len(enhanced_chunks)}")
-                
+                    current_vectors = await VectorIndex.load_from_supabase(self.supabase_client, [document_id])
                 except Exception as e:
-                    print(f"Error processing chunk {i}: {str(e)}")
-                    continue  # Continue processando outros chunks
+                    print(f"Error updating vector index: {str(e)}")
+            
+            # Mantém os índices locais em sincronia com os chunks armazenados; a
+            # leitura e a gravação dos arquivos rodam fora do event loop
+            async with LOCAL_INDEX_SNAPSHOT_LOCK:
+                if indexed_chunks is not None:
+                    indexed_chunks.extend(pending_index_rows[i] for i in insert_result.inserted)
+                    if BM25_AVAILABLE:
+                        try:
+                            await asyncio.to_thread(update_bm25_snapshot, document_id, indexed_chunks)
+                        except Exception as e:
+                            print(f"Error updating BM25 index: {str(e)}")
+                    if REFERENCE_INDEX_AVAILABLE:
+                        try:
+                            await asyncio.to_thread(update_reference_snapshot, document_id, indexed_chunks)
+                        except Exception as e:
+                            print(f"Error updating reference index: {str(e)}")
+                if current_vectors is not None:
+                    try:
+                        await asyncio.to_thread(update_vector_snapshot, document_id, current_vectors)
+                    except Exception as e:
+                        print(f"Error updating vector index: {str(e)}")
             
-            print(f"Successfully inserted {successful_insertions} out of {len(enhanced_chunks)} chunks")
-            return successful_insertions
+            print(f"Successfully inserted {successful_insertions} out of {total_chunks} chunks")
+            if incremental:
+                print(f"Reused {reused_chunks} unchanged chunks, removed {len(stale_ids)} stale chunks")
+            return successful_insertions + reused_chunks
 
         except Exception as e:
             print(f"Error in embedding generation: {str(e)}")
             raise
 
-async def process_single_document(supabase_client, openai_client, doc: Document) -> Dict[str, Any]:
-    """Processa um único documento, extraindo texto e gerando embeddings."""
+async def process_single_document(supabase_client, openai_client, doc: Document,
+                                  incremental: bool = True) -> Dict[str, Any]:
+    """
+    Processa um único documento, extraindo texto e gerando embeddings.
+    
+    Em reprocessamentos (``incremental``), apenas chunks novos ou alterados
+    geram novas keywords e embeddings; os demais são reaproveitados.
+    """
     try:
         print(f"Processing document: {doc.id} ({doc.type})")
         
@@ -485,6 +1051,7 @@ async def process_single_document(supabase_client, openai_client, doc: Document)
         print(f"Extracted content length: {len(extracted_content)} characters")
         
         # Update the document with extracted content
+        # (o texto completo fica em memória até o fim: a coluna guarda o documento inteiro)
         await supabase_client.table("documents").update({
             "content": extracted_content,
             "processing_error": None
@@ -492,7 +1059,15 @@ async def process_single_document(supabase_client, openai_client, doc: Document)
             
         # Generate and store embeddings
         embedding_generator = EmbeddingGenerator(openai_client, supabase_client)
-        chunks_processed = await embedding_generator.generate_and_store(extracted_content, doc.id)
+        try:
+            chunks_processed = await embedding_generator.generate_and_store(
+                extracted_content, doc.id, incremental=incremental
+            )
+        finally:
+            # Invalida respostas de busca em cache que dependem deste documento,
+            # inclusive se a ingestão falhar depois de alterar parte dos chunks
+            if SEARCH_CACHE_AVAILABLE:
+                bump_document_version(doc.id)
         
         # Mark document as processed
         await supabase_client.table("documents").update({
@@ -525,6 +1100,93 @@ async def process_single_document(supabase_client, openai_client, doc: Document)
             "document_type": doc.type
         }
 
+# Ordem de processamento dos documentos da knowledgebase por prioridade
+KB_PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+async def process_knowledgebase_document(supabase_client, openai_client,
+                                         doc_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Cria (se preciso) e processa um documento da knowledgebase, retornando seu resultado."""
+    print(f"\n📄 Processing: {doc_info['file']}")
+    
+    try:
+        # Verificar se documento já existe
+        response = await supabase_client.table("documents").select("id, metadata, is_processed").eq("metadata->>title", doc_info["title"]).execute()
+        
+        existing = response.data[0] if response.data else None
+        
+        if existing:
+            document_id = existing["id"]
+            print(f"📋 Document already exists: {document_id}")
+            
+            # Verificar se já foi processado
+            response = await supabase_client.table("document_embeddings").select("*", count="exact").eq("document_id", document_id).execute()
+            existing_chunks = response.count or 0
+            
+            if existing_chunks > 0:
+                print(f"✅ Already processed with {existing_chunks} chunks")
+                return {
+                    "document_id": document_id,
+                    "status": "already_processed",
+                    "chunks": existing_chunks,
+                    "file": doc_info["file"]
+                }
+        else:
+            # Criar novo documento
+            insert_data = {
+                "content": "",  # Será preenchido durante o processamento
+                "metadata": {
+                    "title": doc_info["title"],
+                    "source": "knowledge-base",
+                    "type": doc_info["type"],
+                    "file_name": doc_info["file"],
+                    "file_path": f"knowledgebase/{doc_info['file']}",
+                    "priority": doc_info["priority"]
+                },
+                "type": doc_info["type"],
+                "file_name": doc_info["file"],
+                "file_path": f"knowledgebase/{doc_info['file']}",
+                "is_public": True,
+                "is_processed": False
+            }
+            
+            response = await supabase_client.table("documents").insert(insert_data).execute()
+            
+            if response.data:
+                document_id = response.data[0]["id"]
+                print(f"✅ Document created: {document_id}")
+            else:
+                raise Exception("Failed to create document")
+        
+        # Criar objeto Document para processamento
+        document = Document(
+            id=document_id,
+            type=doc_info["type"],
+            file_path=f"knowledgebase/{doc_info['file']}",
+            url=None,
+            content="",
+            metadata=doc_info
+        )
+        
+        # Processar o documento
+        result = await process_single_document(supabase_client, openai_client, document)
+        
+        result.update({
+            "document_id": document_id,
+            "file": doc_info["file"],
+            "status": "processed" if result["success"] else "error"
+        })
+        
+        return result
+        
+    except Exception as e:
+        print(f"❌ Error processing {doc_info['file']}: {str(e)}")
+        return {
+            "document_id": None,
+            "status": "error",
+            "error": str(e),
+            "file": doc_info["file"]
+        }
+
 async def process_all_knowledgebase_documents(supabase_client, openai_client) -> List[Dict[str, Any]]:
     """Processa todos os documentos da knowledgebase."""
     documents_to_process = [
@@ -574,92 +1236,24 @@ async def process_all_knowledgebase_documents(supabase_client, openai_client) ->
 
     print(f"🚀 Processing {len(documents_to_process)} knowledgebase documents...")
     
-    results = []
+    # Documentos processados em paralelo, até KB_PROCESSING_CONCURRENCY por vez.
+    # As tarefas são criadas por prioridade e o semáforo atende em ordem de
+    # chegada, então os documentos "high" (ZOTs, riscos) começam primeiro.
+    semaphore = asyncio.Semaphore(max(1, int(os.environ.get("KB_PROCESSING_CONCURRENCY", "3"))))
     
-    for doc_info in documents_to_process:
-        print(f"\n📄 Processing: {doc_info['file']}")
-        
-        try:
-            # Verificar se documento já existe
-            response = await supabase_client.table("documents").select("id, metadata, is_processed").eq("metadata->>title", doc_info["title"]).execute()
-            
-            existing = response.data[0] if response.data else None
-            
-            if existing:
-                document_id = existing["id"]
-                print(f"📋 Document already exists: {document_id}")
-                
-                # Verificar se já foi processado
-                response = await supabase_client.table("document_embeddings").select("*", count="exact").eq("document_id", document_id).execute()
-                existing_chunks = response.count or 0
-                
-                if existing_chunks > 0:
-                    print(f"✅ Already processed with {existing_chunks} chunks")
-                    results.append({
-                        "document_id": document_id,
-                        "status": "already_processed",
-                        "chunks": existing_chunks,
-                        "file": doc_info["file"]
-                    })
-                    continue
-            else:
-                # Criar novo documento
-                insert_data = {
-                    "content": "",  # Será preenchido durante o processamento
-                    "metadata": {
-                        "title": doc_info["title"],
-                        "source": "knowledge-base",
-                        "type": doc_info["type"],
-                        "file_name": doc_info["file"],
-                        "file_path": f"knowledgebase/{doc_info['file']}",
-                        "priority": doc_info["priority"]
-                    },
-                    "type": doc_info["type"],
-                    "file_name": doc_info["file"],
-                    "file_path": f"knowledgebase/{doc_info['file']}",
-                    "is_public": True,
-                    "is_processed": False
-                }
-                
-                response = await supabase_client.table("documents").insert(insert_data).execute()
-                
-                if response.data:
-                    document_id = response.data[0]["id"]
-                    print(f"✅ Document created: {document_id}")
-                else:
-                    raise Exception("Failed to create document")
-            
-            # Criar objeto Document para processamento
-            document = Document(
-                id=document_id,
-                type=doc_info["type"],
-                file_path=f"knowledgebase/{doc_info['file']}",
-                url=None,
-                content="",
-                metadata=doc_info
-            )
-            
-            # Processar o documento
-            result = await process_single_document(supabase_client, openai_client, document)
-            
-            result.update({
-                "document_id": document_id,
-                "file": doc_info["file"],
-                "status": "processed" if result["success"] else "error"
-            })
-            
-            results.append(result)
-            
-        except Exception as e:
-            print(f"❌ Error processing {doc_info['file']}: {str(e)}")
-            results.append({
-                "document_id": None,
-                "status": "error",
-                "error": str(e),
-                "file": doc_info["file"]
-            })
+    async def process_with_limit(doc_info: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            return await process_knowledgebase_document(supabase_client, openai_client, doc_info)
+    
+    by_priority = sorted(
+        range(len(documents_to_process)),
+        key=lambda i: KB_PRIORITY_ORDER.get(documents_to_process[i]["priority"], len(KB_PRIORITY_ORDER))
+    )
+    tasks = {i: asyncio.create_task(process_with_limit(documents_to_process[i])) for i in by_priority}
+    await asyncio.gather(*tasks.values())
     
-    return results
+    # Resultados na ordem da lista de documentos, independente da ordem de conclusão
+    return [tasks[i].result() for i in range(len(documents_to_process))]
 
 async def main(req) -> Dict[str, Any]:
     """Função principal que coordena o processamento do documento."""
@@ -676,6 +1270,7 @@ async def main(req) -> Dict[str, Any]:
         body = await req.json()
         document_id = body.get("documentId")
         process_from_filesystem = body.get("processFromFilesystem", False)
+        incremental = body.get("incremental", True)
         
         # Inicializa clientes
         supabase_client = create_client(
@@ -731,7 +1326,7 @@ async def main(req) -> Dict[str, Any]:
         )
 
         # Processa o documento
-        result = await process_single_document(supabase_client, openai_client, document)
+        result = await process_single_document(supabase_client, openai_client, document, incremental=incremental)
 
         return {
             "statusCode": 200,
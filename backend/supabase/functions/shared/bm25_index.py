@@ -0,0 +1,299 @@
+"""
+Índice invertido local com ranqueamento BM25 para a busca por termos.
+Os tokens são normalizados para português (minúsculas, sem acentos, sem
+stopwords e com stemming leve), então "Ocupações" e "ocupacao" casam.
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from vector_index import PAYLOAD_COLUMNS
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Já sem acentos, como ficam os tokens após _fold_accents
+STOPWORDS = frozenset("""
+a ao aos aquela aquelas aquele aqueles aquilo as ate com como da das de dela delas dele
+deles depois do dos e ela elas ele eles em entre era essa essas esse esses esta estas
+este estes eu foi ha isso isto ja lhe lhes mais mas me mesmo meu meus minha minhas na
+nao nas nem no nos nossa nossas nosso nossos num numa o os ou para pela pelas pelo pelos
+por qual quais quando que quem se sem ser seu seus so sobre sua suas tambem te tem tu
+um uma umas uns voce voces
+""".split())
+
+# Plurais comuns; o sufixo só é trocado se sobrarem ao menos 2 letras antes dele
+PLURAL_SUFFIXES = (
+    ("oes", "ao"),
+    ("aes", "ao"),
+    ("ais", "al"),
+    ("eis", "el"),
+    ("ois", "ol"),
+    ("res", "r"),
+    ("ns", "m"),
+)
+
+
+def _fold_accents(text: str) -> str:
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def stem_token(token: str) -> str:
+    """
+    Stemming leve para português: reduz plurais e remove a vogal temática
+    final (a/o/e), aproximando gênero e número ("urbanas" e "urbano" → "urban").
+    """
+    if len(token) < 4 or not token.isalpha():
+        return token
+
+    for suffix, replacement in PLURAL_SUFFIXES:
+        if len(token) > len(suffix) + 1 and token.endswith(suffix):
+            token = token[:-len(suffix)] + replacement
+            break
+    else:
+        if token.endswith('s') and not token.endswith(('ss', 'us')):
+            token = token[:-1]
+
+    if len(token) >= 5 and token[-1] in 'aoe':
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens normalizados de um texto, na ordem em que aparecem."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(_fold_accents(text)):
+        if token in STOPWORDS or (len(token) < 2 and not token.isdigit()):
+            continue
+        tokens.append(stem_token(token))
+    return tokens
+
+
+class BM25Index:
+    """
+    Índice invertido de chunks com score BM25.
+
+    A busca percorre apenas as listas de postings dos termos da query, em vez
+    de varrer todos os chunks. Cada documento pode ser atualizado
+    incrementalmente com `update_document`: chunks com texto inalterado são
+    mantidos sem retokenização, os novos entram e os que sumiram saem.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._rows: Dict[int, Dict[str, Any]] = {}
+        self._term_counts: Dict[int, Dict[str, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._by_document: Dict[str, Dict[str, List[int]]] = {}
+        self._total_length = 0
+        self._next_slot = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _add_chunk(self, row: Dict[str, Any], term_counts: Optional[Dict[str, int]] = None) -> int:
+        if term_counts is None:
+            term_counts = Counter(tokenize(row.get('content_chunk') or ''))
+
+        slot = self._next_slot
+        self._next_slot += 1
+        self._rows[slot] = row
+        self._term_counts[slot] = term_counts
+        length = sum(term_counts.values())
+        self._lengths[slot] = length
+        self._total_length += length
+        for term, count in term_counts.items():
+            self._postings.setdefault(term, {})[slot] = count
+
+        document_chunks = self._by_document.setdefault(row.get('document_id'), {})
+        document_chunks.setdefault(row.get('content_chunk') or '', []).append(slot)
+        return slot
+
+    def _remove_chunk(self, slot: int) -> None:
+        self._rows.pop(slot)
+        self._total_length -= self._lengths.pop(slot)
+        for term in self._term_counts.pop(slot):
+            postings = self._postings[term]
+            del postings[slot]
+            if not postings:
+                del self._postings[term]
+
+    def update_document(self, document_id: str, chunks: Iterable[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Substitui os chunks indexados de um documento pelos informados.
+
+        Cada chunk é um dict com as colunas de document_embeddings (no mínimo
+        content_chunk). Retorna (chunks tokenizados, chunks removidos).
+        """
+        previous = self._by_document.pop(document_id, {})
+        added = 0
+
+        for chunk in chunks:
+            row = dict(chunk)
+            row['document_id'] = document_id
+            text = row.get('content_chunk') or ''
+            slots = previous.get(text)
+            if slots:
+                # Texto inalterado: reaproveita os termos já contados
+                slot = slots.pop(0)
+                term_counts = self._term_counts[slot]
+                self._remove_chunk(slot)
+                self._add_chunk(row, term_counts)
+            else:
+                self._add_chunk(row)
+                added += 1
+
+        stale = [slot for slots in previous.values() for slot in slots]
+        for slot in stale:
+            self._remove_chunk(slot)
+        if not self._by_document.get(document_id):
+            self._by_document.pop(document_id, None)
+        return added, len(stale)
+
+    def remove_document(self, document_id: str) -> int:
+        """Remove todos os chunks de um documento. Retorna quantos foram removidos."""
+        return self.update_document(document_id, [])[1]
+
+    def search(self, query: str, limit: int = 10,
+               document_ids: Optional[List[str]] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """Retorna até `limit` pares (score BM25, chunk) em ordem decrescente de score."""
+        total_chunks = len(self._rows)
+        if not total_chunks or limit <= 0:
+            return []
+
+        allowed = None
+        if document_ids:
+            allowed = {
+                slot
+                for document_id in document_ids
+                for slots in self._by_document.get(document_id, {}).values()
+                for slot in slots
+            }
+            if not allowed:
+                return []
+
+        average_length = self._total_length / total_chunks or 1.0
+        k1, b = self.k1, self.b
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            document_frequency = len(postings)
+            idf = math.log(1 + (total_chunks - document_frequency + 0.5) / (document_frequency + 0.5))
+            for slot, frequency in postings.items():
+                if allowed is not None and slot not in allowed:
+                    continue
+                normalization = k1 * (1 - b + b * self._lengths[slot] / average_length)
+                scores[slot] = scores.get(slot, 0.0) + idf * frequency * (k1 + 1) / (frequency + normalization)
+
+        return [
+            (score, self._rows[slot])
+            for slot, score in heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        ]
+
+    def save(self, path: str) -> None:
+        """Grava o índice em JSON, com as contagens de termos já calculadas."""
+        snapshot = {
+            "k1": self.k1,
+            "b": self.b,
+            "chunks": [
+                {"row": self._rows[slot], "terms": self._term_counts[slot]}
+                for slot in sorted(self._rows)
+            ],
+        }
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as output:
+            json.dump(snapshot, output, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        """Carrega um snapshot gravado por `save`."""
+        with open(path, encoding='utf-8') as source:
+            snapshot = json.load(source)
+        index = cls(snapshot.get("k1", 1.2), snapshot.get("b", 0.75))
+        for chunk in snapshot.get("chunks", []):
+            index._add_chunk(chunk["row"], chunk["terms"])
+        return index
+
+    @classmethod
+    async def load_from_supabase(cls, supabase_client, page_size: int = 1000) -> 'BM25Index':
+        """Monta o índice paginando document_embeddings."""
+        index = cls()
+        start = 0
+        while True:
+            response = await supabase_client.table("document_embeddings")\
+                .select(", ".join(PAYLOAD_COLUMNS))\
+                .order("id")\
+                .range(start, start + page_size - 1)\
+                .execute()
+            rows = response.data or []
+            for row in rows:
+                index._add_chunk(row)
+
+            if len(rows) < page_size:
+                break
+            start += page_size
+
+        print(f"Indexed {len(index)} chunks for BM25 search")
+        return index
+
+
+async def build_bm25_index_snapshot(supabase_client, path: str) -> BM25Index:
+    """Indexa todos os chunks do banco e grava o snapshot em `path`."""
+    index = await BM25Index.load_from_supabase(supabase_client)
+    index.save(path)
+    print(f"BM25 index snapshot saved to {path} ({len(index)} chunks)")
+    return index
+
+
+_shared_bm25_index: Optional[BM25Index] = None
+_shared_bm25_mtime: Optional[float] = None
+
+
+def get_shared_bm25_index() -> Optional[BM25Index]:
+    """
+    Índice compartilhado carregado do snapshot em BM25_INDEX_SNAPSHOT.
+    É recarregado quando a ingestão regrava o snapshot; retorna None se o
+    snapshot não estiver configurado ou não puder ser lido.
+    """
+    global _shared_bm25_index, _shared_bm25_mtime
+    path = os.environ.get("BM25_INDEX_SNAPSHOT")
+    if not path or not os.path.exists(path):
+        return None
+
+    mtime = os.path.getmtime(path)
+    if _shared_bm25_index is None or mtime != _shared_bm25_mtime:
+        try:
+            _shared_bm25_index = BM25Index.load(path)
+            _shared_bm25_mtime = mtime
+            print(f"BM25 index loaded from {path} ({len(_shared_bm25_index)} chunks)")
+        except Exception as e:
+            print(f"Error loading BM25 index snapshot: {e}")
+            return _shared_bm25_index
+    return _shared_bm25_index
+
+
+def update_bm25_snapshot(document_id: str, chunks: List[Dict[str, Any]]) -> None:
+    """
+    Atualiza o snapshot em BM25_INDEX_SNAPSHOT com os chunks atuais de um
+    documento (criando-o se ainda não existir). Sem snapshot configurado, não faz nada.
+    """
+    path = os.environ.get("BM25_INDEX_SNAPSHOT")
+    if not path:
+        return
+
+    index = BM25Index.load(path) if os.path.exists(path) else BM25Index()
+    added, removed = index.update_document(document_id, chunks)
+    index.save(path)
+    print(f"BM25 index updated for document {document_id}: {added} chunks indexed, {removed} removed")
@@ -0,0 +1,91 @@
+"""
+Escrita em lote de linhas no banco, usada pela ingestão de documentos.
+
+As linhas são acumuladas e enviadas em lotes (uma ida ao banco por lote, em
+vez de uma por chunk). Um lote que falha é reenviado com backoff; se
+continuar falhando, é dividido ao meio até isolar as linhas com problema,
+que são reportadas individualmente sem perder o restante do lote.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+InsertRows = Callable[[List[Dict[str, Any]]], Awaitable[Any]]
+
+
+@dataclass
+class BulkInsertResult:
+    """Chaves das linhas gravadas e erro de cada linha que não pôde ser gravada."""
+    inserted: List[Hashable] = field(default_factory=list)
+    errors: Dict[Hashable, str] = field(default_factory=dict)
+    batches: int = 0
+    retries: int = 0
+
+
+class BulkInsertWriter:
+    """
+    Buffer de linhas gravadas com `insert_rows` em lotes de `batch_size`.
+
+    Cada linha é adicionada com uma chave (ex.: chunk_index) usada para
+    reportar o resultado. `close` grava o que restou no buffer, imprime um
+    resumo e retorna o BulkInsertResult acumulado; lotes individuais só
+    aparecem no log quando são retentados ou divididos. `label` nomeia as
+    linhas nas mensagens.
+    """
+
+    def __init__(self, insert_rows: InsertRows, batch_size: int = 200,
+                 max_retries: int = 2, retry_delay: float = 0.5, label: str = "rows"):
+        self.insert_rows = insert_rows
+        self.label = label
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.result = BulkInsertResult()
+        self._buffer: List[Tuple[Hashable, Dict[str, Any]]] = []
+
+    async def add(self, key: Hashable, row: Dict[str, Any]) -> None:
+        self._buffer.append((key, row))
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        await self._write(batch, self.max_retries)
+
+    async def close(self) -> BulkInsertResult:
+        await self.flush()
+        if self.result.batches:
+            print(f"Stored {len(self.result.inserted)} {self.label} in {self.result.batches} batch requests "
+                  f"({self.result.retries} retries, {len(self.result.errors)} rows failed)")
+        return self.result
+
+    async def _write(self, batch: List[Tuple[Hashable, Dict[str, Any]]], retries: int) -> None:
+        for attempt in range(retries + 1):
+            try:
+                self.result.batches += 1
+                await self.insert_rows([row for _, row in batch])
+                self.result.inserted.extend(key for key, _ in batch)
+                return
+            except Exception as e:
+                error = e
+                if attempt < retries:
+                    self.result.retries += 1
+                    print(f"Retrying batch of {len(batch)} {self.label} "
+                          f"(attempt {attempt + 2}/{retries + 1}): {str(e)}")
+                    await asyncio.sleep(self.retry_delay * (2 ** attempt))
+
+        if len(batch) == 1:
+            key = batch[0][0]
+            self.result.errors[key] = str(error)
+            print(f"Error inserting row {key}: {str(error)}")
+            return
+
+        # O lote continua falhando: divide para isolar as linhas com problema.
+        # As metades não são retentadas, a falha transitória já foi descartada acima.
+        middle = len(batch) // 2
+        print(f"Splitting failed batch of {len(batch)} {self.label} into {middle} + {len(batch) - middle}")
+        await self._write(batch[:middle], 0)
+        await self._write(batch[middle:], 0)
@@ -0,0 +1,135 @@
+"""
+Empacotamento do contexto enviado ao LLM dentro de um orçamento de tokens.
+
+Os chunks recuperados são contados localmente (tiktoken, se instalado, ou
+uma estimativa por caracteres), os repetidos ou quase repetidos são
+descartados e os demais entram em ordem de score enquanto couberem no
+orçamento. Assim o prompt tem tamanho limitado antes da chamada ao modelo,
+em vez de o erro de context length aparecer depois.
+"""
+
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Set, Tuple
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Sem tiktoken: média de caracteres por token em português (estimativa conservadora)
+APPROX_CHARS_PER_TOKEN = 3.5
+
+# Palavras por shingle e fração de shingles em comum para considerar dois chunks repetidos
+SHINGLE_SIZE = 5
+DUPLICATE_CONTAINMENT = 0.8
+
+# Separador usado pelo agent-rag ao juntar os chunks no prompt
+CONTEXT_SEPARATOR = "\n\n===\n\n"
+
+WORD_PATTERN = re.compile(r'\w+')
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Número de tokens do texto (cl100k_base com tiktoken; senão, estimado)."""
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        return len(_get_encoding().encode(text))
+    return math.ceil(len(text) / APPROX_CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Corta o texto para caber em `max_tokens` tokens."""
+    if max_tokens <= 0:
+        return ""
+    if TIKTOKEN_AVAILABLE:
+        encoding = _get_encoding()
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    return text[:int(max_tokens * APPROX_CHARS_PER_TOKEN)]
+
+
+def _shingles(text: str) -> Set[int]:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _is_near_duplicate(shingles: Set[int], selected: List[Set[int]]) -> bool:
+    # Contenção em vez de Jaccard: um chunk contido em outro maior também é repetido
+    for other in selected:
+        smaller = min(len(shingles), len(other))
+        if smaller and len(shingles & other) / smaller >= DUPLICATE_CONTAINMENT:
+            return True
+    return False
+
+
+@dataclass
+class PackedContext:
+    """Resultado do empacotamento: chunks escolhidos e o que ficou de fora."""
+    chunks: List[str] = field(default_factory=list)
+    tokens: int = 0
+    token_budget: int = 0
+    duplicates_dropped: int = 0
+    over_budget_dropped: int = 0
+
+
+def pack_context(candidates: Sequence[Tuple[str, float]], token_budget: int,
+                 max_chunks: Optional[int] = None,
+                 separator: str = CONTEXT_SEPARATOR) -> PackedContext:
+    """
+    Escolhe, dentre pares (texto, score), os chunks que cabem em
+    `token_budget` tokens (contando os separadores entre eles).
+
+    Percorre os candidatos por score decrescente: descarta os quase
+    repetidos de um chunk já escolhido e pula os que não cabem no que resta
+    do orçamento, tentando os seguintes (menores). Os escolhidos saem em
+    ordem de score. Se nem o melhor chunk couber sozinho, ele entra cortado,
+    para que o contexto nunca fique vazio por causa do orçamento.
+    """
+    packed = PackedContext(token_budget=token_budget)
+    separator_tokens = count_tokens(separator)
+    selected_shingles: List[Set[int]] = []
+
+    for text, _ in sorted(candidates, key=lambda candidate: candidate[1], reverse=True):
+        if max_chunks is not None and len(packed.chunks) >= max_chunks:
+            break
+        if not text or not text.strip():
+            continue
+
+        shingles = _shingles(text)
+        if _is_near_duplicate(shingles, selected_shingles):
+            packed.duplicates_dropped += 1
+            continue
+
+        tokens = count_tokens(text) + (separator_tokens if packed.chunks else 0)
+        if packed.tokens + tokens > token_budget:
+            if packed.chunks or token_budget <= 0:
+                packed.over_budget_dropped += 1
+                continue
+            text = truncate_to_tokens(text, token_budget)
+            tokens = count_tokens(text)
+
+        packed.chunks.append(text)
+        packed.tokens += tokens
+        selected_shingles.append(shingles)
+
+    return packed
+
+
+def default_token_budget() -> int:
+    """Orçamento de tokens do contexto configurado em CONTEXT_TOKEN_BUDGET."""
+    return int(os.environ.get("CONTEXT_TOKEN_BUDGET", "6000"))
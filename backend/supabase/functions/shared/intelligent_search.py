@@ -3,11 +3,44 @@ Serviço de busca inteligente que utiliza keywords para melhorar a recuperação
 Integra com o sistema de embeddings existente para fornecer resultados mais precisos.
 """
 
+import asyncio
+import heapq
 import json
 import math
-from typing import List, Dict, Optional, Tuple, Any
-from dataclasses import dataclass
+import os
+import time
+from bisect import bisect_right
+from typing import List, Dict, Optional, Tuple, Any, Awaitable
+from dataclasses import dataclass, replace
 from keywords_detector import KeywordDetector, KeywordType
+from bm25_index import BM25Index, get_shared_bm25_index
+from context_packer import default_token_budget, pack_context
+from reference_index import (
+    ReferenceIndex, canonical_legal_citation, canonical_zot_code, get_shared_reference_index,
+    legal_citation_lookup_codes
+)
+from search_cache import SearchResultCache, get_search_result_cache
+from search_suggestions import SuggestionIndex, get_shared_suggestion_index, refresh_dynamic_sources
+from storage_backend import StorageBackend, get_storage_backend
+from vector_index import (
+    QUERY_EMBEDDING_MODEL, VectorIndex, get_shared_embedding_client, get_shared_vector_index
+)
+
+# Bônus por tipo de keyword da query encontrada no chunk (somado ao base de 0.3)
+KEYWORD_TYPE_BONUS = {
+    KeywordType.COMPOSITE: 0.4,
+    KeywordType.LEGAL_REFERENCE: 0.3,
+    KeywordType.ZOT_REFERENCE: 0.25,
+    KeywordType.ENVIRONMENTAL: 0.2,
+    KeywordType.DISTRICT_REFERENCE: 0.15,
+    KeywordType.ANNEX_REFERENCE: 0.1,
+}
+
+# Constante k da Reciprocal Rank Fusion (valor usual na literatura)
+RRF_K = 60
+
+# Candidatos buscados por chunk pedido, para sobrar contexto após descartar repetidos
+CONTEXT_CANDIDATES_FACTOR = 2
 
 
 @dataclass
@@ -24,15 +57,62 @@ class SearchResult:
     legal_references_count: int
 
 
+@dataclass
+class RetrieverStatus:
+    """Situação de um retriever ao fim do prazo da busca."""
+    name: str
+    status: str  # 'ok', 'timeout' ou 'error'
+    elapsed_ms: float
+    results_count: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class SearchResponse:
+    """Resultados da busca junto com o relatório de cada retriever."""
+    results: List[SearchResult]
+    retrievers: List[RetrieverStatus]
+    deadline_ms: float
+    partial: bool  # True quando algum retriever foi descartado por prazo ou erro
+
+
 class IntelligentSearch:
     """Serviço de busca inteligente com detecção de keywords."""
     
-    def __init__(self, supabase_client):
+    def __init__(self, supabase_client, openai_client=None,
+                 vector_index: Optional[VectorIndex] = None,
+                 bm25_index: Optional[BM25Index] = None,
+                 result_cache: Optional[SearchResultCache] = None,
+                 storage: Optional[StorageBackend] = None,
+                 suggestion_index: Optional[SuggestionIndex] = None,
+                 reference_index: Optional[ReferenceIndex] = None):
         self.supabase_client = supabase_client
+        # Consultas ao banco passam pelo backend (Postgres com pool ou API do Supabase)
+        self.storage = storage if storage is not None else get_storage_backend(supabase_client)
         self.keyword_detector = KeywordDetector()
+        # Sem cliente de embeddings ou sem índice, a busca semântica cai na busca textual;
+        # com índice e sem cliente informado, usa o cliente do processo (OPENAI_API_KEY)
+        self.vector_index = vector_index if vector_index is not None else get_shared_vector_index()
+        self.openai_client = openai_client
+        if self.openai_client is None and self.vector_index:
+            self.openai_client = get_shared_embedding_client()
+        # Sem índice BM25 local, a busca por keywords usa LIKE no banco
+        self.bm25_index = bm25_index if bm25_index is not None else get_shared_bm25_index()
+        self.result_cache = result_cache if result_cache is not None else get_search_result_cache()
+        # Sem índice de referências, as buscas por ZOT e por lei usam LIKE no banco
+        self.reference_index = reference_index if reference_index is not None else get_shared_reference_index()
+        # Prazo total dos retrievers de uma busca; quem não responder a tempo é descartado
+        self.deadline_ms = float(os.environ.get("SEARCH_DEADLINE_MS", "2000"))
+        # Fusão dos retrievers: "weighted" (pesos fixos) ou "rrf" (Reciprocal Rank Fusion)
+        self.fusion = os.environ.get("SEARCH_FUSION", "weighted")
+        # Autocomplete: keywords e padrões já entram; bairros, ZOTs e perguntas
+        # frequentes chegam com refresh_search_suggestions
+        self.suggestion_index = suggestion_index if suggestion_index is not None else \
+            get_shared_suggestion_index(self.keyword_detector.composite_keywords)
     
     async def search_with_keywords(self, query: str, document_ids: Optional[List[str]] = None, 
-                                 limit: int = 10) -> List[SearchResult]:
+                                 limit: int = 10,
+                                 deadline_ms: Optional[float] = None) -> List[SearchResult]:
         """
         Realiza busca inteligente combinando similaridade semântica e keywords.
         
@@ -40,272 +120,399 @@ class IntelligentSearch:
             query: Query de busca do usuário
             document_ids: Lista opcional de IDs de documentos para filtrar
             limit: Número máximo de resultados
+            deadline_ms: Prazo dos retrievers (padrão: SEARCH_DEADLINE_MS)
             
         Returns:
             Lista de resultados ordenados por relevância
         """
         try:
-            # Detecta keywords na query
-            query_keywords = self.keyword_detector.extract_all_keywords(query)
-            print(f"Detected {len(query_keywords)} keywords in query: {[kw.text for kw in query_keywords]}")
-            
-            # Busca por similaridade semântica
-            semantic_results = await self._semantic_search(query, document_ids, limit * 2)
-            
-            # Busca por keywords específicas
-            keyword_results = await self._keyword_search(query_keywords, document_ids, limit * 2)
-            
-            # Combina e rankeia resultados
-            combined_results = self._combine_and_rank_results(
-                semantic_results, keyword_results, query_keywords, limit
-            )
-            
-            return combined_results
+            response = await self.search_with_report(query, document_ids, limit, deadline_ms)
+            return response.results
             
         except Exception as e:
             print(f"Error in intelligent search: {e}")
             # Fallback para busca semântica simples
-            return await self._semantic_search(query, document_ids, limit)
+            try:
+                return await self._semantic_search(query, document_ids, limit)
+            except Exception as fallback_error:
+                print(f"Error in fallback semantic search: {fallback_error}")
+                return []
+    
+    async def search_with_report(self, query: str, document_ids: Optional[List[str]] = None,
+                                 limit: int = 10,
+                                 deadline_ms: Optional[float] = None) -> SearchResponse:
+        """
+        Executa todos os retrievers em paralelo sob um prazo único.
+        
+        A latência fica limitada pelo prazo (ou pelo retriever mais lento que
+        coube nele), e não pela soma das etapas. Retrievers que estouram o
+        prazo são cancelados e seus resultados descartados; a resposta indica
+        quais terminaram a tempo.
+        
+        Respostas completas ficam no cache de resultados até expirarem ou até
+        algum documento de que dependem ser reprocessado (por este ou por
+        outro processo, segundo o updated_at dos documentos no banco, relido
+        a cada SEARCH_CACHE_VERSIONS_TTL_SECONDS).
+        """
+        deadline_ms = self.deadline_ms if deadline_ms is None else deadline_ms
+        
+        # A versão dos documentos vem do banco, para que reingestões feitas por
+        # outros processos invalidem o cache; a leitura é reaproveitada por
+        # alguns segundos, e sem ela a resposta não é cacheada
+        cacheable = self.result_cache.max_size > 0
+        database_versions = None
+        if cacheable:
+            database_versions = self.result_cache.cached_database_versions(document_ids)
+        if cacheable and database_versions is None:
+            try:
+                database_versions = await self.storage.document_versions(document_ids)
+                self.result_cache.store_database_versions(document_ids, database_versions)
+            except Exception as e:
+                print(f"Error reading document versions, skipping search cache: {e}")
+                cacheable = False
+        
+        if cacheable:
+            cached = self.result_cache.get(query, document_ids, limit, database_versions)
+            if cached is not None:
+                return replace(cached, results=list(cached.results))
+        
+        # Detecta keywords na query
+        query_keywords = self.keyword_detector.extract_all_keywords(query)
+        print(f"Detected {len(query_keywords)} keywords in query: {[kw.text for kw in query_keywords]}")
+        
+        retrieved, statuses = await self._run_retrievers(
+            self._build_retrievals(query, query_keywords, document_ids, limit * 2),
+            deadline_ms
+        )
+        
+        # Combina e rankeia resultados
+        combined_results = self._combine_and_rank_results(
+            retrieved.get('semantic', []), retrieved.get('keyword', []), query_keywords, limit
+        )
+        
+        response = SearchResponse(
+            results=combined_results,
+            retrievers=statuses,
+            deadline_ms=deadline_ms,
+            partial=any(status.status != 'ok' for status in statuses)
+        )
+        
+        # Respostas parciais (retriever atrasado ou com erro) não são reaproveitadas
+        if cacheable and not response.partial:
+            self.result_cache.put(query, document_ids, limit,
+                                  replace(response, results=list(combined_results)), database_versions)
+        return response
+    
+    def _build_retrievals(self, query: str, query_keywords: List,
+                          document_ids: Optional[List[str]], limit: int) -> Dict[str, Awaitable]:
+        """Retrievers de uma busca, por nome. Novos retrievers entram aqui."""
+        return {
+            'semantic': self._semantic_search(query, document_ids, limit),
+            'keyword': self._keyword_search(query_keywords, document_ids, limit, query),
+        }
+    
+    async def _run_retrievers(self, retrievals: Dict[str, Awaitable],
+                              deadline_ms: float) -> Tuple[Dict[str, List[Dict]], List[RetrieverStatus]]:
+        """Roda os retrievers concorrentemente e descarta os que não terminam no prazo."""
+        started = time.perf_counter()
+        finished_at: Dict[str, float] = {}
+        
+        async def timed(name: str, retrieval: Awaitable) -> List[Dict]:
+            try:
+                return await retrieval
+            finally:
+                finished_at[name] = time.perf_counter()
+        
+        tasks = {
+            asyncio.ensure_future(timed(name, retrieval)): name
+            for name, retrieval in retrievals.items()
+        }
+        done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline_ms) / 1000)
+        for task in pending:
+            task.cancel()
+        
+        retrieved: Dict[str, List[Dict]] = {}
+        statuses = []
+        for task, name in tasks.items():
+            if task in pending:
+                statuses.append(RetrieverStatus(name, 'timeout', deadline_ms))
+                print(f"Retriever '{name}' missed the {deadline_ms:.0f}ms deadline, results dropped")
+                continue
+            
+            elapsed_ms = (finished_at[name] - started) * 1000
+            error = task.exception()
+            if error is not None:
+                statuses.append(RetrieverStatus(name, 'error', elapsed_ms, error=str(error)))
+                print(f"Error in retriever '{name}': {error}")
+                continue
+            
+            retrieved[name] = task.result() or []
+            statuses.append(RetrieverStatus(name, 'ok', elapsed_ms, len(retrieved[name])))
+        
+        if pending:
+            # Deixa os cancelamentos serem processados antes de seguir
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        return retrieved, statuses
     
     async def _semantic_search(self, query: str, document_ids: Optional[List[str]], 
                               limit: int) -> List[Dict]:
         """Realiza busca por similaridade semântica usando embeddings."""
-        try:
-            # Gera embedding da query (simulado - normalmente usaria OpenAI)
-            # Para este exemplo, vamos usar busca por texto
-            
-            query_filter = """
-            SELECT 
-                de.document_id,
-                de.content_chunk,
-                de.chunk_index,
-                de.keywords,
-                de.priority_score,
-                de.has_composite_keywords,
-                de.legal_references_count,
-                0.5 as similarity_score
-            FROM document_embeddings de
-            WHERE LOWER(de.content_chunk) LIKE LOWER(%s)
-            """
-            
-            if document_ids:
-                query_filter += f" AND de.document_id = ANY(%s)"
-                params = [f"%{query}%", document_ids]
-            else:
-                params = [f"%{query}%"]
-            
-            query_filter += f" ORDER BY de.priority_score DESC LIMIT {limit}"
-            
-            response = await self.supabase_client.rpc(
-                'execute_sql',
-                {'query': query_filter, 'params': params}
-            ).execute()
-            
-            return response.data if response.data else []
-            
-        except Exception as e:
-            print(f"Error in semantic search: {e}")
-            return []
+        if self.openai_client is None or not self.vector_index:
+            return await self._text_search(query, document_ids, limit)
+        
+        # Erros do embedding ou do índice sobem até _run_retrievers, que marcam
+        # o retriever como 'error' e impedem que a resposta vá para o cache
+        query_embedding = await self._embed_query(query)
+        matches = await asyncio.to_thread(self.vector_index.search, query_embedding, limit, document_ids)
+        
+        results = []
+        for similarity, row in matches:
+            result = dict(row)
+            result['similarity_score'] = similarity
+            results.append(result)
+        return results
+    
+    async def _embed_query(self, query: str) -> List[float]:
+        """Gera o embedding da query com o mesmo modelo usado na indexação."""
+        response = await self.openai_client.embeddings.create(
+            input=query,
+            model=QUERY_EMBEDDING_MODEL
+        )
+        return response.data[0].embedding
+    
+    async def _text_search(self, query: str, document_ids: Optional[List[str]], 
+                           limit: int) -> List[Dict]:
+        """Busca textual por substring, usada quando não há índice vetorial."""
+        results = await self.storage.search_chunks([query], document_ids, limit)
+        for result in results:
+            result['similarity_score'] = 0.5
+        return results
     
     async def _keyword_search(self, query_keywords: List, document_ids: Optional[List[str]], 
-                             limit: int) -> List[Dict]:
+                             limit: int, query: Optional[str] = None) -> List[Dict]:
         """Busca por chunks que contêm keywords específicas."""
+        if self.bm25_index:
+            # Busca CPU-bound: fora do event loop, para que o prazo dos retrievers valha para ela
+            return await asyncio.to_thread(
+                self._bm25_search, query or " ".join(kw.text for kw in query_keywords), document_ids, limit
+            )
+        
         if not query_keywords:
             return []
         
-        try:
-            # Constrói filtros baseados nas keywords detectadas
-            keyword_filters = []
-            
-            for keyword in query_keywords:
-                keyword_text = keyword.text.lower()
-                keyword_filters.append(f"LOWER(de.content_chunk) LIKE '%{keyword_text}%'")
-            
-            if not keyword_filters:
-                return []
-            
-            query_filter = f"""
-            SELECT 
-                de.document_id,
-                de.content_chunk,
-                de.chunk_index,
-                de.keywords,
-                de.priority_score,
-                de.has_composite_keywords,
-                de.legal_references_count,
-                1.0 as similarity_score
-            FROM document_embeddings de
-            WHERE ({' OR '.join(keyword_filters)})
-            """
-            
-            if document_ids:
-                query_filter += f" AND de.document_id = ANY(ARRAY{document_ids})"
-            
-            query_filter += f" ORDER BY de.priority_score DESC LIMIT {limit}"
-            
-            response = await self.supabase_client.rpc(
-                'execute_sql',
-                {'query': query_filter}
-            ).execute()
-            
-            return response.data if response.data else []
-            
-        except Exception as e:
-            print(f"Error in keyword search: {e}")
+        # Chunks que contêm qualquer uma das keywords detectadas
+        results = await self.storage.search_chunks(
+            [keyword.text for keyword in query_keywords], document_ids, limit
+        )
+        for result in results:
+            result['similarity_score'] = 1.0
+        return results
+    
+    def _bm25_search(self, query: str, document_ids: Optional[List[str]], limit: int) -> List[Dict]:
+        """Busca ranqueada por BM25 no índice invertido local."""
+        matches = self.bm25_index.search(query, limit, document_ids)
+        if not matches:
             return []
+        
+        # Normaliza pelo melhor score para manter similarity_score em [0, 1]
+        top_score = matches[0][0]
+        results = []
+        for score, row in matches:
+            result = dict(row)
+            result['bm25_score'] = score
+            result['similarity_score'] = score / top_score if top_score > 0 else 0.0
+            results.append(result)
+        return results
     
     def _combine_and_rank_results(self, semantic_results: List[Dict], 
                                  keyword_results: List[Dict], 
-                                 query_keywords: List, limit: int) -> List[SearchResult]:
-        """Combina resultados semânticos e de keywords, calculando scores finais."""
-        
-        # Cria dicionário para evitar duplicatas
-        results_dict = {}
-        
-        # Processa resultados semânticos
-        for result in semantic_results:
-            key = f"{result['document_id']}_{result['chunk_index']}"
-            if key not in results_dict:
-                results_dict[key] = {
-                    'chunk_text': result['content_chunk'],
-                    'chunk_index': result['chunk_index'],
-                    'document_id': result['document_id'],
-                    'similarity_score': result.get('similarity_score', 0.5),
-                    'keyword_score': 0.0,
-                    'keywords': result.get('keywords', []),
-                    'priority_score': result.get('priority_score', 0.0),
-                    'has_composite_keywords': result.get('has_composite_keywords', False),
-                    'legal_references_count': result.get('legal_references_count', 0)
-                }
-        
-        # Adiciona/atualiza com resultados de keywords
-        for result in keyword_results:
-            key = f"{result['document_id']}_{result['chunk_index']}"
-            if key in results_dict:
-                # Atualiza score de keywords
-                results_dict[key]['keyword_score'] = 1.0
-            else:
-                # Adiciona novo resultado
-                results_dict[key] = {
-                    'chunk_text': result['content_chunk'],
-                    'chunk_index': result['chunk_index'],
-                    'document_id': result['document_id'],
-                    'similarity_score': 0.3,  # Score menor para resultados apenas de keywords
-                    'keyword_score': 1.0,
-                    'keywords': result.get('keywords', []),
-                    'priority_score': result.get('priority_score', 0.0),
-                    'has_composite_keywords': result.get('has_composite_keywords', False),
-                    'legal_references_count': result.get('legal_references_count', 0)
-                }
-        
-        # Calcula scores finais e converte para SearchResult
-        search_results = []
-        for result_data in results_dict.values():
-            # Calcula keyword score baseado na query
-            keyword_score = self._calculate_keyword_score(
-                result_data['keywords'], query_keywords, result_data['chunk_text']
-            )
-            
-            # Score combinado com pesos
-            combined_score = (
-                0.4 * result_data['similarity_score'] +  # 40% similaridade semântica
-                0.4 * keyword_score +                    # 40% keywords
-                0.2 * min(1.0, result_data['priority_score'])  # 20% prioridade do chunk
-            )
-            
+                                 query_keywords: List, limit: int,
+                                 fusion: Optional[str] = None) -> List[SearchResult]:
+        """
+        Combina resultados semânticos e de keywords, calculando scores finais.
+        
+        Os componentes (similaridade, keywords, prioridade e bônus) são
+        calculados em colunas paralelas, com as keywords da query normalizadas
+        uma única vez, e só os `limit` melhores viram SearchResult (seleção
+        por heap, sem ordenar todos os candidatos).
+        
+        Com fusion="weighted", o score é 40% similaridade + 40% keywords +
+        20% prioridade, mais bônus; com fusion="rrf", é a soma de
+        1 / (RRF_K + posição) nas listas dos retrievers.
+        """
+        fusion = fusion or self.fusion
+        
+        # Candidatos únicos por (documento, chunk), na ordem em que aparecem
+        positions: Dict[Tuple[Any, Any], int] = {}
+        rows: List[Dict] = []
+        similarity: List[float] = []
+        semantic_rank: List[int] = []  # 0 = ausente da lista
+        keyword_rank: List[int] = []
+        
+        for rank, result in enumerate(semantic_results, 1):
+            key = (result['document_id'], result['chunk_index'])
+            if key not in positions:
+                positions[key] = len(rows)
+                rows.append(result)
+                similarity.append(result.get('similarity_score', 0.5))
+                semantic_rank.append(rank)
+                keyword_rank.append(0)
+        
+        for rank, result in enumerate(keyword_results, 1):
+            key = (result['document_id'], result['chunk_index'])
+            position = positions.get(key)
+            if position is None:
+                positions[key] = len(rows)
+                rows.append(result)
+                similarity.append(0.3)  # Score menor para resultados apenas de keywords
+                semantic_rank.append(0)
+                keyword_rank.append(rank)
+            elif not keyword_rank[position]:
+                keyword_rank[position] = rank
+        
+        if not rows:
+            return []
+        
+        keyword_scores = self._keyword_components(rows, self._fold_query_keywords(query_keywords))
+        
+        if fusion == "rrf":
+            combined = [
+                (1.0 / (RRF_K + s_rank) if s_rank else 0.0) + (1.0 / (RRF_K + k_rank) if k_rank else 0.0)
+                for s_rank, k_rank in zip(semantic_rank, keyword_rank)
+            ]
+        else:
+            combined = [
+                0.4 * sim + 0.4 * kw + 0.2 * min(1.0, row.get('priority_score') or 0.0)
+                for sim, kw, row in zip(similarity, keyword_scores, rows)
+            ]
             # Bonus para chunks com características especiais
-            if result_data['has_composite_keywords']:
-                combined_score += 0.1
-            if result_data['legal_references_count'] > 0:
-                combined_score += 0.05
-            
-            search_results.append(SearchResult(
-                chunk_text=result_data['chunk_text'],
-                chunk_index=result_data['chunk_index'],
-                document_id=result_data['document_id'],
-                similarity_score=result_data['similarity_score'],
-                keyword_score=keyword_score,
-                combined_score=combined_score,
-                keywords_found=result_data['keywords'],
-                has_composite_keywords=result_data['has_composite_keywords'],
-                legal_references_count=result_data['legal_references_count']
-            ))
-        
-        # Ordena por score combinado e retorna top results
-        search_results.sort(key=lambda x: x.combined_score, reverse=True)
-        return search_results[:limit]
+            for i, row in enumerate(rows):
+                if row.get('has_composite_keywords'):
+                    combined[i] += 0.1
+                if (row.get('legal_references_count') or 0) > 0:
+                    combined[i] += 0.05
+        
+        top = heapq.nlargest(limit, range(len(rows)), key=combined.__getitem__)
+        return [
+            SearchResult(
+                chunk_text=rows[i]['content_chunk'],
+                chunk_index=rows[i]['chunk_index'],
+                document_id=rows[i]['document_id'],
+                similarity_score=similarity[i],
+                keyword_score=keyword_scores[i],
+                combined_score=combined[i],
+                keywords_found=rows[i].get('keywords') or [],
+                has_composite_keywords=rows[i].get('has_composite_keywords', False),
+                legal_references_count=rows[i].get('legal_references_count', 0)
+            )
+            for i in top
+        ]
     
-    def _calculate_keyword_score(self, chunk_keywords: List[Dict], 
-                               query_keywords: List, chunk_text: str) -> float:
-        """Calcula score de keywords para um chunk específico."""
-        if not query_keywords:
-            return 0.0
+    @staticmethod
+    def _fold_query_keywords(query_keywords: List) -> List[Tuple[str, float]]:
+        """Texto em minúsculas e peso (base 0.3 + bônus do tipo) de cada keyword da query."""
+        return [
+            (query_kw.text.lower(), 0.3 + KEYWORD_TYPE_BONUS.get(query_kw.type, 0.1))
+            for query_kw in query_keywords
+        ]
+    
+    @staticmethod
+    def _query_keyword_matches(rows: List[Dict], folded_keywords: List[Tuple[str, float]]) -> List[float]:
+        """
+        Soma dos pesos das keywords da query presentes no texto de cada candidato.
         
-        score = 0.0
-        chunk_text_lower = chunk_text.lower()
+        Os textos são unidos por NUL (que o Postgres não guarda em text) e
+        passados para minúsculas uma única vez; cada keyword é procurada no
+        bloco com str.find, que salta direto para o próximo chunk que a contém.
+        """
+        scores = [0.0] * len(rows)
+        haystack = "\0".join(row['content_chunk'] for row in rows).lower()
+        starts = [0]
+        boundary = haystack.find("\0")
+        while boundary != -1:
+            starts.append(boundary + 1)
+            boundary = haystack.find("\0", boundary + 1)
+        if len(starts) != len(rows):
+            # Algum texto continha NUL: volta a comparar chunk a chunk
+            for i, row in enumerate(rows):
+                text = row['content_chunk'].lower()
+                scores[i] = sum(weight for query_text, weight in folded_keywords if query_text in text)
+            return scores
         
-        # Score baseado em keywords da query encontradas no chunk
-        for query_kw in query_keywords:
-            query_text = query_kw.text.lower()
-            
-            # Match exato
-            if query_text in chunk_text_lower:
-                base_score = 0.3
-                
-                # Bonus baseado no tipo de keyword
-                type_bonus = {
-                    KeywordType.COMPOSITE: 0.4,
-                    KeywordType.LEGAL_REFERENCE: 0.3,
-                    KeywordType.ZOT_REFERENCE: 0.25,
-                    KeywordType.ENVIRONMENTAL: 0.2,
-                    KeywordType.DISTRICT_REFERENCE: 0.15,
-                    KeywordType.ANNEX_REFERENCE: 0.1,
-                }.get(query_kw.type, 0.1)
-                
-                score += base_score + type_bonus
-        
-        # Score adicional baseado em keywords detectadas no chunk
+        for query_text, weight in folded_keywords:
+            if not query_text:
+                # Como `"" in texto`, casa com todos os chunks
+                scores = [score + weight for score in scores]
+                continue
+            position = haystack.find(query_text)
+            while position != -1:
+                row_index = bisect_right(starts, position) - 1
+                scores[row_index] += weight
+                if row_index + 1 == len(starts):
+                    break
+                position = haystack.find(query_text, starts[row_index + 1])
+        return scores
+    
+    @staticmethod
+    def _add_chunk_keywords_bonus(score: float, chunk_keywords: List[Dict]) -> float:
+        """Acrescenta ao score os bônus das keywords detectadas no chunk, com teto 1.0."""
         for chunk_kw in chunk_keywords:
-            if chunk_kw.get('type') == 'composite':
+            if score >= 1.0:
+                return 1.0  # Os acréscimos são positivos: o teto já foi atingido
+            chunk_kw_type = chunk_kw.get('type')
+            if chunk_kw_type == 'composite':
                 score += 0.1
-            elif chunk_kw.get('type') == 'legal_reference':
+            elif chunk_kw_type == 'legal_reference':
                 score += 0.05
         
         return min(1.0, score)  # Normaliza para máximo 1.0
     
+    @classmethod
+    def _keyword_components(cls, rows: List[Dict], folded_keywords: List[Tuple[str, float]]) -> List[float]:
+        """
+        Score de keywords de cada candidato: as keywords da query são
+        procuradas no texto de todos os chunks (normalizado uma única vez para
+        o conjunto) e as keywords armazenadas entram só no bônus.
+        """
+        if not folded_keywords:
+            return [0.0] * len(rows)
+        
+        return [
+            cls._add_chunk_keywords_bonus(score, row.get('keywords') or [])
+            for score, row in zip(cls._query_keyword_matches(rows, folded_keywords), rows)
+        ]
+    
+    @classmethod
+    def _keyword_component(cls, chunk_keywords: List[Dict], folded_keywords: List[Tuple[str, float]],
+                           chunk_text: str) -> float:
+        """Score de keywords de um chunk a partir das keywords da query já normalizadas."""
+        return cls._keyword_components(
+            [{'content_chunk': chunk_text, 'keywords': chunk_keywords}], folded_keywords
+        )[0]
+    
+    def _calculate_keyword_score(self, chunk_keywords: List[Dict], 
+                               query_keywords: List, chunk_text: str) -> float:
+        """Calcula score de keywords para um chunk específico."""
+        return self._keyword_component(
+            chunk_keywords, self._fold_query_keywords(query_keywords), chunk_text
+        )
+    
     async def search_by_legal_reference(self, legal_ref: str, 
                                       document_ids: Optional[List[str]] = None) -> List[SearchResult]:
         """Busca específica por referências legais."""
         try:
-            query_filter = """
-            SELECT 
-                de.document_id,
-                de.content_chunk,
-                de.chunk_index,
-                de.keywords,
-                de.priority_score,
-                de.has_composite_keywords,
-                de.legal_references_count
-            FROM document_embeddings de
-            WHERE de.legal_references_count > 0
-            AND LOWER(de.content_chunk) LIKE LOWER(%s)
-            """
-            
-            params = [f"%{legal_ref}%"]
-            
-            if document_ids:
-                query_filter += " AND de.document_id = ANY(%s)"
-                params.append(document_ids)
-            
-            query_filter += " ORDER BY de.legal_references_count DESC, de.priority_score DESC LIMIT 20"
-            
-            response = await self.supabase_client.rpc(
-                'execute_sql',
-                {'query': query_filter, 'params': params}
-            ).execute()
+            citation = canonical_legal_citation(legal_ref)
+            if self.reference_index is not None and citation:
+                # "LC 434/99" e "Lei Complementar nº 434 de 1999" chegam à mesma chave
+                rows = self.reference_index.lookup_any(legal_citation_lookup_codes(citation), 20, document_ids)
+            else:
+                rows = await self.storage.search_chunks(
+                    [legal_ref], document_ids, limit=20, legal_references_only=True
+                )
             
             results = []
-            for result in response.data or []:
+            for result in rows:
                 results.append(SearchResult(
                     chunk_text=result['content_chunk'],
                     chunk_index=result['chunk_index'],
@@ -328,42 +535,22 @@ class IntelligentSearch:
                            document_ids: Optional[List[str]] = None) -> List[SearchResult]:
         """Busca específica por referências de ZOT."""
         try:
-            # Normaliza referência ZOT
-            zot_patterns = [
-                zot_ref.lower(),
-                f"zot {zot_ref}",
-                f"zona {zot_ref}",
-                f"zoneamento {zot_ref}"
-            ]
-            
-            conditions = [f"LOWER(de.content_chunk) LIKE '%{pattern}%'" for pattern in zot_patterns]
-            where_clause = " OR ".join(conditions)
-            
-            query_filter = f"""
-            SELECT 
-                de.document_id,
-                de.content_chunk,
-                de.chunk_index,
-                de.keywords,
-                de.priority_score,
-                de.has_composite_keywords,
-                de.legal_references_count
-            FROM document_embeddings de
-            WHERE ({where_clause})
-            """
-            
-            if document_ids:
-                query_filter += f" AND de.document_id = ANY(ARRAY{document_ids})"
-            
-            query_filter += " ORDER BY de.priority_score DESC LIMIT 15"
-            
-            response = await self.supabase_client.rpc(
-                'execute_sql',
-                {'query': query_filter}
-            ).execute()
+            zot_code = canonical_zot_code(zot_ref)
+            if self.reference_index is not None and zot_code:
+                # Código canônico: "ZOT 8.2" não casa mais com "ZOT 8.21"
+                rows = self.reference_index.lookup(zot_code, 15, document_ids)
+            else:
+                # Normaliza referência ZOT
+                zot_patterns = [
+                    zot_ref.lower(),
+                    f"zot {zot_ref}",
+                    f"zona {zot_ref}",
+                    f"zoneamento {zot_ref}"
+                ]
+                rows = await self.storage.search_chunks(zot_patterns, document_ids, limit=15)
             
             results = []
-            for result in response.data or []:
+            for result in rows:
                 results.append(SearchResult(
                     chunk_text=result['content_chunk'],
                     chunk_index=result['chunk_index'],
@@ -382,50 +569,53 @@ class IntelligentSearch:
             print(f"Error in ZOT search: {e}")
             return []
 
-    def get_search_suggestions(self, partial_query: str) -> List[str]:
-        """Gera sugestões de busca baseadas em keywords conhecidas."""
-        suggestions = []
-        partial_lower = partial_query.lower()
-        
-        # Sugestões de keywords compostas
-        for keyword in self.keyword_detector.composite_keywords.keys():
-            if partial_lower in keyword.lower() and len(partial_query) >= 3:
-                suggestions.append(keyword)
-        
-        # Sugestões de padrões comuns
-        common_patterns = [
-            "lei complementar nº",
-            "decreto nº",
-            "zot 8.2",
-            "4º distrito",
-            "certificação em sustentabilidade ambiental",
-            "estudo de impacto de vizinhança",
-            "área de proteção ambiental",
-            "coeficiente de aproveitamento",
-            "taxa de ocupação"
-        ]
-        
-        for pattern in common_patterns:
-            if partial_lower in pattern.lower() and pattern not in suggestions:
-                suggestions.append(pattern)
-        
-        return suggestions[:10]  # Máximo 10 sugestões
+    def get_search_suggestions(self, partial_query: str, limit: int = 10) -> List[str]:
+        """
+        Sugestões de busca para o texto digitado, das mais populares para as
+        menos. Pensado para ser chamado a cada tecla: não acessa o banco.
+        """
+        return self.suggestion_index.suggest(partial_query, limit)
+
+    async def refresh_search_suggestions(self, query_log_limit: int = 5000) -> Dict[str, int]:
+        """Recarrega bairros, ZOTs e perguntas frequentes no índice de sugestões."""
+        try:
+            counts = await refresh_dynamic_sources(self.suggestion_index, self.storage, query_log_limit)
+            print(f"Search suggestions refreshed: {counts}")
+            return counts
+        except Exception as e:
+            print(f"Error refreshing search suggestions: {e}")
+            return {}
 
 
 # Função utilitária para integração com o sistema RAG existente
 async def enhanced_context_retrieval(supabase_client, query: str, 
                                    document_ids: Optional[List[str]] = None,
-                                   max_chunks: int = 10) -> List[str]:
+                                   max_chunks: int = 10,
+                                   openai_client=None,
+                                   token_budget: Optional[int] = None) -> List[str]:
     """
     Função de conveniência para recuperar contexto melhorado com keywords.
     Integra com o sistema RAG existente.
+
+    Os chunks retornados somam no máximo `token_budget` tokens (padrão:
+    CONTEXT_TOKEN_BUDGET), sem repetidos, escolhidos por score.
     """
+    if token_budget is None:
+        token_budget = default_token_budget()
     try:
-        search_service = IntelligentSearch(supabase_client)
-        results = await search_service.search_with_keywords(query, document_ids, max_chunks)
+        search_service = IntelligentSearch(supabase_client, openai_client)
+        results = await search_service.search_with_keywords(
+            query, document_ids, max_chunks * CONTEXT_CANDIDATES_FACTOR
+        )
         
         # Retorna apenas o texto dos chunks ordenados por relevância
-        return [result.chunk_text for result in results]
+        packed = pack_context(
+            [(result.chunk_text, result.combined_score) for result in results],
+            token_budget, max_chunks
+        )
+        print(f"Context packed: {len(packed.chunks)} chunks, {packed.tokens}/{token_budget} tokens, "
+              f"{packed.duplicates_dropped} duplicates and {packed.over_budget_dropped} over budget dropped")
+        return packed.chunks
         
     except Exception as e:
         print(f"Error in enhanced context retrieval: {e}")
@@ -438,7 +628,12 @@ async def enhanced_context_retrieval(supabase_client, query: str,
                 .limit(max_chunks)\
                 .execute()
             
-            return [row["content_chunk"] for row in response.data or []]
+            rows = response.data or []
+            # Sem score, vale a ordem devolvida pelo banco
+            return pack_context(
+                [(row["content_chunk"], -rank) for rank, row in enumerate(rows)],
+                token_budget, max_chunks
+            ).chunks
             
         except Exception as fallback_error:
             print(f"Error in fallback search: {fallback_error}")
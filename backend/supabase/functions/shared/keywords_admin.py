@@ -10,6 +10,7 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta
 from keywords_detector import KeywordDetector, KeywordType
 from intelligent_search import IntelligentSearch
+from storage_backend import StorageBackend, get_storage_backend
 
 
 @dataclass
@@ -39,10 +40,12 @@ class SystemHealthReport:
 class KeywordsAdmin:
     """Classe utilitária para administração do sistema de keywords."""
     
-    def __init__(self, supabase_client):
+    def __init__(self, supabase_client, storage: Optional[StorageBackend] = None):
         self.supabase_client = supabase_client
+        # Estatísticas agregadas pelo backend (no Postgres, quando disponível)
+        self.storage = storage if storage is not None else get_storage_backend(supabase_client)
         self.keyword_detector = KeywordDetector()
-        self.search_service = IntelligentSearch(supabase_client)
+        self.search_service = IntelligentSearch(supabase_client, storage=self.storage)
     
     async def generate_system_health_report(self) -> SystemHealthReport:
         """Gera relatório completo de saúde do sistema."""
@@ -88,24 +91,14 @@ class KeywordsAdmin:
         """Coleta estatísticas básicas do sistema."""
         try:
             # Total de documentos
-            docs_response = await self.supabase_client.table("documents").select("id").execute()
-            total_documents = len(docs_response.data) if docs_response.data else 0
+            total_documents = await self.storage.count_documents()
             
             # Estatísticas de chunks
-            chunks_stats = await self.supabase_client.table("document_embeddings")\
-                .select("id, keywords")\
-                .execute()
+            chunks_stats = await self.storage.chunk_keyword_stats()
             
-            total_chunks = len(chunks_stats.data) if chunks_stats.data else 0
-            
-            chunks_with_keywords = 0
-            total_keywords = 0
-            
-            for chunk in chunks_stats.data or []:
-                keywords = chunk.get('keywords', [])
-                if keywords and len(keywords) > 0:
-                    chunks_with_keywords += 1
-                    total_keywords += len(keywords)
+            total_chunks = chunks_stats['total_chunks']
+            chunks_with_keywords = chunks_stats['chunks_with_keywords']
+            total_keywords = chunks_stats['total_keywords']
             
             avg_keywords_per_chunk = total_keywords / max(1, total_chunks)
             
@@ -128,55 +121,20 @@ class KeywordsAdmin:
     async def _get_top_keywords(self, limit: int = 20) -> List[KeywordStats]:
         """Obtém as keywords mais frequentes do sistema."""
         try:
-            # Busca todos os chunks com keywords
-            response = await self.supabase_client.table("document_embeddings")\
-                .select("keywords, document_id")\
-                .neq("keywords", "[]")\
-                .execute()
-            
-            keyword_counts = {}
-            keyword_docs = {}
-            keyword_confidences = {}
-            
-            for chunk in response.data or []:
-                doc_id = chunk['document_id']
-                keywords = chunk.get('keywords', [])
-                
-                for kw in keywords:
-                    kw_text = kw.get('text', '')
-                    kw_type = kw.get('type', 'unknown')
-                    kw_confidence = kw.get('confidence', 0.0)
-                    
-                    key = f"{kw_text}|{kw_type}"
-                    
-                    # Conta frequência
-                    keyword_counts[key] = keyword_counts.get(key, 0) + 1
-                    
-                    # Conta documentos únicos
-                    if key not in keyword_docs:
-                        keyword_docs[key] = set()
-                    keyword_docs[key].add(doc_id)
-                    
-                    # Coleta confidências para média
-                    if key not in keyword_confidences:
-                        keyword_confidences[key] = []
-                    keyword_confidences[key].append(kw_confidence)
-            
-            # Converte para lista de KeywordStats
-            stats_list = []
-            for key, frequency in keyword_counts.items():
-                kw_text, kw_type = key.split('|', 1)
-                docs_count = len(keyword_docs[key])
-                avg_confidence = sum(keyword_confidences[key]) / len(keyword_confidences[key])
-                
-                stats_list.append(KeywordStats(
-                    keyword_text=kw_text,
-                    keyword_type=kw_type,
-                    frequency=frequency,
-                    documents_count=docs_count,
-                    avg_confidence=avg_confidence,
+            # Frequência, documentos e confiança média agregados pelo backend
+            rows = await self.storage.top_keywords(limit)
+            
+            stats_list = [
+                KeywordStats(
+                    keyword_text=row['text'],
+                    keyword_type=row['type'],
+                    frequency=row['frequency'],
+                    documents_count=row['documents_count'],
+                    avg_confidence=row['avg_confidence'],
                     last_seen=datetime.now()  # Placeholder
-                ))
+                )
+                for row in rows
+            ]
             
             # Ordena por frequência
             stats_list.sort(key=lambda x: x.frequency, reverse=True)
@@ -189,22 +147,10 @@ class KeywordsAdmin:
     async def _get_documents_without_keywords(self) -> List[str]:
         """Encontra documentos que não têm keywords detectadas."""
         try:
-            # Documentos com resumo de keywords
-            with_keywords = await self.supabase_client.table("document_keywords_summary")\
-                .select("document_id")\
-                .execute()
-            
-            with_keywords_ids = set(row['document_id'] for row in with_keywords.data or [])
+            # Documentos sem linha em document_keywords_summary
+            docs = await self.storage.documents_without_keywords_summary()
             
-            # Todos os documentos
-            all_docs = await self.supabase_client.table("documents")\
-                .select("id, title")\
-                .execute()
-            
-            without_keywords = []
-            for doc in all_docs.data or []:
-                if doc['id'] not in with_keywords_ids:
-                    without_keywords.append(f"{doc['title']} ({doc['id']})")
+            without_keywords = [f"{doc['title']} ({doc['id']})" for doc in docs]
             
             return without_keywords
             
@@ -218,21 +164,9 @@ class KeywordsAdmin:
         
         try:
             # Verifica se há chunks longos sem keywords
-            long_chunks = await self.supabase_client.table("document_embeddings")\
-                .select("content_chunk, keywords")\
-                .execute()
-            
-            long_without_keywords = 0
-            total_long = 0
-            
-            for chunk in long_chunks.data or []:
-                content = chunk.get('content_chunk', '')
-                keywords = chunk.get('keywords', [])
-                
-                if len(content) > 500:  # Chunk longo
-                    total_long += 1
-                    if not keywords or len(keywords) == 0:
-                        long_without_keywords += 1
+            long_stats = await self.storage.long_chunk_stats(min_length=500)
+            total_long = long_stats['total_long']
+            long_without_keywords = long_stats['long_without_keywords']
             
             if total_long > 0:
                 ratio = long_without_keywords / total_long
@@ -240,15 +174,9 @@ class KeywordsAdmin:
                     patterns.append(f"High ratio of long chunks without keywords: {ratio:.1%}")
             
             # Verifica padrões de baixa confiança
-            low_confidence_count = 0
-            total_keywords_checked = 0
-            
-            for chunk in long_chunks.data or []:
-                keywords = chunk.get('keywords', [])
-                for kw in keywords:
-                    total_keywords_checked += 1
-                    if kw.get('confidence', 1.0) < 0.5:
-                        low_confidence_count += 1
+            confidence_stats = await self.storage.keyword_confidence_stats(threshold=0.5)
+            total_keywords_checked = confidence_stats['total_keywords']
+            low_confidence_count = confidence_stats['low_confidence']
             
             if total_keywords_checked > 0:
                 low_conf_ratio = low_confidence_count / total_keywords_checked
@@ -321,20 +249,17 @@ class KeywordsAdmin:
     async def optimize_keyword_patterns(self) -> Dict[str, any]:
         """Analisa e sugere otimizações para os padrões de keywords."""
         try:
-            # Coleta texto de todos os chunks para análise
-            response = await self.supabase_client.table("document_embeddings")\
-                .select("content_chunk, keywords")\
-                .limit(1000)\
-                .execute()
+            # Coleta texto de uma amostra de chunks para análise
+            sample_texts = await self.storage.sample_chunk_texts(limit=1000)
             
             # Analisa termos frequentes não detectados
-            all_text = " ".join([chunk['content_chunk'] for chunk in response.data or []])
+            all_text = " ".join(sample_texts)
             suggestions = self._analyze_missing_patterns(all_text)
             
             return {
                 "current_patterns": len(self.keyword_detector.composite_keywords),
                 "suggested_new_patterns": suggestions,
-                "analysis_sample_size": len(response.data or [])
+                "analysis_sample_size": len(sample_texts)
             }
             
         except Exception as e:
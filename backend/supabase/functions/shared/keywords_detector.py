@@ -3,11 +3,27 @@ Sistema inteligente de detecção e extração de keywords para o Plano Diretor
 Integra com o sistema de chunking existente para marcar chunks com keywords especiais.
 """
 
+import bisect
+import hashlib
+import heapq
+import os
+import pickle
 import re
-from typing import List, Dict, Set, Tuple, Optional
-from dataclasses import dataclass
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Dict, Set, Tuple, Optional, Union
+from dataclasses import dataclass, replace
 from enum import Enum
 
+from process_pool import map_in_pool, process_pool_size
+
+
+# Abaixo deste número de chunks o custo de subir o pool supera o ganho
+PARALLEL_MIN_CHUNKS = 500
+
+# Ano (ou data completa) opcional ao final de uma referência legal
+LEGAL_DATE_PATTERN = r'(?:,?\s*de\s+(?:\d{1,2}[º°]?\s+de\s+\w+\s+de\s+)?\d{4})?'
+
 
 class KeywordType(Enum):
     """Tipos de keywords detectadas."""
@@ -19,15 +35,55 @@ class KeywordType(Enum):
     ENVIRONMENTAL = "environmental"  # Termos ambientais
 
 
-@dataclass
 class Keyword:
-    """Representa uma keyword detectada."""
-    text: str
-    type: KeywordType
-    position: int
-    length: int
-    confidence: float = 1.0
-    context: str = ""
+    """
+    Representa uma keyword detectada.
+    
+    Usa ``__slots__`` e guarda só uma referência ao texto de origem: o
+    contexto ao redor da keyword é recortado das posições quando lido (ex.:
+    na serialização), em vez de copiado para cada keyword na detecção.
+    """
+    __slots__ = ('text', 'type', 'position', 'length', 'confidence',
+                 '_context', '_source', '_context_window')
+
+    def __init__(self, text: str, type: KeywordType, position: int, length: int,
+                 confidence: float = 1.0, context: Optional[str] = None,
+                 source: Optional[str] = None, context_window: int = 0):
+        self.text = text
+        self.type = type
+        self.position = position
+        self.length = length
+        self.confidence = confidence
+        self._context = context
+        self._source = source
+        self._context_window = context_window
+
+    @property
+    def context(self) -> str:
+        """Trecho do texto de origem ao redor da keyword."""
+        if self._context is not None:
+            return self._context
+        if self._source is None:
+            return ""
+        start = max(0, self.position - self._context_window)
+        end = min(len(self._source), self.position + self.length + self._context_window)
+        return self._source[start:end].strip()
+
+    @context.setter
+    def context(self, value: str) -> None:
+        self._context = value
+
+    def _astuple(self) -> Tuple:
+        return (self.text, self.type, self.position, self.length, self.confidence, self.context)
+
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    def __repr__(self) -> str:
+        return (f"Keyword(text={self.text!r}, type={self.type}, position={self.position}, "
+                f"length={self.length}, confidence={self.confidence}, context={self.context!r})")
 
 
 @dataclass
@@ -41,6 +97,208 @@ class ChunkKeywords:
     legal_references_count: int = 0
 
 
+def _fold_case(text: str) -> str:
+    """Converte para minúsculas preservando o comprimento (e as posições)."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class CompositeKeywordMatcher:
+    """
+    Autômato Aho-Corasick sobre tokens para keywords compostas.
+
+    O texto é tokenizado uma única vez em sequências de caracteres de palavra
+    e de não-palavra; como os tokens de palavra são maximais, casar keywords
+    em fronteiras de token equivale à semântica de ``\\b…\\b`` do regex
+    original. Uma varredura linear encontra todas as keywords do dicionário,
+    independentemente do tamanho dele.
+    """
+
+    _TOKEN_PATTERN = re.compile(r'\w+|\W+')
+
+    def __init__(self, keywords: Dict[str, float]):
+        self.keywords = list(keywords.items())
+        self._lengths = [len(keyword) for keyword, _ in self.keywords]
+        # Estrutura do autômato: transições, links de falha e saídas por estado
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[int]] = [[]]
+        # Keywords que não começam/terminam em caractere de palavra não têm
+        # fronteira de token equivalente a \b e continuam via regex
+        self._fallback: List[Tuple[int, re.Pattern]] = []
+
+        for rank, (keyword, _) in enumerate(self.keywords):
+            tokens = self._tokenize(_fold_case(keyword))
+            if not tokens or not self._is_word(tokens[0]) or not self._is_word(tokens[-1]):
+                pattern = re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE)
+                self._fallback.append((rank, pattern))
+                continue
+            self._insert(tokens, rank)
+
+        self._build_failure_links()
+
+    @classmethod
+    def _tokenize(cls, text: str) -> List[str]:
+        return cls._TOKEN_PATTERN.findall(text)
+
+    @staticmethod
+    def _is_word(token: str) -> bool:
+        return token[0].isalnum() or token[0] == '_'
+
+    def _insert(self, tokens: List[str], rank: int) -> None:
+        state = 0
+        for token in tokens:
+            next_state = self._goto[state].get(token)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][token] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append(rank)
+
+    def _build_failure_links(self) -> None:
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for token, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """
+        Retorna tuplas ``(rank, start, end)`` de todas as keywords encontradas.
+
+        A ordem é a mesma do regex por keyword: primeiro pela ordem do
+        dicionário e, dentro de cada keyword, por posição, sem sobreposição
+        entre ocorrências da mesma keyword.
+        """
+        tokens = self._tokenize(_fold_case(text))
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        lengths = self._lengths
+
+        matches: List[Tuple[int, int, int]] = []
+        last_end: Dict[int, int] = {}
+        state = 0
+        position = 0
+
+        for token in tokens:
+            position += len(token)
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if not outputs[state]:
+                continue
+            for rank in outputs[state]:
+                start = position - lengths[rank]
+                if start >= last_end.get(rank, 0):
+                    matches.append((rank, start, position))
+                    last_end[rank] = position
+
+        for rank, pattern in self._fallback:
+            for match in pattern.finditer(text):
+                matches.append((rank, match.start(), match.end()))
+
+        matches.sort()
+        return matches
+
+
+class PatternKeywordEngine:
+    """
+    Motor de varredura única para os padrões regex de todos os KeywordType.
+
+    Cada padrão é indexado pelo prefixo literal com que obrigatoriamente
+    começa (``lei``, ``zot``, ``anexo``...). Um único scanner de prefixos
+    com lookahead percorre o texto uma vez e aponta as posições candidatas;
+    só nelas os padrões completos são testados. O resultado é exatamente o
+    de ``finditer`` padrão a padrão. Padrões sem prefixo literal (ex.: ``\\d+[º°]\\s*distrito``) continuam com ``finditer``.
+    """
+
+    _META_CHARS = set('\\()[]{}.*+?|^$ ')
+    _QUANTIFIERS = set('*+?{')
+    # Âncoras de largura zero no início do padrão (\b, \A, ^, lookbehind): não
+    # consomem texto, então o prefixo literal vem logo depois delas
+    _LEADING_ANCHORS = re.compile(r'(?:\\b|\\A|\^|\(\?<[=!](?:[^()\\]|\\.)*\))*')
+
+    def __init__(self, regex_patterns: Dict[KeywordType, List[str]],
+                 flags: int = re.IGNORECASE | re.MULTILINE):
+        self.entries: List[Tuple[KeywordType, re.Pattern]] = []
+        self._prefixes: Dict[str, List[Tuple[str, int]]] = {}
+        self._fallback: List[int] = []
+
+        for keyword_type, patterns in regex_patterns.items():
+            for pattern in patterns:
+                index = len(self.entries)
+                self.entries.append((keyword_type, re.compile(pattern, flags)))
+                prefix = self._literal_prefix(pattern)
+                if prefix:
+                    self._prefixes.setdefault(prefix[0], []).append((prefix, index))
+                else:
+                    self._fallback.append(index)
+
+        literals = sorted({prefix for bucket in self._prefixes.values() for prefix, _ in bucket})
+        self.scanner = (
+            re.compile('(?=(?:' + '|'.join(re.escape(lit) for lit in literals) + '))')
+            if literals else None
+        )
+
+    @classmethod
+    def _literal_prefix(cls, pattern: str) -> str:
+        """Retorna o prefixo literal (minúsculo) que todo match do padrão deve ter."""
+        pattern = pattern[cls._LEADING_ANCHORS.match(pattern).end():]
+        if '|' in pattern:
+            return ''
+        prefix = []
+        for char in pattern:
+            if char in cls._META_CHARS:
+                if char in cls._QUANTIFIERS and prefix:
+                    prefix.pop()
+                break
+            prefix.append(char)
+        return ''.join(prefix).lower()
+
+    def scan(self, text: str) -> List[Tuple[KeywordType, re.Match]]:
+        """
+        Retorna ``(tipo, match)`` de todos os padrões, na mesma ordem em que a
+        execução de cada padrão em sequência (por tipo e por padrão) os geraria.
+        """
+        entries = self.entries
+        last_end = [0] * len(entries)
+        found: List[Tuple[int, int, re.Match]] = []
+
+        if self.scanner is not None:
+            folded = _fold_case(text)
+            prefixes = self._prefixes
+            for candidate in self.scanner.finditer(folded):
+                position = candidate.start()
+                for prefix, index in prefixes[folded[position]]:
+                    if position < last_end[index] or not folded.startswith(prefix, position):
+                        continue
+                    match = entries[index][1].match(text, position)
+                    if match:
+                        found.append((index, position, match))
+                        last_end[index] = match.end()
+
+        for index in self._fallback:
+            for match in entries[index][1].finditer(text):
+                found.append((index, match.start(), match))
+
+        found.sort(key=lambda item: (item[0], item[1]))
+        return [(entries[index][0], match) for index, _, match in found]
+
+
 class KeywordDetector:
     """Detector inteligente de keywords para documentos do Plano Diretor."""
     
@@ -75,11 +333,15 @@ class KeywordDetector:
         
         # Padrões regex para diferentes tipos de referências
         self.regex_patterns = {
+            # "nº" é opcional e a data pode vir completa ("de 1º de dezembro de 1999"),
+            # para que "LC 434/99" e "Lei Complementar nº 434 de 1999" sejam detectadas.
+            # O \b inicial evita casar o fim de outra palavra ("calc 12", "bloc 3")
             KeywordType.LEGAL_REFERENCE: [
-                r'lei\s+(?:complementar\s+)?n[º°]\s*\d+(?:[\./]\d+)*(?:\s*de\s+\d{4})?',
-                r'decreto\s+n[º°]\s*\d+(?:[\./]\d+)*(?:\s*de\s+\d{4})?',
-                r'resolução\s+n[º°]\s*\d+(?:[\./]\d+)*(?:\s*de\s+\d{4})?',
-                r'portaria\s+n[º°]\s*\d+(?:[\./]\d+)*(?:\s*de\s+\d{4})?',
+                r'\blei\s+(?:complementar\s+)?(?:n[º°o.]*\s*)?\d+(?:[\./]\d+)*' + LEGAL_DATE_PATTERN,
+                r'\blc\s+(?:n[º°o.]*\s*)?\d+(?:[\./]\d+)*' + LEGAL_DATE_PATTERN,
+                r'\bdecreto\s+(?:n[º°o.]*\s*)?\d+(?:[\./]\d+)*' + LEGAL_DATE_PATTERN,
+                r'\bresolução\s+(?:n[º°o.]*\s*)?\d+(?:[\./]\d+)*' + LEGAL_DATE_PATTERN,
+                r'\bportaria\s+(?:n[º°o.]*\s*)?\d+(?:[\./]\d+)*' + LEGAL_DATE_PATTERN,
             ],
             KeywordType.ZOT_REFERENCE: [
                 r'zot\s*\d+(?:\.\d+)?',
@@ -118,31 +380,45 @@ class KeywordDetector:
                 re.compile(pattern, re.IGNORECASE | re.MULTILINE)
                 for pattern in patterns
             ]
+        
+        # Motor único para os padrões de todos os tipos (uma varredura por texto)
+        self.pattern_engine = PatternKeywordEngine(self.regex_patterns)
+        
+        # Autômato único para todas as keywords compostas (uma varredura por texto).
+        # Alterações em composite_keywords exigem reconstruir o matcher.
+        self.composite_matcher = CompositeKeywordMatcher(self.composite_keywords)
+
+    def patterns_version(self) -> str:
+        """
+        Impressão digital das keywords compostas e dos padrões regex do
+        detector. Keywords armazenadas com outra versão foram detectadas com
+        outras regras e não devem ser reaproveitadas.
+        """
+        state = repr((
+            sorted(self.composite_keywords.items()),
+            [(keyword_type.value, pattern)
+             for keyword_type, patterns in self.regex_patterns.items() for pattern in patterns],
+        ))
+        return hashlib.sha1(state.encode('utf-8')).hexdigest()[:16]
 
     def extract_composite_keywords(self, text: str) -> List[Keyword]:
         """Extrai keywords compostas prioritárias do texto."""
         keywords = []
-        text_lower = text.lower()
         
-        for keyword, priority in self.composite_keywords.items():
-            # Procura por matches exatos ou parciais
-            pattern = re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE)
-            matches = pattern.finditer(text)
+        for rank, match_start, match_end in self.composite_matcher.find_all(text):
+            priority = self.composite_matcher.keywords[rank][1]
+            match_text = text[match_start:match_end]
             
-            for match in matches:
-                # Extrai contexto ao redor da keyword
-                start = max(0, match.start() - 50)
-                end = min(len(text), match.end() + 50)
-                context = text[start:end].strip()
-                
-                keywords.append(Keyword(
-                    text=match.group(),
-                    type=KeywordType.COMPOSITE,
-                    position=match.start(),
-                    length=len(match.group()),
-                    confidence=priority / 10.0,  # Normaliza para 0-1
-                    context=context
-                ))
+            # Contexto de 50 caracteres ao redor da keyword, recortado sob demanda
+            keywords.append(Keyword(
+                text=match_text,
+                type=KeywordType.COMPOSITE,
+                position=match_start,
+                length=len(match_text),
+                confidence=priority / 10.0,  # Normaliza para 0-1
+                source=text,
+                context_window=50
+            ))
         
         return keywords
 
@@ -154,28 +430,37 @@ class KeywordDetector:
             return keywords
             
         for pattern in self.compiled_patterns[keyword_type]:
-            matches = pattern.finditer(text)
-            
-            for match in matches:
-                # Extrai contexto ao redor da keyword
-                start = max(0, match.start() - 30)
-                end = min(len(text), match.end() + 30)
-                context = text[start:end].strip()
-                
-                # Calcula confiança baseada no tipo
-                confidence = self._calculate_confidence(keyword_type, match.group())
-                
-                keywords.append(Keyword(
-                    text=match.group(),
-                    type=keyword_type,
-                    position=match.start(),
-                    length=len(match.group()),
-                    confidence=confidence,
-                    context=context
-                ))
+            for match in pattern.finditer(text):
+                keywords.append(self._build_pattern_keyword(text, keyword_type, match))
         
         return keywords
 
+    def extract_all_pattern_keywords(self, text: str) -> List[Keyword]:
+        """Extrai keywords de todos os tipos baseados em regex em uma única varredura."""
+        return [
+            self._build_pattern_keyword(text, keyword_type, match)
+            for keyword_type, match in self.pattern_engine.scan(text)
+        ]
+
+    def _build_pattern_keyword(self, text: str, keyword_type: KeywordType,
+                               match: re.Match) -> Keyword:
+        """Cria a Keyword de um match regex, com contexto e confiança."""
+        match_text = match.group()
+        
+        # Calcula confiança baseada no tipo
+        confidence = self._calculate_confidence(keyword_type, match_text)
+        
+        # Contexto de 30 caracteres ao redor da keyword, recortado sob demanda
+        return Keyword(
+            text=match_text,
+            type=keyword_type,
+            position=match.start(),
+            length=len(match_text),
+            confidence=confidence,
+            source=text,
+            context_window=30
+        )
+
     def _calculate_confidence(self, keyword_type: KeywordType, text: str) -> float:
         """Calcula a confiança da detecção baseada no tipo e texto."""
         base_confidence = {
@@ -203,10 +488,8 @@ class KeywordDetector:
         # Extrai keywords compostas
         all_keywords.extend(self.extract_composite_keywords(text))
         
-        # Extrai keywords por padrão
-        for keyword_type in KeywordType:
-            if keyword_type != KeywordType.COMPOSITE:
-                all_keywords.extend(self.extract_pattern_keywords(text, keyword_type))
+        # Extrai keywords por padrão (todos os tipos em uma única varredura)
+        all_keywords.extend(self.extract_all_pattern_keywords(text))
         
         # Remove duplicatas e ordena por posição
         unique_keywords = self._remove_duplicates(all_keywords)
@@ -279,14 +562,39 @@ class KeywordDetector:
         # Normaliza pelo número de keywords para evitar favorecimento de chunks longos
         return total_score / max(1, len(keywords))
 
-    def process_document_chunks(self, chunks: List[str]) -> List[ChunkKeywords]:
-        """Processa todos os chunks de um documento e extrai keywords."""
-        chunk_keywords_list = []
+    def process_document_chunks(self, chunks: List[str], workers: int = 1,
+                                batch_size: int = 250) -> List[ChunkKeywords]:
+        """
+        Processa todos os chunks de um documento e extrai keywords.
         
-        for i, chunk in enumerate(chunks):
-            chunk_keywords = self.analyze_chunk_keywords(chunk, i)
-            chunk_keywords_list.append(chunk_keywords)
+        Args:
+            chunks: Textos dos chunks, na ordem do documento
+            workers: Lotes analisados ao mesmo tempo no pool de processos
+                compartilhado (1 = serial, 0 ou negativo = todos os processos do pool)
+            batch_size: Chunks enviados a cada processo por tarefa
+            
+        Returns:
+            ChunkKeywords na mesma ordem dos chunks de entrada
+        """
+        pool_size = process_pool_size()
+        workers = pool_size if workers <= 0 else min(workers, pool_size)
+        workers = min(workers, -(-len(chunks) // max(1, batch_size)))
+        
+        if workers <= 1 or len(chunks) < PARALLEL_MIN_CHUNKS:
+            return [self.analyze_chunk_keywords(chunk, i) for i, chunk in enumerate(chunks)]
         
+        # Cada tarefa leva este detector serializado (incluindo keywords customizadas);
+        # os processos do pool o desserializam uma vez e o reaproveitam pela chave
+        detector_state = pickle.dumps(self)
+        detector_key = hashlib.sha1(detector_state).hexdigest()
+        batches = [
+            (detector_key, detector_state, start, chunks[start:start + batch_size])
+            for start in range(0, len(chunks), batch_size)
+        ]
+        
+        chunk_keywords_list = []
+        for batch_result in map_in_pool(_analyze_chunk_batch, batches, max_in_flight=workers):
+            chunk_keywords_list.extend(batch_result)
         return chunk_keywords_list
 
     def get_priority_chunks(self, chunk_keywords_list: List[ChunkKeywords], 
@@ -298,72 +606,465 @@ class KeywordDetector:
             reverse=True
         )[:top_n]
 
-    def search_keywords_in_chunks(self, chunk_keywords_list: List[ChunkKeywords], 
+    def build_keyword_index(self, chunk_keywords_list: List[ChunkKeywords]) -> "KeywordIndex":
+        """Cria um índice invertido reutilizável para buscas nos chunks."""
+        return KeywordIndex(chunk_keywords_list)
+
+    def search_keywords_in_chunks(self, chunk_keywords_list: Union[List[ChunkKeywords], "KeywordIndex"],
                                 query_keywords: List[str]) -> List[ChunkKeywords]:
-        """Busca chunks que contêm keywords específicas da query."""
-        relevant_chunks = []
-        query_lower = [kw.lower() for kw in query_keywords]
-        
-        for chunk_keywords in chunk_keywords_list:
-            chunk_text_lower = chunk_keywords.chunk_text.lower()
-            
-            # Verifica se alguma keyword da query está presente
-            has_query_keyword = any(
-                query_kw in chunk_text_lower for query_kw in query_lower
-            )
-            
-            # Verifica se há keywords detectadas relacionadas
-            has_related_keywords = any(
-                any(query_kw in kw.text.lower() for query_kw in query_lower)
-                for kw in chunk_keywords.keywords
-            )
-            
-            if has_query_keyword or has_related_keywords:
-                relevant_chunks.append(chunk_keywords)
+        """
+        Busca chunks que contêm keywords específicas da query.
         
-        # Ordena por relevância (prioridade + número de matches)
-        return sorted(relevant_chunks, key=lambda x: x.priority_score, reverse=True)
+        Aceita a lista de ChunkKeywords (uma varredura linear, mais barata
+        que montar o índice para uma única busca) ou um KeywordIndex já
+        construído; para várias buscas sobre os mesmos chunks, construa o
+        índice uma vez com build_keyword_index e reutilize-o.
+        """
+        if isinstance(chunk_keywords_list, KeywordIndex):
+            return chunk_keywords_list.search(query_keywords)
+        return _linear_keyword_search(chunk_keywords_list, query_keywords)
 
     def generate_keywords_summary(self, chunk_keywords_list: List[ChunkKeywords]) -> Dict:
         """Gera um resumo das keywords detectadas no documento."""
-        all_keywords = []
+        accumulator = KeywordsSummaryAccumulator()
         for chunk_keywords in chunk_keywords_list:
-            all_keywords.extend(chunk_keywords.keywords)
-        
-        # Conta keywords por tipo
-        type_counts = {}
-        for keyword_type in KeywordType:
-            type_counts[keyword_type.value] = len([
-                k for k in all_keywords if k.type == keyword_type
-            ])
-        
-        # Top keywords compostas
-        composite_keywords = [k for k in all_keywords if k.type == KeywordType.COMPOSITE]
-        top_composite = sorted(composite_keywords, key=lambda x: x.confidence, reverse=True)[:5]
+            accumulator.add(chunk_keywords)
+        return accumulator.to_summary()
+
+
+class KeywordsSummaryAccumulator:
+    """
+    Agregador incremental do resumo de keywords de um documento.
+
+    Consome ChunkKeywords um a um mantendo apenas contadores, o top de
+    keywords compostas e o conjunto de referências legais únicas, sem
+    guardar a lista de keywords. Acumuladores podem ser combinados com
+    merge (ex.: workers paralelos ou vários documentos) e geram o mesmo
+    JSON de ``keywords_summary``.
+    """
+
+    TOP_COMPOSITE = 5
+
+    def __init__(self):
+        self.total_keywords = 0
+        self.type_counts: Dict[str, int] = {keyword_type.value: 0 for keyword_type in KeywordType}
+        self.legal_references: Dict[str, None] = {}
+        self.chunks_count = 0
+        self.chunks_with_high_priority = 0
+        self.priority_sum = 0.0
+        # Heap mínimo de (confiança, -ordem, texto): o topo é o pior do top-N;
+        # a ordem desempata como o sort estável do cálculo em lista
+        self._top_composite: List[Tuple[float, int, str]] = []
+        self._composite_seen = 0
+
+    def add(self, chunk_keywords: ChunkKeywords) -> "KeywordsSummaryAccumulator":
+        """Incorpora as keywords de um chunk ao resumo."""
+        for keyword in chunk_keywords.keywords:
+            self.total_keywords += 1
+            self.type_counts[keyword.type.value] += 1
+            if keyword.type == KeywordType.COMPOSITE:
+                self._push_composite(keyword.confidence, self._composite_seen, keyword.text)
+                self._composite_seen += 1
+            elif keyword.type == KeywordType.LEGAL_REFERENCE:
+                self.legal_references[keyword.text] = None
         
-        # Referências legais únicas
-        legal_refs = list(set([
-            k.text for k in all_keywords if k.type == KeywordType.LEGAL_REFERENCE
-        ]))
+        self.chunks_count += 1
+        self.priority_sum += chunk_keywords.priority_score
+        if chunk_keywords.priority_score > 1.0:
+            self.chunks_with_high_priority += 1
+        return self
+
+    def add_serialized(self, enhanced_chunk: Dict) -> "KeywordsSummaryAccumulator":
+        """Incorpora um chunk já serializado (ex.: linha de document_embeddings)."""
+        for keyword in enhanced_chunk.get("keywords") or []:
+            type_value = keyword.get("type")
+            self.total_keywords += 1
+            self.type_counts[type_value] = self.type_counts.get(type_value, 0) + 1
+            if type_value == KeywordType.COMPOSITE.value:
+                self._push_composite(keyword.get("confidence", 0.0), self._composite_seen, keyword.get("text", ""))
+                self._composite_seen += 1
+            elif type_value == KeywordType.LEGAL_REFERENCE.value:
+                self.legal_references[keyword.get("text", "")] = None
         
+        priority_score = enhanced_chunk.get("priority_score") or 0.0
+        self.chunks_count += 1
+        self.priority_sum += priority_score
+        if priority_score > 1.0:
+            self.chunks_with_high_priority += 1
+        return self
+
+    def _push_composite(self, confidence: float, order: int, text: str) -> None:
+        entry = (confidence, -order, text)
+        if len(self._top_composite) < self.TOP_COMPOSITE:
+            heapq.heappush(self._top_composite, entry)
+        elif entry > self._top_composite[0]:
+            heapq.heapreplace(self._top_composite, entry)
+
+    def merge(self, other: "KeywordsSummaryAccumulator") -> "KeywordsSummaryAccumulator":
+        """Combina outro acumulador a este, como se seus chunks viessem depois."""
+        self.total_keywords += other.total_keywords
+        for type_value, count in other.type_counts.items():
+            self.type_counts[type_value] = self.type_counts.get(type_value, 0) + count
+        self.legal_references.update(other.legal_references)
+        self.chunks_count += other.chunks_count
+        self.chunks_with_high_priority += other.chunks_with_high_priority
+        self.priority_sum += other.priority_sum
+        for confidence, negative_order, text in other._top_composite:
+            self._push_composite(confidence, self._composite_seen - negative_order, text)
+        self._composite_seen += other._composite_seen
+        return self
+
+    def to_summary(self) -> Dict:
+        """Gera o dicionário no formato de ``keywords_summary``."""
+        top_composite = sorted(self._top_composite, key=lambda entry: (-entry[0], -entry[1]))
         return {
-            "total_keywords": len(all_keywords),
-            "keywords_by_type": type_counts,
-            "top_composite_keywords": [k.text for k in top_composite],
-            "legal_references": legal_refs,
-            "chunks_with_high_priority": len([
-                ck for ck in chunk_keywords_list if ck.priority_score > 1.0
-            ]),
-            "average_priority_score": sum(ck.priority_score for ck in chunk_keywords_list) / max(1, len(chunk_keywords_list))
+            "total_keywords": self.total_keywords,
+            "keywords_by_type": dict(self.type_counts),
+            "top_composite_keywords": [text for _, _, text in top_composite],
+            "legal_references": list(self.legal_references),
+            "chunks_with_high_priority": self.chunks_with_high_priority,
+            "average_priority_score": self.priority_sum / max(1, self.chunks_count)
         }
 
 
+class SubstringIndex:
+    """
+    Busca das strings de um conjunto que contêm um trecho, via n-gramas.
+
+    Cada string é indexada pelos seus 1, 2 e 3-gramas; um trecho curto é
+    resolvido direto pelo n-grama e um mais longo pela interseção dos seus
+    trigramas, com conferência final por substring. Evita percorrer todo o
+    conjunto quando o trecho pode estar no meio da string.
+    """
+
+    GRAM_SIZE = 3
+
+    def __init__(self, strings: Iterable[str]):
+        self._strings = list(strings)
+        self._grams: Dict[str, Set[int]] = {}
+        for position, string in enumerate(self._strings):
+            for size in range(1, self.GRAM_SIZE + 1):
+                for start in range(len(string) - size + 1):
+                    self._grams.setdefault(string[start:start + size], set()).add(position)
+
+    def containing(self, fragment: str) -> List[str]:
+        if not fragment:
+            return list(self._strings)
+        if len(fragment) <= self.GRAM_SIZE:
+            return [self._strings[position] for position in self._grams.get(fragment, ())]
+
+        gram_sets = []
+        for start in range(len(fragment) - self.GRAM_SIZE + 1):
+            positions = self._grams.get(fragment[start:start + self.GRAM_SIZE])
+            if not positions:
+                return []
+            gram_sets.append(positions)
+        gram_sets.sort(key=len)
+        candidates = set(gram_sets[0])
+        for positions in gram_sets[1:]:
+            candidates &= positions
+            if not candidates:
+                return []
+        return [self._strings[position] for position in candidates if fragment in self._strings[position]]
+
+
+class KeywordIndex:
+    """
+    Índice invertido sobre uma lista de ChunkKeywords.
+
+    Mapeia as palavras normalizadas de cada chunk e os textos das keywords
+    detectadas para listas de postings. Um termo de busca é decomposto em
+    palavras: as internas devem existir inteiras no chunk, as das pontas
+    podem ser prefixo/sufixo de uma palavra (resolvido por bisect sobre o
+    vocabulário ordenado) e uma palavra aberta dos dois lados pode estar em
+    qualquer parte de uma palavra (resolvido por n-gramas). Só os candidatos
+    resultantes são verificados por substring, o que preserva a semântica
+    da busca linear anterior.
+    """
+
+    _WORD_PATTERN = re.compile(r'\w+')
+
+    # Termos com resultado guardado por índice (o índice pode ficar em cache por muito tempo)
+    LOOKUP_CACHE_SIZE = 1024
+
+    def __init__(self, chunk_keywords_list: List[ChunkKeywords]):
+        self.chunks = list(chunk_keywords_list)
+        self._texts = [ck.chunk_text.lower() for ck in self.chunks]
+        self._words: Dict[str, Set[int]] = {}
+        self._keywords: Dict[str, Set[int]] = {}
+
+        for position, (chunk_keywords, text) in enumerate(zip(self.chunks, self._texts)):
+            for word in set(self._WORD_PATTERN.findall(text)):
+                self._words.setdefault(word, set()).add(position)
+            for keyword in chunk_keywords.keywords:
+                self._keywords.setdefault(keyword.text.lower(), set()).add(position)
+
+        self._vocabulary = sorted(self._words)
+        self._reversed_vocabulary = sorted(word[::-1] for word in self._words)
+        # Montados no primeiro termo que precisa deles
+        self._vocabulary_substrings: Optional[SubstringIndex] = None
+        self._keyword_substrings: Optional[SubstringIndex] = None
+        self._lookup_cache: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def _with_prefix(self, vocabulary: List[str], prefix: str) -> List[str]:
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + '\U0010ffff')
+        return vocabulary[start:end]
+
+    def _word_postings(self, word: str, open_left: bool, open_right: bool) -> Set[int]:
+        """Chunks com uma palavra compatível com ``word`` (aberta à esquerda/direita)."""
+        if not open_left and not open_right:
+            return self._words.get(word, set())
+        if open_left and open_right:
+            if self._vocabulary_substrings is None:
+                self._vocabulary_substrings = SubstringIndex(self._vocabulary)
+            matching = self._vocabulary_substrings.containing(word)
+        elif open_right:
+            matching = self._with_prefix(self._vocabulary, word)
+        else:
+            matching = [w[::-1] for w in self._with_prefix(self._reversed_vocabulary, word[::-1])]
+        postings: Set[int] = set()
+        for w in matching:
+            postings |= self._words[w]
+        return postings
+
+    def _candidates(self, term: str) -> Set[int]:
+        words = list(self._WORD_PATTERN.finditer(term))
+        if not words:
+            return set(range(len(self.chunks)))
+
+        candidate_sets = []
+        for match in words:
+            candidate_sets.append(self._word_postings(
+                match.group(),
+                open_left=match.start() == 0,
+                open_right=match.end() == len(term)
+            ))
+        candidate_sets.sort(key=len)
+
+        candidates = set(candidate_sets[0])
+        for postings in candidate_sets[1:]:
+            candidates &= postings
+            if not candidates:
+                break
+        return candidates
+
+    def lookup(self, term: str) -> Set[int]:
+        """Posições dos chunks cujo texto (ou alguma keyword detectada) contém o termo."""
+        term = term.lower()
+        cached = self._lookup_cache.get(term)
+        if cached is not None:
+            return cached
+
+        texts = self._texts
+        positions = {pos for pos in self._candidates(term) if term in texts[pos]}
+        if self._keywords:
+            if self._keyword_substrings is None:
+                self._keyword_substrings = SubstringIndex(self._keywords)
+            for keyword_text in self._keyword_substrings.containing(term):
+                positions |= self._keywords[keyword_text]
+
+        if len(self._lookup_cache) >= self.LOOKUP_CACHE_SIZE:
+            self._lookup_cache.clear()
+        self._lookup_cache[term] = positions
+        return positions
+
+    def search(self, query_keywords: List[str]) -> List[ChunkKeywords]:
+        """Chunks que contêm algum dos termos, ordenados por prioridade."""
+        positions: Set[int] = set()
+        for term in query_keywords:
+            positions |= self.lookup(term)
+        relevant_chunks = [self.chunks[pos] for pos in sorted(positions)]
+        return sorted(relevant_chunks, key=lambda x: x.priority_score, reverse=True)
+
+
+def _linear_keyword_search(chunk_keywords_list: List[ChunkKeywords],
+                           query_keywords: List[str]) -> List[ChunkKeywords]:
+    """Mesma busca de KeywordIndex.search, percorrendo os chunks uma vez."""
+    query_lower = [kw.lower() for kw in query_keywords]
+    relevant_chunks = []
+    for chunk_keywords in chunk_keywords_list:
+        chunk_text_lower = chunk_keywords.chunk_text.lower()
+        keyword_texts = [kw.text.lower() for kw in chunk_keywords.keywords]
+        if any(
+            term in chunk_text_lower or any(term in keyword_text for keyword_text in keyword_texts)
+            for term in query_lower
+        ):
+            relevant_chunks.append(chunk_keywords)
+    
+    # Ordena por relevância (prioridade)
+    return sorted(relevant_chunks, key=lambda x: x.priority_score, reverse=True)
+
+
+class ChunkKeywordsCache:
+    """
+    Cache LRU de análises de chunks, indexado pelo hash do conteúdo.
+
+    Chunks populares chegam repetidamente em filter_chunks_by_query; com o
+    cache a detecção só roda para chunks ainda não vistos pelo processo.
+    Também guarda o KeywordIndex dos conjuntos de chunks que se repetem
+    (ver search_chunks).
+    """
+
+    def __init__(self, max_size: int = 5000, max_indexes: int = 64):
+        self.max_size = max_size
+        self.max_indexes = max_indexes
+        self._entries: "OrderedDict[bytes, ChunkKeywords]" = OrderedDict()
+        # Conjunto de chunks → índice; None marca um conjunto visto uma única vez
+        self._indexes: "OrderedDict[bytes, Optional[KeywordIndex]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.index_hits = 0
+
+    @staticmethod
+    def _key(chunk_text: str) -> bytes:
+        return hashlib.blake2b(chunk_text.encode('utf-8'), digest_size=16).digest()
+
+    def get(self, chunk_text: str) -> Optional[ChunkKeywords]:
+        key = self._key(chunk_text)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached
+
+    def put(self, chunk_text: str, chunk_keywords: ChunkKeywords) -> None:
+        if self.max_size <= 0:
+            return
+        key = self._key(chunk_text)
+        with self._lock:
+            self._entries[key] = chunk_keywords
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def analyze_chunks(self, detector: "KeywordDetector", chunks: List[str]) -> List[ChunkKeywords]:
+        """Equivalente a process_document_chunks, reaproveitando análises em cache."""
+        chunk_keywords_list = []
+        for i, chunk in enumerate(chunks):
+            cached = self.get(chunk)
+            if cached is None:
+                cached = detector.analyze_chunk_keywords(chunk, i)
+                self.put(chunk, cached)
+            elif cached.chunk_index != i:
+                cached = replace(cached, chunk_index=i)
+            chunk_keywords_list.append(cached)
+        return chunk_keywords_list
+
+    def search_chunks(self, detector: "KeywordDetector", chunks: List[str],
+                      query_keywords: List[str]) -> List[ChunkKeywords]:
+        """
+        Equivalente a search_keywords_in_chunks sobre analyze_chunks(chunks).
+
+        Na primeira vez que um conjunto de chunks aparece, a busca é linear
+        (montar o índice custaria mais que ela); se o mesmo conjunto voltar,
+        o KeywordIndex é montado e reaproveitado nas consultas seguintes.
+        """
+        set_key = hashlib.blake2b(b''.join(self._key(chunk) for chunk in chunks),
+                                  digest_size=16).digest()
+        with self._lock:
+            seen = set_key in self._indexes
+            index = self._indexes.get(set_key)
+            if seen:
+                self._indexes.move_to_end(set_key)
+            if index is not None:
+                self.index_hits += 1
+        if index is not None:
+            return index.search(query_keywords)
+
+        chunk_keywords_list = self.analyze_chunks(detector, chunks)
+        if self.max_indexes <= 0:
+            return _linear_keyword_search(chunk_keywords_list, query_keywords)
+
+        index = KeywordIndex(chunk_keywords_list) if seen else None
+        with self._lock:
+            self._indexes[set_key] = index
+            self._indexes.move_to_end(set_key)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        if index is None:
+            return _linear_keyword_search(chunk_keywords_list, query_keywords)
+        return index.search(query_keywords)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._indexes.clear()
+            self.hits = self.misses = self.evictions = self.index_hits = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "indexes": sum(1 for index in self._indexes.values() if index is not None),
+                "index_hits": self.index_hits
+            }
+
+
+# Detectores já desserializados em cada processo do pool, por chave do estado
+_worker_detectors: Dict[str, KeywordDetector] = {}
+WORKER_DETECTORS_MAX = 4
+
+
+def _analyze_chunk_batch(batch: Tuple[str, bytes, int, List[str]]) -> List[ChunkKeywords]:
+    detector_key, detector_state, start, chunks = batch
+    detector = _worker_detectors.get(detector_key)
+    if detector is None:
+        if len(_worker_detectors) >= WORKER_DETECTORS_MAX:
+            _worker_detectors.clear()
+        detector = _worker_detectors[detector_key] = pickle.loads(detector_state)
+    return [
+        detector.analyze_chunk_keywords(chunk, start + offset)
+        for offset, chunk in enumerate(chunks)
+    ]
+
+
+# Detector e cache compartilhados pelas chamadas de filter_chunks_by_query no processo
+_shared_detector: Optional[KeywordDetector] = None
+_chunk_keywords_cache = ChunkKeywordsCache(
+    max_size=int(os.environ.get("KEYWORDS_CACHE_SIZE", "5000")),
+    max_indexes=int(os.environ.get("KEYWORDS_INDEX_CACHE_SIZE", "64"))
+)
+
+
+def get_shared_detector() -> KeywordDetector:
+    """Retorna o KeywordDetector padrão do processo, criado sob demanda."""
+    global _shared_detector
+    if _shared_detector is None:
+        _shared_detector = KeywordDetector()
+    return _shared_detector
+
+
+def get_chunk_keywords_cache() -> ChunkKeywordsCache:
+    """Retorna o cache de análises de chunks do processo (ex.: para ler stats())."""
+    return _chunk_keywords_cache
+
+
 # Funções utilitárias para integração com o sistema existente
 def enhance_chunks_with_keywords(chunks: List[str]) -> List[Dict]:
     """Melhora chunks existentes com informações de keywords."""
     detector = KeywordDetector()
     chunk_keywords_list = detector.process_document_chunks(chunks)
-    
+    return serialize_chunk_keywords(chunk_keywords_list)
+
+
+def serialize_chunk_keywords(chunk_keywords_list: List[ChunkKeywords]) -> List[Dict]:
+    """Converte keywords já detectadas para o formato de chunk enriquecido."""
     enhanced_chunks = []
     for chunk_keywords in chunk_keywords_list:
         enhanced_chunks.append({
@@ -388,8 +1089,7 @@ def enhance_chunks_with_keywords(chunks: List[str]) -> List[Dict]:
 
 def filter_chunks_by_query(chunks: List[str], query: str) -> List[str]:
     """Filtra chunks baseado na query usando detecção de keywords."""
-    detector = KeywordDetector()
-    chunk_keywords_list = detector.process_document_chunks(chunks)
+    detector = get_shared_detector()
     
     # Extrai keywords da query
     query_keywords = detector.extract_all_keywords(query)
@@ -399,8 +1099,8 @@ def filter_chunks_by_query(chunks: List[str], query: str) -> List[str]:
     if not query_terms:
         query_terms = query.split()
     
-    # Busca chunks relevantes
-    relevant_chunks = detector.search_keywords_in_chunks(chunk_keywords_list, query_terms)
+    # Busca chunks relevantes (com o índice em cache quando o conjunto de chunks se repete)
+    relevant_chunks = _chunk_keywords_cache.search_chunks(detector, chunks, query_terms)
     
     # Retorna apenas o texto dos chunks mais relevantes
     return [ck.chunk_text for ck in relevant_chunks[:10]]  # Top 10 chunks
\ No newline at end of file
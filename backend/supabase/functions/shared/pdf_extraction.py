@@ -0,0 +1,64 @@
+"""
+Extração do texto de PDFs por faixas de páginas, para rodar nos processos do
+pool compartilhado da ingestão (process_pool).
+
+Cada tarefa leva os bytes do PDF e a faixa de páginas. Os processos guardam
+os últimos documentos abertos, então as faixas de um mesmo PDF que caem no
+mesmo processo não o reabrem. O texto volta bruto; a limpeza fica com quem
+chama.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import List, Tuple
+
+try:
+    import fitz  # PyMuPDF
+    FITZ_AVAILABLE = True
+except ImportError:
+    FITZ_AVAILABLE = False
+
+# (chave do documento, bytes do PDF, primeira página, página final exclusiva)
+PageRangeTask = Tuple[str, bytes, int, int]
+
+# Documentos abertos mantidos por processo do pool
+WORKER_DOCUMENTS_MAX = 2
+
+_worker_documents: "OrderedDict[str, object]" = OrderedDict()
+
+
+def page_texts(pdf, start: int, end: int) -> List[str]:
+    """Texto bruto das páginas [start, end) de um documento aberto."""
+    return [pdf[page_num].get_text() for page_num in range(start, end)]
+
+
+def page_range_tasks(pdf_bytes: bytes, page_count: int, parts: int) -> List[PageRangeTask]:
+    """Divide as páginas em até `parts` faixas contíguas, na ordem do documento."""
+    key = hashlib.sha1(pdf_bytes).hexdigest()
+    range_size = max(1, -(-page_count // max(1, parts)))
+    return [
+        (key, pdf_bytes, start, min(start + range_size, page_count))
+        for start in range(0, page_count, range_size)
+    ]
+
+
+def _open_document(key: str, pdf_bytes: bytes):
+    pdf = _worker_documents.get(key)
+    if pdf is not None:
+        _worker_documents.move_to_end(key)
+        return pdf
+
+    pdf = fitz.open(stream=pdf_bytes, filetype="pdf")
+    _worker_documents[key] = pdf
+    while len(_worker_documents) > WORKER_DOCUMENTS_MAX:
+        _, oldest = _worker_documents.popitem(last=False)
+        oldest.close()
+    return pdf
+
+
+def extract_page_range(task: PageRangeTask) -> List[str]:
+    """Executada no pool: texto bruto de uma faixa de páginas."""
+    if not FITZ_AVAILABLE:
+        raise ImportError("PyMuPDF (fitz) is required for PDF extraction")
+    key, pdf_bytes, start, end = task
+    return page_texts(_open_document(key, pdf_bytes), start, end)
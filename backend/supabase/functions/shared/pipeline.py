@@ -0,0 +1,46 @@
+"""
+Estágios assíncronos ligados por filas limitadas, usados pela ingestão.
+
+Cada estágio lê da fila anterior e escreve na seguinte; uma fila cheia faz o
+estágio anterior esperar (backpressure), então os estágios rodam sobrepostos
+e a memória fica limitada ao tamanho das filas, não ao do documento. O fim do
+fluxo é sinalizado com PIPELINE_END.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, List
+
+# Marca de fim do fluxo, enviada por cada estágio ao terminar
+PIPELINE_END = object()
+
+
+def bounded_queue(size: int) -> asyncio.Queue:
+    """Fila entre dois estágios, com no máximo `size` itens (mínimo 1)."""
+    return asyncio.Queue(maxsize=max(1, size))
+
+
+async def drain(queue: asyncio.Queue) -> AsyncIterator[Any]:
+    """Itens da fila até PIPELINE_END."""
+    while True:
+        item = await queue.get()
+        if item is PIPELINE_END:
+            return
+        yield item
+
+
+async def run_stages(*stages: Awaitable) -> List[Any]:
+    """
+    Executa os estágios concorrentemente até todos terminarem e retorna o
+    resultado de cada um, na ordem recebida.
+
+    Se um falhar, os demais são cancelados (e não ficam presos numa fila
+    que não será mais consumida) e o erro é propagado.
+    """
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
@@ -0,0 +1,102 @@
+"""
+Pool de processos compartilhado pelas etapas CPU-bound da ingestão
+(detecção de keywords e extração de PDFs).
+
+Há um único pool por processo, criado no primeiro uso e reaproveitado por
+todos os documentos, então o número de processos fica limitado a
+INGESTION_PROCESS_WORKERS mesmo com vários documentos sendo processados ao
+mesmo tempo. Os workers usam o contexto "spawn": o pool é acionado de
+dentro de threads (asyncio.to_thread), e um fork de processo com threads
+pode herdar locks travados.
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterable, List, Optional
+
+# Sem configuração, o pool usa no máximo este número de processos
+DEFAULT_MAX_PROCESS_WORKERS = 4
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def process_pool_size() -> int:
+    """
+    Processos do pool, de INGESTION_PROCESS_WORKERS (1 = sem pool, tudo serial;
+    0 ou vazio = núcleos da máquina, até DEFAULT_MAX_PROCESS_WORKERS).
+    """
+    configured = int(os.environ.get("INGESTION_PROCESS_WORKERS") or "0")
+    if configured > 0:
+        return configured
+    return max(1, min(DEFAULT_MAX_PROCESS_WORKERS, os.cpu_count() or 1))
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """Pool compartilhado do processo, ou None se configurado para 1 processo."""
+    global _pool
+    size = process_pool_size()
+    if size <= 1:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=size,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    # Um worker que morreu inutiliza o pool; o próximo uso cria outro
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def map_in_pool(function: Callable[[Any], Any], items: Iterable[Any],
+                max_in_flight: Optional[int] = None) -> List[Any]:
+    """
+    Aplica `function` a cada item no pool compartilhado, com até
+    `max_in_flight` tarefas pendentes (padrão: o tamanho do pool), e retorna
+    os resultados na ordem dos itens. Sem pool, roda no próprio processo.
+    """
+    pool = get_process_pool()
+    if pool is None:
+        return [function(item) for item in items]
+
+    max_in_flight = max(1, max_in_flight or process_pool_size())
+    results: List[Any] = []
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(pool.submit(function, item))
+            if len(pending) >= max_in_flight:
+                results.append(pending.popleft().result())
+        while pending:
+            results.append(pending.popleft().result())
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+    return results
+
+
+def shutdown_process_pool() -> None:
+    """Encerra o pool compartilhado (chamado na saída do processo)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+atexit.register(shutdown_process_pool)
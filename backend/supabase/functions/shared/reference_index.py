@@ -0,0 +1,305 @@
+"""
+Índice de referências canônicas → chunks, mantido pela ingestão.
+
+A detecção de keywords já marca as referências a ZOTs e as citações legais
+de cada chunk; aqui elas são normalizadas para um código canônico e
+indexadas com a prioridade do chunk:
+    "zot 8.2", "ZOT8.2", "zona 08.2"                  → "ZOT 08.2"
+    "LC 434/99", "Lei Complementar nº 434 de 1999"    → "LC 434/1999" (e "LC 434")
+    "lei complementar n° 434"                         → "LC 434" (e "LC 434/?", sem ano)
+Uma busca por ZOT ou por lei vira uma consulta ao dicionário mais a leitura
+dos chunks de maior prioridade, sem LIKE sobre a tabela inteira.
+"""
+
+import heapq
+import json
+import os
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from vector_index import PAYLOAD_COLUMNS
+
+ZOT_CODE_PATTERN = re.compile(r'^(?:zot|zona|zoneamento)?\s*0*(\d+)(?:\.(\d+))?$')
+
+# Tipos de norma e suas abreviações (texto já sem acentos e em minúsculas)
+LEGAL_KINDS = {
+    "lei complementar": "LC",
+    "lc": "LC",
+    "lei": "LEI",
+    "decreto": "DECRETO",
+    "dec": "DECRETO",
+    "resolucao": "RESOLUCAO",
+    "portaria": "PORTARIA",
+}
+
+LEGAL_CITATION_PATTERN = re.compile(
+    r'\b(' + '|'.join(sorted(LEGAL_KINDS, key=len, reverse=True)) + r')\.?\s*'
+    r'(?:n(?:umero|ro)?\s*[o°.]*\s*)?'         # "nº", "n°", "n.º", "no", "número"
+    r'(\d+(?:\.\d{3})*)'                        # número, com ou sem ponto de milhar
+    r'(?:\s*/\s*(\d{4}|\d{2})\b)?'               # "/1999" ou "/99"
+    r'(?:,?\s*de\s+(?:\d{1,2}[o°]?\s+de\s+[a-z]+\s+de\s+)?(\d{4}))?'  # "de 1999" ou data completa
+)
+
+# Anos com dois dígitos até este valor são do século XXI ("/20" → 2020, "/99" → 1999)
+TWO_DIGIT_YEAR_PIVOT = 50
+
+
+def canonical_zot_code(reference: str) -> Optional[str]:
+    """
+    Código canônico de uma referência a ZOT ("zot 8.2" → "ZOT 08.2").
+    Aceita o número sozinho ("8.2"); retorna None se não for uma ZOT.
+    """
+    match = ZOT_CODE_PATTERN.match(' '.join((reference or '').lower().split()))
+    if not match:
+        return None
+    major, minor = match.groups()
+    code = f"ZOT {int(major):02d}"
+    return f"{code}.{minor}" if minor else code
+
+
+def canonical_legal_citation(reference: str) -> Optional[Tuple[str, int, Optional[int]]]:
+    """
+    Chave canônica (tipo, número, ano) de uma citação legal:
+    "LC 434/99" e "Lei Complementar nº 434 de 1999" → ("LC", 434, 1999).
+    O ano é None quando a citação não o traz; retorna None se não for uma citação.
+    """
+    decomposed = unicodedata.normalize('NFKD', (reference or '').lower())
+    folded = ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).split())
+    match = LEGAL_CITATION_PATTERN.search(folded)
+    if not match:
+        return None
+
+    kind, number, short_year, full_year = match.groups()
+    year = None
+    if full_year:
+        year = int(full_year)
+    elif short_year:
+        year = int(short_year)
+        if len(short_year) == 2:
+            year += 2000 if year <= TWO_DIGIT_YEAR_PIVOT else 1900
+    return LEGAL_KINDS[kind], int(number.replace('.', '')), year
+
+
+def legal_citation_code(citation: Tuple[str, int, Optional[int]]) -> str:
+    """Código de índice de uma chave canônica ("LC 434/1999", ou "LC 434" sem ano)."""
+    kind, number, year = citation
+    return f"{kind} {number}/{year}" if year else f"{kind} {number}"
+
+
+def _undated_citation_code(citation: Tuple[str, int, Optional[int]]) -> str:
+    # Citações sem ano, que podem ser de qualquer ano
+    return f"{citation[0]} {citation[1]}/?"
+
+
+def legal_citation_lookup_codes(citation: Tuple[str, int, Optional[int]]) -> List[str]:
+    """
+    Códigos a consultar para uma citação: sem ano, todas as da mesma norma;
+    com ano, as daquele ano e as que não informam ano.
+    """
+    if not citation[2]:
+        return [legal_citation_code(citation)]
+    return [legal_citation_code(citation), _undated_citation_code(citation)]
+
+
+def chunk_reference_codes(keywords: Iterable[Dict]) -> Set[str]:
+    """
+    Códigos canônicos das referências presentes nas keywords serializadas de
+    um chunk. Toda citação entra também sob o código sem ano, para que uma
+    busca por "LC 434" encontre "LC 434/1999"; as sem ano são marcadas para
+    serem encontradas por buscas com qualquer ano.
+    """
+    codes = set()
+    for keyword in keywords or []:
+        keyword_type = keyword.get("type")
+        if keyword_type == "zot_reference":
+            code = canonical_zot_code(keyword.get("text", ""))
+            if code:
+                codes.add(code)
+        elif keyword_type == "legal_reference":
+            citation = canonical_legal_citation(keyword.get("text", ""))
+            if citation:
+                codes.add(legal_citation_code(citation))
+                if citation[2]:
+                    codes.add(legal_citation_code((citation[0], citation[1], None)))
+                else:
+                    codes.add(_undated_citation_code(citation))
+    return codes
+
+
+class ReferenceIndex:
+    """
+    Índice invertido de código canônico para os chunks que o citam.
+
+    Só entram chunks com ao menos uma referência; cada um guarda as colunas
+    de document_embeddings usadas pela busca, então uma consulta não precisa
+    voltar ao banco. Documentos são atualizados por inteiro com `update_document`.
+    """
+
+    def __init__(self):
+        self._rows: Dict[int, Dict[str, Any]] = {}
+        self._codes: Dict[int, Set[str]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._by_document: Dict[str, List[int]] = {}
+        self._next_slot = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def codes(self) -> List[str]:
+        return sorted(self._postings)
+
+    def _add_chunk(self, row: Dict[str, Any]) -> bool:
+        codes = chunk_reference_codes(row.get('keywords'))
+        if not codes:
+            return False
+
+        slot = self._next_slot
+        self._next_slot += 1
+        self._rows[slot] = row
+        self._codes[slot] = codes
+        for code in codes:
+            self._postings.setdefault(code, set()).add(slot)
+        self._by_document.setdefault(row.get('document_id'), []).append(slot)
+        return True
+
+    def _remove_chunk(self, slot: int) -> None:
+        self._rows.pop(slot)
+        for code in self._codes.pop(slot):
+            postings = self._postings[code]
+            postings.discard(slot)
+            if not postings:
+                del self._postings[code]
+
+    def update_document(self, document_id: str, chunks: Iterable[Dict[str, Any]]) -> int:
+        """
+        Substitui as referências indexadas de um documento pelas dos chunks
+        informados (dicts com as colunas de document_embeddings, incluindo
+        keywords). Retorna quantos chunks com referências ficaram indexados.
+        """
+        for slot in self._by_document.pop(document_id, []):
+            self._remove_chunk(slot)
+
+        indexed = 0
+        for chunk in chunks:
+            row = dict(chunk)
+            row['document_id'] = document_id
+            if self._add_chunk(row):
+                indexed += 1
+        return indexed
+
+    def remove_document(self, document_id: str) -> None:
+        self.update_document(document_id, [])
+
+    def lookup(self, code: str, limit: int = 15,
+               document_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Até `limit` chunks que citam o código, dos de maior priority_score para os de menor."""
+        return self.lookup_any([code], limit, document_ids)
+
+    def lookup_any(self, codes: Iterable[str], limit: int = 15,
+                   document_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Como `lookup`, para chunks que citam qualquer um dos códigos."""
+        slots = set()
+        for code in codes:
+            slots.update(self._postings.get(code, ()))
+        if not slots or limit <= 0:
+            return []
+
+        rows = (self._rows[slot] for slot in slots)
+        if document_ids:
+            allowed = set(document_ids)
+            rows = (row for row in rows if row.get('document_id') in allowed)
+        return heapq.nlargest(
+            limit, rows,
+            key=lambda row: (row.get('priority_score') or 0.0, -(row.get('chunk_index') or 0))
+        )
+
+    def save(self, path: str) -> None:
+        """Grava os chunks indexados em JSON; os códigos são recalculados na carga."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as output:
+            json.dump({"chunks": [self._rows[slot] for slot in sorted(self._rows)]},
+                      output, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'ReferenceIndex':
+        """Carrega um snapshot gravado por `save`."""
+        with open(path, encoding='utf-8') as source:
+            snapshot = json.load(source)
+        index = cls()
+        for row in snapshot.get("chunks", []):
+            index._add_chunk(row)
+        return index
+
+    @classmethod
+    async def load_from_supabase(cls, supabase_client, page_size: int = 1000) -> 'ReferenceIndex':
+        """Monta o índice paginando document_embeddings."""
+        index = cls()
+        start = 0
+        while True:
+            response = await supabase_client.table("document_embeddings")\
+                .select(", ".join(PAYLOAD_COLUMNS))\
+                .order("id")\
+                .range(start, start + page_size - 1)\
+                .execute()
+            rows = response.data or []
+            for row in rows:
+                index._add_chunk(row)
+
+            if len(rows) < page_size:
+                break
+            start += page_size
+
+        print(f"Indexed {len(index)} chunks with references ({len(index.codes())} codes)")
+        return index
+
+
+async def build_reference_index_snapshot(supabase_client, path: str) -> ReferenceIndex:
+    """Indexa as referências de todos os chunks do banco e grava o snapshot em `path`."""
+    index = await ReferenceIndex.load_from_supabase(supabase_client)
+    index.save(path)
+    print(f"Reference index snapshot saved to {path} ({len(index)} chunks)")
+    return index
+
+
+_shared_reference_index: Optional[ReferenceIndex] = None
+_shared_reference_mtime: Optional[float] = None
+
+
+def get_shared_reference_index() -> Optional[ReferenceIndex]:
+    """
+    Índice compartilhado carregado do snapshot em REFERENCE_INDEX_SNAPSHOT.
+    É recarregado quando a ingestão regrava o snapshot; retorna None se o
+    snapshot não estiver configurado ou não puder ser lido.
+    """
+    global _shared_reference_index, _shared_reference_mtime
+    path = os.environ.get("REFERENCE_INDEX_SNAPSHOT")
+    if not path or not os.path.exists(path):
+        return None
+
+    mtime = os.path.getmtime(path)
+    if _shared_reference_index is None or mtime != _shared_reference_mtime:
+        try:
+            _shared_reference_index = ReferenceIndex.load(path)
+            _shared_reference_mtime = mtime
+            print(f"Reference index loaded from {path} ({len(_shared_reference_index)} chunks)")
+        except Exception as e:
+            print(f"Error loading reference index snapshot: {e}")
+            return _shared_reference_index
+    return _shared_reference_index
+
+
+def update_reference_snapshot(document_id: str, chunks: List[Dict[str, Any]]) -> None:
+    """
+    Atualiza o snapshot em REFERENCE_INDEX_SNAPSHOT com os chunks atuais de
+    um documento (criando-o se ainda não existir). Sem snapshot configurado, não faz nada.
+    """
+    path = os.environ.get("REFERENCE_INDEX_SNAPSHOT")
+    if not path:
+        return
+
+    index = ReferenceIndex.load(path) if os.path.exists(path) else ReferenceIndex()
+    indexed = index.update_document(document_id, chunks)
+    index.save(path)
+    print(f"Reference index updated for document {document_id}: {indexed} chunks with references")
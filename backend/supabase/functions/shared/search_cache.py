@@ -0,0 +1,231 @@
+"""
+Cache de resultados de busca do IntelligentSearch.
+
+As mesmas perguntas (altura máxima, ZOT 8.2, 4º Distrito) chegam repetidamente;
+o cache guarda a resposta por query normalizada, filtro de documentos e limite,
+com TTL, despejo LRU e invalidação quando um documento é reprocessado.
+
+A invalidação entre processos vem do banco: quem consulta o cache informa a
+versão atual dos documentos (updated_at lido pelo StorageBackend), e entradas
+gravadas com outra versão são descartadas. Essa leitura é guardada por
+versions_ttl_seconds, para que respostas em cache não custem uma consulta ao
+banco cada; reingestões de outros processos aparecem depois desse prazo.
+DocumentVersions cobre as reingestões do próprio processo na hora (e as de
+outros, se DOCUMENT_VERSIONS_PATH estiver configurado).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class DocumentVersions:
+    """
+    Versões dos documentos, incrementadas a cada reingestão.
+
+    Com `path`, as versões são gravadas em JSON e relidas quando o arquivo
+    muda, para que a ingestão (process-document) invalide caches de outros
+    processos. Sem `path`, valem só para o processo atual.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._versions: Dict[str, int] = {}
+        self._generation = 0
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, encoding='utf-8') as source:
+                data = json.load(source)
+            self._versions = data.get("versions", {})
+            self._generation = data.get("generation", 0)
+            self._mtime = mtime
+        except Exception as e:
+            print(f"Error loading document versions: {e}")
+
+    def snapshot(self, document_ids: Optional[List[str]]) -> Tuple[int, Tuple[int, ...]]:
+        """
+        Versões das quais um resultado depende: com filtro, as dos documentos
+        filtrados; sem filtro, a geração global (qualquer reingestão invalida).
+        """
+        with self._lock:
+            self._refresh()
+            if not document_ids:
+                return self._generation, ()
+            return -1, tuple(self._versions.get(document_id, 0) for document_id in document_ids)
+
+    def bump(self, document_id: str) -> int:
+        """Registra a reingestão de um documento e retorna sua nova versão."""
+        with self._lock:
+            self._refresh()
+            version = self._versions.get(document_id, 0) + 1
+            self._versions[document_id] = version
+            self._generation += 1
+
+            if self.path:
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as output:
+                    json.dump({"versions": self._versions, "generation": self._generation}, output)
+                os.replace(temp_path, self.path)
+                self._mtime = os.path.getmtime(self.path)
+            return version
+
+
+class SearchResultCache:
+    """
+    Cache LRU com TTL de respostas de busca.
+
+    Cada entrada guarda as versões dos documentos de que depende; se algum
+    deles foi reprocessado desde então, a entrada é descartada na leitura.
+    As versões lidas do banco, por filtro de documentos, são reaproveitadas
+    por `versions_ttl_seconds` (0 = sem reaproveitamento).
+    """
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 300.0,
+                 versions: Optional[DocumentVersions] = None,
+                 versions_ttl_seconds: float = 5.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.versions = versions or DocumentVersions()
+        self.versions_ttl_seconds = versions_ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Tuple, Any]]" = OrderedDict()
+        self._database_versions: "OrderedDict[Hashable, Tuple[float, Tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def filter_key(document_ids: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+        return tuple(sorted(set(document_ids))) if document_ids else None
+
+    @classmethod
+    def make_key(cls, query: str, document_ids: Optional[List[str]], limit: int) -> Hashable:
+        """Chave por query normalizada (caixa e espaços), filtro de documentos e limite."""
+        normalized_query = " ".join(query.casefold().split())
+        return normalized_query, cls.filter_key(document_ids), limit
+
+    def cached_database_versions(self, document_ids: Optional[List[str]]) -> Optional[Tuple]:
+        """Versões do banco lidas para o filtro há menos de versions_ttl_seconds, ou None."""
+        key = self.filter_key(document_ids)
+        with self._lock:
+            cached = self._database_versions.get(key)
+            if cached is None:
+                return None
+            read_at, database_versions = cached
+            if time.monotonic() - read_at > self.versions_ttl_seconds:
+                del self._database_versions[key]
+                return None
+            return database_versions
+
+    def store_database_versions(self, document_ids: Optional[List[str]], database_versions: Tuple) -> None:
+        """Guarda as versões lidas do banco para o filtro, por versions_ttl_seconds."""
+        if self.versions_ttl_seconds <= 0 or self.max_size <= 0:
+            return
+        key = self.filter_key(document_ids)
+        with self._lock:
+            self._database_versions[key] = (time.monotonic(), database_versions)
+            self._database_versions.move_to_end(key)
+            while len(self._database_versions) > self.max_size:
+                self._database_versions.popitem(last=False)
+
+    def _versions(self, key: Hashable, database_versions: Optional[Tuple]) -> Tuple:
+        return self.versions.snapshot(key[1]), database_versions
+
+    def get(self, query: str, document_ids: Optional[List[str]], limit: int,
+            database_versions: Optional[Tuple] = None) -> Optional[Any]:
+        """
+        Resposta em cache, ou None. `database_versions` é a versão atual dos
+        documentos no banco; entradas gravadas com outra versão são descartadas.
+        """
+        key = self.make_key(query, document_ids, limit)
+        versions = self._versions(key, database_versions)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                self.misses += 1
+                return None
+
+            stored_at, stored_versions, value = cached
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if stored_versions != versions:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, query: str, document_ids: Optional[List[str]], limit: int, value: Any,
+            database_versions: Optional[Tuple] = None) -> None:
+        if self.max_size <= 0:
+            return
+        key = self.make_key(query, document_ids, limit)
+        versions = self._versions(key, database_versions)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), versions, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._database_versions.clear()
+            self.hits = self.misses = self.evictions = 0
+            self.expirations = self.invalidations = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "versions_ttl_seconds": self.versions_ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# Versões e cache compartilhados pelo processo
+_document_versions = DocumentVersions(os.environ.get("DOCUMENT_VERSIONS_PATH") or None)
+_search_result_cache = SearchResultCache(
+    max_size=int(os.environ.get("SEARCH_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "300")),
+    versions=_document_versions,
+    versions_ttl_seconds=float(os.environ.get("SEARCH_CACHE_VERSIONS_TTL_SECONDS", "5"))
+)
+
+
+def get_search_result_cache() -> SearchResultCache:
+    """Retorna o cache de resultados de busca compartilhado pelo processo."""
+    return _search_result_cache
+
+
+def bump_document_version(document_id: str) -> int:
+    """Invalida as respostas em cache que dependem do documento reprocessado."""
+    return _document_versions.bump(document_id)
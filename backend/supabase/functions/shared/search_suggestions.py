@@ -0,0 +1,209 @@
+"""
+Índice de sugestões de busca (autocomplete) para o IntelligentSearch.
+
+As sugestões vêm de várias fontes (keywords compostas, padrões comuns,
+bairros, ZOTs e perguntas frequentes do query_cache) e são ranqueadas por
+popularidade. O índice é um array ordenado de sufixos iniciados em começo
+de palavra, então "distr" encontra tanto "distrito industrial" quanto
+"4º distrito". A consulta é uma busca binária; os prefixos que casam com
+muitos sufixos (os nós "pesados" da trie implícita no array) têm o top-k
+pré-calculado na montagem, então nenhuma tecla varre um intervalo grande.
+"""
+
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Padrões sugeridos mesmo sem histórico de buscas
+COMMON_PATTERNS = (
+    "lei complementar nº",
+    "decreto nº",
+    "zot 8.2",
+    "4º distrito",
+    "certificação em sustentabilidade ambiental",
+    "estudo de impacto de vizinhança",
+    "área de proteção ambiental",
+    "coeficiente de aproveitamento",
+    "taxa de ocupação",
+)
+
+# Prefixos que casam com mais sufixos que isto têm o top-k calculado na montagem
+HEAVY_PREFIX_RANGE = 256
+PRECOMPUTED_TOP_K = 20
+
+# Perguntas longas demais não servem como sugestão
+MAX_SUGGESTION_LENGTH = 100
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_suggestion(text: str) -> str:
+    """Minúsculas, sem acentos e com espaços colapsados ("4º Distrito" → "4o distrito")."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return WHITESPACE_PATTERN.sub(' ', folded).strip()
+
+
+def _word_suffixes(normalized: str) -> Iterable[str]:
+    """Sufixos do texto que começam em início de palavra, incluindo o texto inteiro."""
+    yield normalized
+    for position, char in enumerate(normalized):
+        if char == ' ':
+            yield normalized[position + 1:]
+
+
+class SuggestionIndex:
+    """
+    Sugestões ranqueadas por popularidade.
+
+    Cada fonte é um conjunto de (texto, peso) substituível com `set_source`;
+    textos iguais após a normalização viram uma única sugestão, com a soma
+    dos pesos e o texto da primeira fonte que o trouxe. O índice é remontado
+    na primeira consulta depois de uma mudança.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Dict[str, Tuple[str, float]]] = {}
+        self._texts: List[str] = []
+        self._keys: List[Tuple[str, int]] = []
+        self._heavy_prefixes: Dict[str, List[int]] = {}
+        self._dirty = False
+
+    def __len__(self) -> int:
+        if self._dirty:
+            self._build()
+        return len(self._texts)
+
+    def set_source(self, name: str, items: Iterable[Tuple[str, float]]) -> int:
+        """
+        Substitui as entradas de uma fonte por pares (texto, peso).
+        Retorna quantas sugestões distintas a fonte passou a ter.
+        """
+        entries: Dict[str, Tuple[str, float]] = {}
+        for text, weight in items:
+            text = WHITESPACE_PATTERN.sub(' ', text or '').strip()
+            if not text or len(text) > MAX_SUGGESTION_LENGTH:
+                continue
+            key = normalize_suggestion(text)
+            previous = entries.get(key)
+            if previous:
+                entries[key] = (previous[0], previous[1] + weight)
+            else:
+                entries[key] = (text, weight)
+
+        self._sources[name] = entries
+        self._dirty = True
+        return len(entries)
+
+    def _build(self) -> None:
+        merged: Dict[str, Tuple[str, float]] = {}
+        for entries in self._sources.values():
+            for key, (text, weight) in entries.items():
+                previous = merged.get(key)
+                merged[key] = (previous[0], previous[1] + weight) if previous else (text, weight)
+
+        # A posição no ranking (popularidade, depois textos mais curtos) é o id
+        # da sugestão, então o top-k de um intervalo são os k menores ids
+        ranked = sorted(merged.items(), key=lambda item: (-item[1][1], len(item[0]), item[0]))
+        texts = [text for _, (text, _) in ranked]
+        keys = sorted(
+            (suffix, rank)
+            for rank, (key, _) in enumerate(ranked)
+            for suffix in _word_suffixes(key)
+        )
+
+        heavy_prefixes: Dict[str, List[int]] = {}
+        self._collect_top_ranks(keys, '', 0, len(keys), heavy_prefixes)
+
+        self._texts = texts
+        self._keys = keys
+        self._heavy_prefixes = heavy_prefixes
+        self._dirty = False
+
+    @staticmethod
+    def _collect_top_ranks(keys: List[Tuple[str, int]], prefix: str, start: int, end: int,
+                           heavy_prefixes: Dict[str, List[int]]) -> List[int]:
+        """
+        Top-k do intervalo keys[start:end] (os sufixos que começam com `prefix`).
+        Intervalos pequenos são resolvidos direto; os grandes combinam o top-k
+        de cada filho (próximo caractere) e ficam guardados em `heavy_prefixes`.
+        """
+        if end - start <= HEAVY_PREFIX_RANGE:
+            return heapq.nsmallest(PRECOMPUTED_TOP_K, {rank for _, rank in keys[start:end]})
+
+        depth = len(prefix)
+        candidates = set()
+        position = start
+        while position < end:
+            suffix, rank = keys[position]
+            if len(suffix) == depth:
+                candidates.add(rank)
+                position += 1
+                continue
+            child = suffix[:depth + 1]
+            child_end = bisect_left(keys, (child + '\uffff',), position, end)
+            candidates.update(SuggestionIndex._collect_top_ranks(keys, child, position, child_end, heavy_prefixes))
+            position = child_end
+
+        top_ranks = heapq.nsmallest(PRECOMPUTED_TOP_K, candidates)
+        heavy_prefixes[prefix] = top_ranks
+        return top_ranks
+
+    def suggest(self, partial_query: str, limit: int = 10) -> List[str]:
+        """Até `limit` sugestões que contêm o texto digitado a partir de um início de palavra."""
+        if self._dirty:
+            self._build()
+        prefix = normalize_suggestion(partial_query)
+        if not prefix or limit <= 0:
+            return []
+
+        top_ranks = self._heavy_prefixes.get(prefix)
+        if top_ranks is not None and limit <= PRECOMPUTED_TOP_K:
+            ranks = top_ranks[:limit]
+        else:
+            keys = self._keys
+            start = bisect_left(keys, (prefix,))
+            end = bisect_left(keys, (prefix + '\uffff',), start)
+            ranks = heapq.nsmallest(limit, {rank for _, rank in keys[start:end]})
+        return [self._texts[rank] for rank in ranks]
+
+
+def build_static_sources(index: SuggestionIndex, composite_keywords: Dict[str, float]) -> None:
+    """Fontes que não dependem do banco: keywords compostas (peso = prioridade) e padrões comuns."""
+    index.set_source("keywords", composite_keywords.items())
+    index.set_source("patterns", ((pattern, 1.0) for pattern in COMMON_PATTERNS))
+
+
+async def refresh_dynamic_sources(index: SuggestionIndex, storage,
+                                  query_log_limit: int = 5000) -> Dict[str, int]:
+    """
+    Recarrega do banco os bairros, as zonas (ZOTs) e as perguntas mais
+    frequentes do query_cache, com peso igual ao número de acertos.
+    """
+    bairro_zones = await storage.bairro_zones()
+    popular_queries = await storage.popular_queries(query_log_limit)
+    bairros = {row.get("bairro") for row in bairro_zones}
+    zones = {row.get("zona") for row in bairro_zones}
+
+    return {
+        "bairros": index.set_source("bairros", ((bairro, 1.0) for bairro in bairros)),
+        "zones": index.set_source("zones", ((zone, 1.0) for zone in zones)),
+        "queries": index.set_source(
+            "queries",
+            ((row.get("query"), float(row.get("hit_count") or 0) + 1.0) for row in popular_queries)
+        ),
+    }
+
+
+_shared_suggestion_index: Optional[SuggestionIndex] = None
+
+
+def get_shared_suggestion_index(composite_keywords: Dict[str, float]) -> SuggestionIndex:
+    """Índice compartilhado pelo processo, criado com as fontes estáticas no primeiro uso."""
+    global _shared_suggestion_index
+    if _shared_suggestion_index is None:
+        _shared_suggestion_index = SuggestionIndex()
+        build_static_sources(_shared_suggestion_index, composite_keywords)
+    return _shared_suggestion_index
@@ -0,0 +1,685 @@
+"""
+Camada de acesso a dados usada pelo IntelligentSearch e pelo KeywordsAdmin.
+
+As consultas ficam atrás de uma interface (StorageBackend) com três
+implementações:
+    AsyncpgStorageBackend   Postgres direto, com pool de conexões e consultas
+                            parametrizadas (preparadas e reaproveitadas por conexão)
+    SupabaseStorageBackend  API REST do Supabase, quando não há DATABASE_URL
+    InMemoryStorageBackend  listas em memória, para desenvolvimento e testes
+"""
+
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import asyncpg
+    ASYNCPG_AVAILABLE = True
+except ImportError:
+    ASYNCPG_AVAILABLE = False
+
+# Colunas de document_embeddings devolvidas pelas buscas
+CHUNK_COLUMNS = (
+    "document_id",
+    "content_chunk",
+    "chunk_index",
+    "keywords",
+    "priority_score",
+    "has_composite_keywords",
+    "legal_references_count",
+)
+
+
+class StorageBackend(ABC):
+    """
+    Interface das consultas de chunks, documentos e estatísticas de keywords.
+    Um backend sem algum dos métodos abstratos falha já ao ser instanciado.
+    """
+
+    @abstractmethod
+    async def search_chunks(self, patterns: List[str], document_ids: Optional[List[str]] = None,
+                            limit: int = 10, legal_references_only: bool = False) -> List[Dict]:
+        """
+        Chunks cujo texto contém algum dos termos (sem diferenciar maiúsculas).
+
+        Ordena por priority_score; com ``legal_references_only``, considera só
+        chunks com referências legais e ordena primeiro pela quantidade delas.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def count_documents(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def document_versions(self, document_ids: Optional[List[str]] = None) -> Tuple:
+        """
+        Marca de versão dos documentos, lida do banco: updated_at de cada
+        documento filtrado ou, sem filtro, o total de documentos e o updated_at
+        mais recente. Muda sempre que a ingestão de qualquer processo altera
+        ou remove um documento.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def chunk_keyword_stats(self) -> Dict[str, int]:
+        """Totais de chunks, chunks com keywords e keywords."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def top_keywords(self, limit: int = 20) -> List[Dict]:
+        """Keywords mais frequentes com número de documentos e confiança média."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def documents_without_keywords_summary(self) -> List[Dict]:
+        """Documentos (id, title) sem linha em document_keywords_summary."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def long_chunk_stats(self, min_length: int = 500) -> Dict[str, int]:
+        """Chunks com mais de ``min_length`` caracteres, e quantos deles não têm keywords."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def keyword_confidence_stats(self, threshold: float = 0.5) -> Dict[str, int]:
+        """Total de keywords e quantas têm confiança abaixo de ``threshold``."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def sample_chunk_texts(self, limit: int = 1000) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def bairro_zones(self) -> List[Dict]:
+        """Pares (bairro, zona) de zots_bairros."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def popular_queries(self, limit: int = 5000) -> List[Dict]:
+        """Perguntas (query, hit_count) do query_cache, das mais acessadas para as menos."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def insert_chunk_rows(self, rows: List[Dict]) -> None:
+        """Insere linhas de document_embeddings (com embedding) em uma única operação."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_chunk_positions(self, rows: List[Dict]) -> None:
+        """Atualiza o chunk_index de vários chunks ({"id", "chunk_index"}) em uma única operação."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+# ----------------------------------------------------------------------
+# Agregações em Python, compartilhadas pelos backends sem SQL
+# ----------------------------------------------------------------------
+
+def _matches_any(text: str, patterns: List[str]) -> bool:
+    text_lower = (text or "").lower()
+    return any(pattern.lower() in text_lower for pattern in patterns)
+
+
+def _search_rows(rows: Iterable[Dict], patterns: List[str], document_ids: Optional[List[str]],
+                 limit: int, legal_references_only: bool) -> List[Dict]:
+    allowed = set(document_ids) if document_ids else None
+    matches = [
+        row for row in rows
+        if (allowed is None or row.get("document_id") in allowed)
+        and (not legal_references_only or (row.get("legal_references_count") or 0) > 0)
+        and _matches_any(row.get("content_chunk", ""), patterns)
+    ]
+    if legal_references_only:
+        matches.sort(key=lambda row: (row.get("legal_references_count") or 0,
+                                      row.get("priority_score") or 0.0), reverse=True)
+    else:
+        matches.sort(key=lambda row: row.get("priority_score") or 0.0, reverse=True)
+    return [{column: row.get(column) for column in CHUNK_COLUMNS} for row in matches[:limit]]
+
+
+def _chunk_keyword_stats(rows: Iterable[Dict]) -> Dict[str, int]:
+    total_chunks = chunks_with_keywords = total_keywords = 0
+    for row in rows:
+        total_chunks += 1
+        keywords = row.get("keywords") or []
+        if keywords:
+            chunks_with_keywords += 1
+            total_keywords += len(keywords)
+    return {
+        "total_chunks": total_chunks,
+        "chunks_with_keywords": chunks_with_keywords,
+        "total_keywords": total_keywords
+    }
+
+
+def _top_keywords(rows: Iterable[Dict], limit: int) -> List[Dict]:
+    stats: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        for kw in row.get("keywords") or []:
+            key = (kw.get("text", ""), kw.get("type", "unknown"))
+            entry = stats.setdefault(key, {"frequency": 0, "documents": set(), "confidence_sum": 0.0})
+            entry["frequency"] += 1
+            entry["documents"].add(row.get("document_id"))
+            entry["confidence_sum"] += kw.get("confidence", 0.0)
+
+    ranked = sorted(stats.items(), key=lambda item: item[1]["frequency"], reverse=True)
+    return [
+        {
+            "text": text,
+            "type": kw_type,
+            "frequency": entry["frequency"],
+            "documents_count": len(entry["documents"]),
+            "avg_confidence": entry["confidence_sum"] / entry["frequency"]
+        }
+        for (text, kw_type), entry in ranked[:limit]
+    ]
+
+
+def _long_chunk_stats(rows: Iterable[Dict], min_length: int) -> Dict[str, int]:
+    total_long = long_without_keywords = 0
+    for row in rows:
+        if len(row.get("content_chunk") or "") > min_length:
+            total_long += 1
+            if not row.get("keywords"):
+                long_without_keywords += 1
+    return {"total_long": total_long, "long_without_keywords": long_without_keywords}
+
+
+def _keyword_confidence_stats(rows: Iterable[Dict], threshold: float) -> Dict[str, int]:
+    total_keywords = low_confidence = 0
+    for row in rows:
+        for kw in row.get("keywords") or []:
+            total_keywords += 1
+            if kw.get("confidence", 1.0) < threshold:
+                low_confidence += 1
+    return {"total_keywords": total_keywords, "low_confidence": low_confidence}
+
+
+class InMemoryStorageBackend(StorageBackend):
+    """Backend sobre listas de dicts com as colunas das tabelas, para testes."""
+
+    def __init__(self, documents: Optional[List[Dict]] = None,
+                 chunks: Optional[List[Dict]] = None,
+                 keywords_summaries: Optional[List[Dict]] = None,
+                 zots_bairros: Optional[List[Dict]] = None,
+                 query_log: Optional[List[Dict]] = None):
+        self.documents = documents if documents is not None else []
+        self.chunks = chunks if chunks is not None else []
+        self.keywords_summaries = keywords_summaries if keywords_summaries is not None else []
+        self.zots_bairros = zots_bairros if zots_bairros is not None else []
+        self.query_log = query_log if query_log is not None else []
+
+    async def search_chunks(self, patterns: List[str], document_ids: Optional[List[str]] = None,
+                            limit: int = 10, legal_references_only: bool = False) -> List[Dict]:
+        return _search_rows(self.chunks, patterns, document_ids, limit, legal_references_only)
+
+    async def count_documents(self) -> int:
+        return len(self.documents)
+
+    async def document_versions(self, document_ids: Optional[List[str]] = None) -> Tuple:
+        if document_ids:
+            wanted = set(document_ids)
+            return tuple(sorted(
+                (str(doc["id"]), str(doc.get("updated_at")))
+                for doc in self.documents if doc["id"] in wanted
+            ))
+        latest = max((str(doc.get("updated_at")) for doc in self.documents), default=None)
+        return len(self.documents), latest
+
+    async def chunk_keyword_stats(self) -> Dict[str, int]:
+        return _chunk_keyword_stats(self.chunks)
+
+    async def top_keywords(self, limit: int = 20) -> List[Dict]:
+        return _top_keywords(self.chunks, limit)
+
+    async def documents_without_keywords_summary(self) -> List[Dict]:
+        summarized = {summary["document_id"] for summary in self.keywords_summaries}
+        return [
+            {"id": doc["id"], "title": doc.get("title")}
+            for doc in self.documents if doc["id"] not in summarized
+        ]
+
+    async def long_chunk_stats(self, min_length: int = 500) -> Dict[str, int]:
+        return _long_chunk_stats(self.chunks, min_length)
+
+    async def keyword_confidence_stats(self, threshold: float = 0.5) -> Dict[str, int]:
+        return _keyword_confidence_stats(self.chunks, threshold)
+
+    async def sample_chunk_texts(self, limit: int = 1000) -> List[str]:
+        return [chunk.get("content_chunk", "") for chunk in self.chunks[:limit]]
+
+    async def bairro_zones(self) -> List[Dict]:
+        return [{"bairro": row["bairro"], "zona": row["zona"]} for row in self.zots_bairros]
+
+    async def popular_queries(self, limit: int = 5000) -> List[Dict]:
+        rows = sorted(self.query_log, key=lambda row: row.get("hit_count") or 0, reverse=True)
+        return [{"query": row["query"], "hit_count": row.get("hit_count") or 0} for row in rows[:limit]]
+
+    async def insert_chunk_rows(self, rows: List[Dict]) -> None:
+        self.chunks.extend(dict(row) for row in rows)
+
+    async def update_chunk_positions(self, rows: List[Dict]) -> None:
+        positions = {row["id"]: row["chunk_index"] for row in rows}
+        for chunk in self.chunks:
+            if chunk.get("id") in positions:
+                chunk["chunk_index"] = positions[chunk["id"]]
+
+
+class SupabaseStorageBackend(StorageBackend):
+    """
+    Backend sobre o cliente Supabase (PostgREST). As buscas usam filtros da
+    API em vez de SQL montado em texto; as estatísticas de keywords são
+    agregadas no banco pelas funções da migration keywords_admin_stats (RPC),
+    e as contagens usam count="exact" sem trazer linhas.
+    """
+
+    def __init__(self, supabase_client, page_size: int = 1000):
+        self.supabase_client = supabase_client
+        self.page_size = page_size
+
+    async def _select_all(self, table: str, columns: str) -> List[Dict]:
+        rows: List[Dict] = []
+        start = 0
+        while True:
+            response = await self.supabase_client.table(table)\
+                .select(columns)\
+                .range(start, start + self.page_size - 1)\
+                .execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            start += self.page_size
+
+    async def _rpc_row(self, function: str, params: Optional[Dict] = None) -> Dict:
+        # Funções que retornam TABLE chegam como lista com uma linha
+        response = await self.supabase_client.rpc(function, params or {}).execute()
+        data = response.data
+        if isinstance(data, list):
+            return data[0] if data else {}
+        return data or {}
+
+    @staticmethod
+    def _ilike_filter(pattern: str) -> str:
+        # Aspas protegem vírgulas e parênteses do termo dentro do filtro "or"
+        escaped = pattern.replace("\\", "\\\\").replace('"', '\\"')
+        return f'content_chunk.ilike."%{escaped}%"'
+
+    async def search_chunks(self, patterns: List[str], document_ids: Optional[List[str]] = None,
+                            limit: int = 10, legal_references_only: bool = False) -> List[Dict]:
+        if not patterns:
+            return []
+        query = self.supabase_client.table("document_embeddings")\
+            .select(", ".join(CHUNK_COLUMNS))\
+            .or_(",".join(self._ilike_filter(pattern) for pattern in patterns))
+        if document_ids:
+            query = query.in_("document_id", document_ids)
+        if legal_references_only:
+            query = query.gt("legal_references_count", 0)\
+                .order("legal_references_count", desc=True)
+        response = await query.order("priority_score", desc=True).limit(limit).execute()
+        return response.data or []
+
+    async def count_documents(self) -> int:
+        response = await self.supabase_client.table("documents")\
+            .select("id", count="exact", head=True)\
+            .execute()
+        return response.count or 0
+
+    async def document_versions(self, document_ids: Optional[List[str]] = None) -> Tuple:
+        if document_ids:
+            response = await self.supabase_client.table("documents")\
+                .select("id, updated_at")\
+                .in_("id", document_ids)\
+                .execute()
+            return tuple(sorted((str(row["id"]), str(row["updated_at"])) for row in response.data or []))
+        response = await self.supabase_client.table("documents")\
+            .select("updated_at", count="exact")\
+            .order("updated_at", desc=True)\
+            .limit(1)\
+            .execute()
+        rows = response.data or []
+        return response.count, str(rows[0]["updated_at"]) if rows else None
+
+    async def chunk_keyword_stats(self) -> Dict[str, int]:
+        row = await self._rpc_row("keywords_chunk_stats")
+        return {
+            "total_chunks": row.get("total_chunks") or 0,
+            "chunks_with_keywords": row.get("chunks_with_keywords") or 0,
+            "total_keywords": row.get("total_keywords") or 0,
+        }
+
+    async def top_keywords(self, limit: int = 20) -> List[Dict]:
+        response = await self.supabase_client.rpc("keywords_top_keywords", {"max_results": limit}).execute()
+        return response.data or []
+
+    async def documents_without_keywords_summary(self) -> List[Dict]:
+        summarized = {
+            row["document_id"]
+            for row in await self._select_all("document_keywords_summary", "document_id")
+        }
+        return [
+            doc for doc in await self._select_all("documents", "id, title")
+            if doc["id"] not in summarized
+        ]
+
+    async def long_chunk_stats(self, min_length: int = 500) -> Dict[str, int]:
+        row = await self._rpc_row("keywords_long_chunk_stats", {"min_length": min_length})
+        return {
+            "total_long": row.get("total_long") or 0,
+            "long_without_keywords": row.get("long_without_keywords") or 0,
+        }
+
+    async def keyword_confidence_stats(self, threshold: float = 0.5) -> Dict[str, int]:
+        row = await self._rpc_row("keywords_confidence_stats", {"threshold": threshold})
+        return {
+            "total_keywords": row.get("total_keywords") or 0,
+            "low_confidence": row.get("low_confidence") or 0,
+        }
+
+    async def sample_chunk_texts(self, limit: int = 1000) -> List[str]:
+        response = await self.supabase_client.table("document_embeddings")\
+            .select("content_chunk")\
+            .limit(limit)\
+            .execute()
+        return [row["content_chunk"] for row in response.data or []]
+
+    async def bairro_zones(self) -> List[Dict]:
+        return await self._select_all("zots_bairros", "bairro, zona")
+
+    async def popular_queries(self, limit: int = 5000) -> List[Dict]:
+        response = await self.supabase_client.table("query_cache")\
+            .select("query, hit_count")\
+            .order("hit_count", desc=True)\
+            .limit(limit)\
+            .execute()
+        return response.data or []
+
+    async def insert_chunk_rows(self, rows: List[Dict]) -> None:
+        # Um único POST com todas as linhas; o PostgREST grava numa transação
+        await self.supabase_client.table("document_embeddings").insert(rows).execute()
+
+    async def update_chunk_positions(self, rows: List[Dict]) -> None:
+        # A API não tem UPDATE com valores por linha: a função da migration
+        # update_chunk_positions aplica o lote num único comando
+        await self.supabase_client.rpc("update_chunk_positions", {
+            "positions": [{"id": row["id"], "chunk_index": row["chunk_index"]} for row in rows]
+        }).execute()
+
+
+# ----------------------------------------------------------------------
+# Postgres direto (asyncpg)
+# ----------------------------------------------------------------------
+
+_CHUNK_SELECT = """
+SELECT
+    de.document_id::text AS document_id,
+    de.content_chunk,
+    de.chunk_index,
+    de.keywords,
+    de.priority_score,
+    de.has_composite_keywords,
+    de.legal_references_count
+FROM document_embeddings de
+WHERE de.content_chunk ILIKE ANY($1::text[])
+  AND ($2::uuid[] IS NULL OR de.document_id = ANY($2::uuid[]))
+"""
+
+SEARCH_CHUNKS_SQL = _CHUNK_SELECT + """
+ORDER BY de.priority_score DESC
+LIMIT $3
+"""
+
+SEARCH_LEGAL_REFERENCE_CHUNKS_SQL = _CHUNK_SELECT + """
+  AND de.legal_references_count > 0
+ORDER BY de.legal_references_count DESC, de.priority_score DESC
+LIMIT $3
+"""
+
+COUNT_DOCUMENTS_SQL = "SELECT count(*) FROM documents"
+
+DOCUMENTS_VERSION_SQL = "SELECT count(*) AS documents, max(updated_at)::text AS updated_at FROM documents"
+
+FILTERED_DOCUMENT_VERSIONS_SQL = """
+SELECT id::text AS id, updated_at::text AS updated_at
+FROM documents
+WHERE id::text = ANY($1::text[])
+ORDER BY id::text
+"""
+
+CHUNK_KEYWORD_STATS_SQL = """
+SELECT
+    count(*) AS total_chunks,
+    count(*) FILTER (WHERE jsonb_array_length(COALESCE(keywords, '[]'::jsonb)) > 0) AS chunks_with_keywords,
+    COALESCE(sum(jsonb_array_length(COALESCE(keywords, '[]'::jsonb))), 0) AS total_keywords
+FROM document_embeddings
+"""
+
+TOP_KEYWORDS_SQL = """
+SELECT
+    COALESCE(kw->>'text', '') AS text,
+    COALESCE(kw->>'type', 'unknown') AS type,
+    count(*) AS frequency,
+    count(DISTINCT de.document_id) AS documents_count,
+    avg(COALESCE((kw->>'confidence')::float, 0.0)) AS avg_confidence
+FROM document_embeddings de, jsonb_array_elements(COALESCE(de.keywords, '[]'::jsonb)) kw
+GROUP BY 1, 2
+ORDER BY frequency DESC
+LIMIT $1
+"""
+
+DOCUMENTS_WITHOUT_SUMMARY_SQL = """
+SELECT d.id::text AS id, d.title
+FROM documents d
+WHERE NOT EXISTS (
+    SELECT 1 FROM document_keywords_summary s WHERE s.document_id = d.id
+)
+"""
+
+LONG_CHUNK_STATS_SQL = """
+SELECT
+    count(*) AS total_long,
+    count(*) FILTER (WHERE jsonb_array_length(COALESCE(keywords, '[]'::jsonb)) = 0) AS long_without_keywords
+FROM document_embeddings
+WHERE length(content_chunk) > $1
+"""
+
+KEYWORD_CONFIDENCE_STATS_SQL = """
+SELECT
+    count(*) AS total_keywords,
+    count(*) FILTER (WHERE COALESCE((kw->>'confidence')::float, 1.0) < $1) AS low_confidence
+FROM document_embeddings de, jsonb_array_elements(COALESCE(de.keywords, '[]'::jsonb)) kw
+"""
+
+SAMPLE_CHUNK_TEXTS_SQL = "SELECT content_chunk FROM document_embeddings LIMIT $1"
+
+BAIRRO_ZONES_SQL = "SELECT bairro, zona FROM zots_bairros"
+
+POPULAR_QUERIES_SQL = "SELECT query, hit_count FROM query_cache ORDER BY hit_count DESC LIMIT $1"
+
+# O embedding vai como texto ("[0.1, ...]"): o asyncpg não tem codec para o tipo vector
+INSERT_CHUNK_SQL = """
+INSERT INTO document_embeddings (
+    document_id, content_chunk, embedding, chunk_index,
+    keywords, priority_score, has_composite_keywords, legal_references_count,
+    keywords_version
+)
+VALUES ($1, $2, $3::text::vector, $4, $5, $6, $7, $8, $9)
+"""
+
+
+UPDATE_CHUNK_POSITIONS_SQL = """
+UPDATE document_embeddings AS de
+SET chunk_index = p.chunk_index
+FROM unnest($1::bigint[], $2::int[]) AS p(id, chunk_index)
+WHERE de.id = p.id
+"""
+
+
+async def _init_connection(connection) -> None:
+    # Colunas JSONB chegam como listas/dicts, como na API do Supabase
+    for type_name in ("json", "jsonb"):
+        await connection.set_type_codec(
+            type_name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+        )
+
+
+class AsyncpgStorageBackend(StorageBackend):
+    """
+    Backend Postgres com pool de conexões asyncpg.
+
+    Todas as consultas são textos fixos com parâmetros posicionais: o asyncpg
+    prepara cada uma na primeira execução em uma conexão e reaproveita o
+    statement (e o plano) nas seguintes, sem o custo do RPC execute_sql.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10,
+                 statement_cache_size: int = 100):
+        if not ASYNCPG_AVAILABLE:
+            raise ImportError("asyncpg is required for AsyncpgStorageBackend")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_pool(self):
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        statement_cache_size=self.statement_cache_size,
+                        init=_init_connection
+                    )
+        return self._pool
+
+    async def _fetch(self, query: str, *args) -> List[Dict]:
+        pool = await self._get_pool()
+        async with pool.acquire() as connection:
+            return [dict(record) for record in await connection.fetch(query, *args)]
+
+    async def _fetchrow(self, query: str, *args) -> Dict:
+        pool = await self._get_pool()
+        async with pool.acquire() as connection:
+            return dict(await connection.fetchrow(query, *args))
+
+    @staticmethod
+    def _like_pattern(term: str) -> str:
+        escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f"%{escaped}%"
+
+    async def search_chunks(self, patterns: List[str], document_ids: Optional[List[str]] = None,
+                            limit: int = 10, legal_references_only: bool = False) -> List[Dict]:
+        if not patterns:
+            return []
+        query = SEARCH_LEGAL_REFERENCE_CHUNKS_SQL if legal_references_only else SEARCH_CHUNKS_SQL
+        return await self._fetch(
+            query,
+            [self._like_pattern(pattern) for pattern in patterns],
+            document_ids or None,
+            limit
+        )
+
+    async def count_documents(self) -> int:
+        pool = await self._get_pool()
+        async with pool.acquire() as connection:
+            return await connection.fetchval(COUNT_DOCUMENTS_SQL)
+
+    async def document_versions(self, document_ids: Optional[List[str]] = None) -> Tuple:
+        if document_ids:
+            rows = await self._fetch(FILTERED_DOCUMENT_VERSIONS_SQL, [str(doc_id) for doc_id in document_ids])
+            return tuple((row["id"], row["updated_at"]) for row in rows)
+        row = await self._fetchrow(DOCUMENTS_VERSION_SQL)
+        return row["documents"], row["updated_at"]
+
+    async def chunk_keyword_stats(self) -> Dict[str, int]:
+        return await self._fetchrow(CHUNK_KEYWORD_STATS_SQL)
+
+    async def top_keywords(self, limit: int = 20) -> List[Dict]:
+        return await self._fetch(TOP_KEYWORDS_SQL, limit)
+
+    async def documents_without_keywords_summary(self) -> List[Dict]:
+        return await self._fetch(DOCUMENTS_WITHOUT_SUMMARY_SQL)
+
+    async def long_chunk_stats(self, min_length: int = 500) -> Dict[str, int]:
+        return await self._fetchrow(LONG_CHUNK_STATS_SQL, min_length)
+
+    async def keyword_confidence_stats(self, threshold: float = 0.5) -> Dict[str, int]:
+        return await self._fetchrow(KEYWORD_CONFIDENCE_STATS_SQL, threshold)
+
+    async def sample_chunk_texts(self, limit: int = 1000) -> List[str]:
+        rows = await self._fetch(SAMPLE_CHUNK_TEXTS_SQL, limit)
+        return [row["content_chunk"] for row in rows]
+
+    async def bairro_zones(self) -> List[Dict]:
+        return await self._fetch(BAIRRO_ZONES_SQL)
+
+    async def popular_queries(self, limit: int = 5000) -> List[Dict]:
+        return await self._fetch(POPULAR_QUERIES_SQL, limit)
+
+    async def insert_chunk_rows(self, rows: List[Dict]) -> None:
+        # executemany envia o lote em pipeline, numa transação, com o statement preparado uma vez
+        records = [
+            (
+                row["document_id"],
+                row["content_chunk"],
+                json.dumps(row["embedding"]),
+                row["chunk_index"],
+                row.get("keywords", []),
+                row.get("priority_score", 1.0),
+                row.get("has_composite_keywords", False),
+                row.get("legal_references_count", 0),
+                row.get("keywords_version"),
+            )
+            for row in rows
+        ]
+        pool = await self._get_pool()
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.executemany(INSERT_CHUNK_SQL, records)
+
+    async def update_chunk_positions(self, rows: List[Dict]) -> None:
+        # Um só UPDATE para o lote, com as posições passadas como arrays
+        pool = await self._get_pool()
+        async with pool.acquire() as connection:
+            await connection.execute(
+                UPDATE_CHUNK_POSITIONS_SQL,
+                [int(row["id"]) for row in rows],
+                [row["chunk_index"] for row in rows]
+            )
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+_shared_postgres_backend: Optional[AsyncpgStorageBackend] = None
+
+
+def get_storage_backend(supabase_client) -> StorageBackend:
+    """
+    Backend padrão: Postgres direto (pool compartilhado pelo processo) quando
+    DATABASE_URL está configurada e o asyncpg instalado; senão, o cliente Supabase.
+    """
+    global _shared_postgres_backend
+    dsn = os.environ.get("DATABASE_URL")
+    if dsn and ASYNCPG_AVAILABLE:
+        if _shared_postgres_backend is None:
+            _shared_postgres_backend = AsyncpgStorageBackend(
+                dsn,
+                min_size=int(os.environ.get("DATABASE_POOL_MIN_SIZE", "1")),
+                max_size=int(os.environ.get("DATABASE_POOL_MAX_SIZE", "10"))
+            )
+        return _shared_postgres_backend
+    return SupabaseStorageBackend(supabase_client)
@@ -0,0 +1,481 @@
+"""
+Índice vetorial em memória sobre os embeddings de document_embeddings.
+Carrega de um snapshot local e devolve similaridade de cosseno real, com busca
+exata (força bruta) ou aproximada (IVF) e filtro por document_id.
+"""
+
+import heapq
+import json
+import math
+import os
+import random
+import struct
+from array import array
+from operator import add, mul
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from openai import AsyncOpenAI
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+# Modelo usado pelo EmbeddingGenerator; a query precisa cair no mesmo espaço vetorial
+QUERY_EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Colunas de document_embeddings guardadas junto de cada vetor
+PAYLOAD_COLUMNS = (
+    "document_id",
+    "content_chunk",
+    "chunk_index",
+    "keywords",
+    "priority_score",
+    "has_composite_keywords",
+    "legal_references_count",
+)
+
+SNAPSHOT_MAGIC = b"VIDX1"
+
+# Linhas por bloco na atribuição de todos os vetores às listas do IVF, para a
+# matriz de similaridades (linhas x centróides) não crescer com o índice
+ASSIGN_BLOCK_ROWS = 8192
+
+
+def _normalize(vector: Iterable[float]) -> Optional[array]:
+    """Converte para float32 com norma unitária (None para vetores nulos)."""
+    values = array('f', vector)
+    norm = math.sqrt(sum(map(mul, values, values)))
+    if norm == 0.0:
+        return None
+    return array('f', (value / norm for value in values))
+
+
+def _parse_embedding(raw: Any) -> Optional[List[float]]:
+    """O PostgREST devolve colunas pgvector como string '[0.1,0.2,...]'."""
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        return json.loads(raw)
+    return list(raw)
+
+
+class VectorIndex:
+    """
+    Índice de similaridade de cosseno sobre vetores normalizados.
+
+    A busca exata compara a query com todos os vetores candidatos. Depois de
+    `build_ivf`, a busca aproximada visita apenas as `nprobe` listas cujos
+    centróides estão mais próximos da query. Com NumPy instalado os produtos
+    escalares viram multiplicações de matriz; sem ele, Python puro.
+    """
+
+    def __init__(self, dimension: Optional[int] = None):
+        self.dimension = dimension
+        self._vectors: List[array] = []
+        self._rows: List[Dict[str, Any]] = []
+        self._by_document: Dict[str, List[int]] = {}
+        self._matrix = None
+        self._centroid_matrix = None
+        self.centroids: List[array] = []
+        self.lists: List[List[int]] = []
+        self.default_nprobe = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def has_ivf(self) -> bool:
+        return bool(self.lists)
+
+    def add(self, vector: Sequence[float], row: Dict[str, Any]) -> bool:
+        """Adiciona um vetor com seu payload. Retorna False se o vetor for descartado."""
+        if self.dimension is None:
+            self.dimension = len(vector)
+        elif len(vector) != self.dimension:
+            print(f"Skipping embedding with dimension {len(vector)} (index uses {self.dimension})")
+            return False
+
+        normalized = _normalize(vector)
+        if normalized is None:
+            return False
+
+        row_id = len(self._rows)
+        self._vectors.append(normalized)
+        self._rows.append(row)
+        self._by_document.setdefault(row.get('document_id'), []).append(row_id)
+        self._matrix = None
+        if self.lists:
+            # Mantém o IVF consistente sem reconstruí-lo
+            self.lists[self._nearest_centroids(normalized, 1)[0]].append(row_id)
+        return True
+
+    # ------------------------------------------------------------------
+    # Produtos escalares
+    # ------------------------------------------------------------------
+
+    def _get_matrix(self):
+        if self._matrix is None and self._vectors:
+            self._matrix = np.frombuffer(
+                b"".join(vector.tobytes() for vector in self._vectors), dtype=np.float32
+            ).reshape(len(self._vectors), self.dimension)
+        return self._matrix
+
+    def _scores(self, query: array, row_ids: Optional[List[int]]) -> List[Tuple[float, int]]:
+        """Similaridade de cosseno entre a query e as linhas indicadas (None = todas)."""
+        if NUMPY_AVAILABLE:
+            matrix = self._get_matrix()
+            if matrix is None:
+                return []
+            query_vector = np.frombuffer(query.tobytes(), dtype=np.float32)
+            if row_ids is None:
+                return list(zip((matrix @ query_vector).tolist(), range(len(self._rows))))
+            scores = matrix[row_ids] @ query_vector
+            return list(zip(scores.tolist(), row_ids))
+
+        vectors = self._vectors
+        if row_ids is None:
+            row_ids = range(len(vectors))
+        return [(sum(map(mul, vectors[row_id], query)), row_id) for row_id in row_ids]
+
+    def _get_centroid_matrix(self):
+        if self._centroid_matrix is None and self.centroids:
+            self._centroid_matrix = np.frombuffer(
+                b"".join(centroid.tobytes() for centroid in self.centroids), dtype=np.float32
+            ).reshape(len(self.centroids), self.dimension)
+        return self._centroid_matrix
+
+    def _nearest_centroids(self, vector: array, count: int) -> List[int]:
+        if NUMPY_AVAILABLE:
+            similarities = self._get_centroid_matrix() @ np.frombuffer(vector.tobytes(), dtype=np.float32)
+            if count == 1:
+                return [int(similarities.argmax())]
+            return np.argsort(-similarities, kind="stable")[:count].tolist()
+
+        similarities = [sum(map(mul, centroid, vector)) for centroid in self.centroids]
+        return heapq.nlargest(count, range(len(similarities)), key=similarities.__getitem__)
+
+    # ------------------------------------------------------------------
+    # IVF
+    # ------------------------------------------------------------------
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 8,
+                  sample_size: Optional[int] = None, seed: int = 42) -> None:
+        """
+        Agrupa os vetores com k-means esférico para a busca aproximada.
+
+        Os centróides são treinados numa amostra (por padrão 40 vetores por
+        lista) e depois todos os vetores são atribuídos ao centróide mais próximo.
+        """
+        total = len(self._vectors)
+        if total == 0:
+            return
+
+        n_lists = max(1, min(n_lists or int(math.sqrt(total)), total))
+        rng = random.Random(seed)
+        sample_size = min(total, sample_size or n_lists * 40)
+        sample_ids = rng.sample(range(total), sample_size)
+        initial = rng.sample(range(sample_size), n_lists)
+
+        if NUMPY_AVAILABLE:
+            self._set_centroids(self._kmeans_numpy(sample_ids, initial, iterations))
+            matrix = self._get_matrix()
+            centroid_matrix = self._get_centroid_matrix().T
+            assignments = np.concatenate([
+                (matrix[start:start + ASSIGN_BLOCK_ROWS] @ centroid_matrix).argmax(axis=1)
+                for start in range(0, total, ASSIGN_BLOCK_ROWS)
+            ]).tolist()
+        else:
+            self._set_centroids(self._kmeans_python(sample_ids, initial, iterations))
+            assignments = [self._nearest_centroids(vector, 1)[0] for vector in self._vectors]
+
+        self.lists = [[] for _ in range(n_lists)]
+        for row_id, list_id in enumerate(assignments):
+            self.lists[list_id].append(row_id)
+
+        if not self.default_nprobe:
+            self.default_nprobe = max(1, n_lists // 10)
+
+    def _set_centroids(self, centroids: List[array]) -> None:
+        self.centroids = centroids
+        self._centroid_matrix = None
+
+    def _kmeans_numpy(self, sample_ids: List[int], initial: List[int],
+                      iterations: int) -> List[array]:
+        """k-means esférico com a atribuição e as somas por lista em operações de matriz."""
+        sample = self._get_matrix()[sample_ids]
+        centroids = sample[initial].copy()
+        for _ in range(iterations):
+            nearest = (sample @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            # Listas vazias mantêm o centróide anterior
+            filled = norms > 0
+            centroids[filled] = sums[filled] / norms[filled, None]
+        return [array('f', centroid.tobytes()) for centroid in centroids]
+
+    def _kmeans_python(self, sample_ids: List[int], initial: List[int],
+                       iterations: int) -> List[array]:
+        """Mesmo k-means em Python puro, usado quando o NumPy não está instalado."""
+        sample = [self._vectors[i] for i in sample_ids]
+        self._set_centroids([sample[i] for i in initial])
+        n_lists = len(initial)
+
+        for _ in range(iterations):
+            sums = [[0.0] * self.dimension for _ in range(n_lists)]
+            counts = [0] * n_lists
+            for vector in sample:
+                nearest = self._nearest_centroids(vector, 1)[0]
+                counts[nearest] += 1
+                sums[nearest] = list(map(add, sums[nearest], vector))
+
+            centroids = []
+            for list_id, total_vector in enumerate(sums):
+                # Listas vazias mantêm o centróide anterior
+                normalized = _normalize(total_vector) if counts[list_id] else None
+                centroids.append(normalized or self.centroids[list_id])
+            self._set_centroids(centroids)
+        return self.centroids
+
+    def remove_document(self, document_id: str) -> int:
+        """Remove os vetores de um documento, mantendo o IVF. Retorna quantos saíram."""
+        removed = self._by_document.pop(document_id, None)
+        if not removed:
+            return 0
+
+        removed_ids = set(removed)
+        new_ids = [-1] * len(self._rows)
+        vectors: List[array] = []
+        rows: List[Dict[str, Any]] = []
+        for row_id, (vector, row) in enumerate(zip(self._vectors, self._rows)):
+            if row_id not in removed_ids:
+                new_ids[row_id] = len(rows)
+                vectors.append(vector)
+                rows.append(row)
+
+        self._vectors, self._rows = vectors, rows
+        self._by_document = {
+            key: [new_ids[row_id] for row_id in row_ids]
+            for key, row_ids in self._by_document.items()
+        }
+        self.lists = [
+            [new_ids[row_id] for row_id in row_ids if new_ids[row_id] >= 0]
+            for row_ids in self.lists
+        ]
+        self._matrix = None
+        return len(removed_ids)
+
+    # ------------------------------------------------------------------
+    # Busca
+    # ------------------------------------------------------------------
+
+    def search(self, query_vector: Sequence[float], limit: int = 10,
+               document_ids: Optional[List[str]] = None,
+               nprobe: Optional[int] = None, exact: bool = False) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Retorna até `limit` pares (similaridade de cosseno, payload) em ordem decrescente.
+
+        Sem IVF, ou com `exact=True`, a busca é exata. Quando há filtro por
+        documento e os candidatos filtrados são menos numerosos que os que o IVF
+        visitaria, eles são comparados diretamente (recall total e mais barato).
+        """
+        if not self._rows or limit <= 0:
+            return []
+        if len(query_vector) != self.dimension:
+            raise ValueError(f"Query with dimension {len(query_vector)}, index uses {self.dimension}")
+
+        query = _normalize(query_vector)
+        if query is None:
+            return []
+
+        candidates: Optional[List[int]] = None
+        if document_ids:
+            candidates = []
+            for document_id in document_ids:
+                candidates.extend(self._by_document.get(document_id, ()))
+            if not candidates:
+                return []
+
+        if self.lists and not exact:
+            nprobe = min(nprobe or self.default_nprobe, len(self.lists))
+            probed = self._nearest_centroids(query, nprobe)
+            probed_count = sum(len(self.lists[list_id]) for list_id in probed)
+            if candidates is None or len(candidates) > probed_count:
+                allowed = set(candidates) if candidates is not None else None
+                candidates = [
+                    row_id
+                    for list_id in probed
+                    for row_id in self.lists[list_id]
+                    if allowed is None or row_id in allowed
+                ]
+
+        scored = self._scores(query, candidates)
+        return [
+            (score, self._rows[row_id])
+            for score, row_id in heapq.nlargest(limit, scored)
+        ]
+
+    # ------------------------------------------------------------------
+    # Snapshot
+    # ------------------------------------------------------------------
+
+    def save(self, path: str) -> None:
+        """
+        Grava o índice em um único arquivo: cabeçalho JSON (payloads e listas
+        do IVF) seguido dos vetores e centróides em float32.
+        """
+        header = json.dumps({
+            "dimension": self.dimension,
+            "count": len(self._vectors),
+            "rows": self._rows,
+            "n_centroids": len(self.centroids),
+            "lists": self.lists,
+            "default_nprobe": self.default_nprobe,
+        }, ensure_ascii=False).encode('utf-8')
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as snapshot:
+            snapshot.write(SNAPSHOT_MAGIC)
+            snapshot.write(struct.pack('<Q', len(header)))
+            snapshot.write(header)
+            for vector in self._vectors:
+                vector.tofile(snapshot)
+            for centroid in self.centroids:
+                centroid.tofile(snapshot)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'VectorIndex':
+        """Carrega um snapshot gravado por `save`."""
+        with open(path, 'rb') as snapshot:
+            if snapshot.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a vector index snapshot")
+            header_size, = struct.unpack('<Q', snapshot.read(8))
+            header = json.loads(snapshot.read(header_size).decode('utf-8'))
+            data = array('f')
+            data.frombytes(snapshot.read())
+
+        index = cls(header["dimension"])
+        dimension = header["dimension"] or 0
+        index._rows = header["rows"]
+        index._vectors = [
+            data[offset:offset + dimension]
+            for offset in range(0, header["count"] * dimension, dimension)
+        ]
+        centroids_offset = header["count"] * dimension
+        index.centroids = [
+            data[offset:offset + dimension]
+            for offset in range(centroids_offset, centroids_offset + header["n_centroids"] * dimension, dimension)
+        ]
+        index.lists = header["lists"]
+        index.default_nprobe = header["default_nprobe"]
+        for row_id, row in enumerate(index._rows):
+            index._by_document.setdefault(row.get('document_id'), []).append(row_id)
+        return index
+
+    @classmethod
+    async def load_from_supabase(cls, supabase_client, document_ids: Optional[List[str]] = None,
+                                 page_size: int = 1000) -> 'VectorIndex':
+        """Monta o índice paginando document_embeddings."""
+        index = cls()
+        start = 0
+        columns = ", ".join(PAYLOAD_COLUMNS + ("embedding",))
+        while True:
+            query = supabase_client.table("document_embeddings").select(columns)
+            if document_ids:
+                query = query.in_("document_id", document_ids)
+            response = await query.order("id").range(start, start + page_size - 1).execute()
+            rows = response.data or []
+
+            for row in rows:
+                embedding = _parse_embedding(row.pop("embedding", None))
+                if embedding:
+                    index.add(embedding, row)
+
+            if len(rows) < page_size:
+                break
+            start += page_size
+
+        print(f"Loaded {len(index)} embeddings into vector index")
+        return index
+
+
+async def build_vector_index_snapshot(supabase_client, path: str,
+                                      n_lists: Optional[int] = None) -> VectorIndex:
+    """Carrega os embeddings do banco, constrói o IVF e grava o snapshot em `path`."""
+    index = await VectorIndex.load_from_supabase(supabase_client)
+    if len(index) > 0:
+        index.build_ivf(n_lists)
+    index.save(path)
+    print(f"Vector index snapshot saved to {path} ({len(index)} vectors, {len(index.lists)} lists)")
+    return index
+
+
+_shared_vector_index: Optional[VectorIndex] = None
+_shared_vector_mtime: Optional[float] = None
+_shared_embedding_client = None
+
+
+def get_shared_vector_index() -> Optional[VectorIndex]:
+    """
+    Índice compartilhado carregado do snapshot em VECTOR_INDEX_SNAPSHOT.
+    É recarregado quando a ingestão regrava o snapshot; retorna None se o
+    snapshot não estiver configurado ou não puder ser lido.
+    """
+    global _shared_vector_index, _shared_vector_mtime
+    path = os.environ.get("VECTOR_INDEX_SNAPSHOT")
+    if not path or not os.path.exists(path):
+        return None
+
+    mtime = os.path.getmtime(path)
+    if _shared_vector_index is None or mtime != _shared_vector_mtime:
+        try:
+            _shared_vector_index = VectorIndex.load(path)
+            _shared_vector_mtime = mtime
+            print(f"Vector index loaded from {path} ({len(_shared_vector_index)} vectors)")
+        except Exception as e:
+            print(f"Error loading vector index snapshot: {e}")
+            return _shared_vector_index
+    return _shared_vector_index
+
+
+def update_vector_snapshot(document_id: str, current: VectorIndex) -> None:
+    """
+    Atualiza o snapshot em VECTOR_INDEX_SNAPSHOT com os embeddings atuais de
+    um documento (`current`, lidos do banco com load_from_supabase, já que os
+    reaproveitados não passam pela ingestão). Os novos vetores entram nas
+    listas do IVF existente. Sem snapshot configurado, não faz nada.
+
+    O snapshot é lido e regravado inteiro: quem chama não deve rodar duas
+    atualizações ao mesmo tempo.
+    """
+    path = os.environ.get("VECTOR_INDEX_SNAPSHOT")
+    if not path:
+        return
+
+    index = VectorIndex.load(path) if os.path.exists(path) else VectorIndex()
+    removed = index.remove_document(document_id)
+    added = 0
+    for vector, row in zip(current._vectors, current._rows):
+        added += index.add(vector, row)
+    index.save(path)
+    print(f"Vector index updated for document {document_id}: {removed} vectors removed, {added} added")
+
+
+def get_shared_embedding_client():
+    """
+    Cliente de embeddings das queries, criado com OPENAI_API_KEY no primeiro
+    uso. Retorna None sem o pacote openai ou sem a chave configurada.
+    """
+    global _shared_embedding_client
+    if _shared_embedding_client is None and OPENAI_AVAILABLE:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if api_key:
+            _shared_embedding_client = AsyncOpenAI(api_key=api_key)
+    return _shared_embedding_client
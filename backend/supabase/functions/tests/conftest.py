@@ -0,0 +1,86 @@
+"""
+Configuração dos testes das funções Python.
+
+Os módulos de shared/ são importados pelo nome, como fazem as funções
+(que acrescentam o diretório ao sys.path), e os provedores falsos vêm de
+scripts/benchmarks.
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ROOT = os.path.abspath(os.path.join(FUNCTIONS_DIR, '..', '..', '..'))
+
+sys.path.insert(0, os.path.join(FUNCTIONS_DIR, 'shared'))
+sys.path.insert(0, os.path.join(ROOT, 'scripts', 'benchmarks'))
+
+# Importadas no topo de process-document/index.py
+PROCESS_DOCUMENT_DEPENDENCIES = ("fitz", "supabase", "openai", "docx", "openpyxl", "pandas")
+
+
+@pytest.fixture(scope="session")
+def process_document():
+    """Módulo process-document/index.py; sem as dependências da função, o teste é pulado."""
+    for dependency in PROCESS_DOCUMENT_DEPENDENCIES:
+        pytest.importorskip(dependency)
+    spec = importlib.util.spec_from_file_location(
+        'process_document_index', os.path.join(FUNCTIONS_DIR, 'process-document', 'index.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def without_local_indexes(monkeypatch):
+    """Sem snapshots de índices locais no ambiente: as buscas passam pelo StorageBackend."""
+    for name in ("VECTOR_INDEX_SNAPSHOT", "BM25_INDEX_SNAPSHOT", "REFERENCE_INDEX_SNAPSHOT"):
+        monkeypatch.delenv(name, raising=False)
+
+
+# Chunks do InMemoryStorageBackend dos testes, por documento
+STORAGE_CHUNKS = {
+    "doc-luos": [
+        "Art. 74. Os empreendimentos na ZOT 8.2 - 4º Distrito observam a altura máxima do Anexo 13.4.",
+        "Art. 81. O coeficiente de aproveitamento segue a LC 434/99 e o Decreto nº 18.623/2014.",
+        "Art. 90. As disposições transitórias valem até a revisão desta Lei.",
+    ],
+    "doc-plano": [
+        "Art. 45. As áreas de preservação permanente seguem a Lei Complementar nº 646, de 22 de julho de 2010.",
+        "Art. 67. O 4º Distrito tem regime urbanístico diferenciado na ZOT 08.",
+    ],
+}
+
+
+@pytest.fixture
+def in_memory_storage():
+    """InMemoryStorageBackend com os chunks de STORAGE_CHUNKS e keywords detectadas."""
+    from keywords_detector import KeywordDetector, serialize_chunk_keywords
+    from storage_backend import InMemoryStorageBackend
+
+    detector = KeywordDetector()
+    documents, chunks = [], []
+    for document_id, texts in STORAGE_CHUNKS.items():
+        documents.append({"id": document_id, "title": document_id.upper(), "updated_at": "2025-10-01T00:00:00"})
+        for enhanced in serialize_chunk_keywords(detector.process_document_chunks(texts, workers=1)):
+            chunks.append({
+                "id": len(chunks) + 1,
+                "document_id": document_id,
+                "content_chunk": enhanced["text"],
+                "chunk_index": enhanced["index"],
+                "keywords": enhanced["keywords"],
+                "priority_score": enhanced["priority_score"],
+                "has_composite_keywords": enhanced["has_composite_keywords"],
+                "legal_references_count": enhanced["legal_references_count"],
+            })
+    return InMemoryStorageBackend(
+        documents=documents,
+        chunks=chunks,
+        keywords_summaries=[{"document_id": "doc-luos"}],
+        zots_bairros=[{"bairro": "Centro Histórico", "zona": "ZOT 08"}],
+        query_log=[{"query": "altura máxima ZOT 8.2", "hit_count": 7}],
+    )
@@ -0,0 +1,101 @@
+"""Testes do índice BM25 local (busca por termos)."""
+
+from bm25_index import BM25Index, tokenize
+
+DOCUMENT_V1 = [
+    "Art. 1. As ocupações do solo seguem o regime urbanístico da ZOT 8.2.",
+    "Art. 2. A altura máxima das edificações é definida no Anexo 13.4.",
+    "Art. 3. As áreas de preservação permanente não admitem edificação.",
+]
+
+# Reingestão: o art. 1 é mantido, o art. 2 muda, o art. 3 sai e o art. 4 entra
+DOCUMENT_V2 = [
+    DOCUMENT_V1[0],
+    "Art. 2. A altura máxima das edificações é de 52 metros na ZOT 8.2.",
+    "Art. 4. O coeficiente de aproveitamento básico é 1,9 nas zonas urbanas.",
+]
+
+OTHER_DOCUMENT = [
+    "Art. 10. O estudo de impacto de vizinhança é exigido para grandes empreendimentos.",
+    "Art. 11. A ocupação urbana respeita a altura das edificações vizinhas.",
+]
+
+QUERIES = ["altura máxima ZOT 8.2", "ocupação urbana", "edificações", "coeficiente", "inexistente"]
+
+
+def rows(texts):
+    return [{"content_chunk": text, "chunk_index": index} for index, text in enumerate(texts)]
+
+
+def ranked(index, query, document_ids=None):
+    # Empates podem sair em qualquer ordem; compara score e texto
+    return sorted(
+        ((round(score, 9), row["document_id"], row["content_chunk"])
+         for score, row in index.search(query, 10, document_ids)),
+        key=lambda item: (-item[0], item[1], item[2])
+    )
+
+
+def test_tokenize_folds_accents_and_plurals():
+    assert tokenize("Ocupações") == tokenize("ocupacao")
+    assert tokenize("áreas urbanas") == tokenize("area urbano")
+    assert tokenize("o de a que") == []
+
+
+def test_update_document_matches_full_rebuild():
+    updated = BM25Index()
+    updated.update_document("doc-1", rows(DOCUMENT_V1))
+    updated.update_document("doc-2", rows(OTHER_DOCUMENT))
+    added, removed = updated.update_document("doc-1", rows(DOCUMENT_V2))
+
+    rebuilt = BM25Index()
+    rebuilt.update_document("doc-2", rows(OTHER_DOCUMENT))
+    rebuilt.update_document("doc-1", rows(DOCUMENT_V2))
+
+    assert (added, removed) == (2, 2)
+    assert len(updated) == len(rebuilt) == 5
+    for query in QUERIES:
+        assert ranked(updated, query) == ranked(rebuilt, query)
+        assert ranked(updated, query, ["doc-1"]) == ranked(rebuilt, query, ["doc-1"])
+
+
+def test_unchanged_document_is_not_retokenized():
+    index = BM25Index()
+    index.update_document("doc-1", rows(DOCUMENT_V1))
+
+    assert index.update_document("doc-1", rows(DOCUMENT_V1)) == (0, 0)
+    assert len(index) == len(DOCUMENT_V1)
+
+
+def test_remove_document():
+    index = BM25Index()
+    index.update_document("doc-1", rows(DOCUMENT_V1))
+    index.update_document("doc-2", rows(OTHER_DOCUMENT))
+
+    assert index.remove_document("doc-1") == len(DOCUMENT_V1)
+    assert {row["document_id"] for _, row in index.search("altura edificações", 10)} == {"doc-2"}
+
+
+def test_search_filters_documents_and_ranks_by_score():
+    index = BM25Index()
+    index.update_document("doc-1", rows(DOCUMENT_V2))
+    index.update_document("doc-2", rows(OTHER_DOCUMENT))
+
+    results = index.search("altura máxima ZOT 8.2", 10)
+    assert results[0][1]["content_chunk"] == DOCUMENT_V2[1]
+    assert [score for score, _ in results] == sorted((score for score, _ in results), reverse=True)
+    assert index.search("altura", 10, ["doc-3"]) == []
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = BM25Index()
+    index.update_document("doc-1", rows(DOCUMENT_V1))
+    index.update_document("doc-2", rows(OTHER_DOCUMENT))
+    path = str(tmp_path / "bm25.json")
+
+    index.save(path)
+    loaded = BM25Index.load(path)
+
+    for query in QUERIES:
+        assert ranked(loaded, query) == ranked(index, query)
+    assert loaded.update_document("doc-1", rows(DOCUMENT_V2)) == (2, 2)
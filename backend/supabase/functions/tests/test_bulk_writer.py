@@ -0,0 +1,77 @@
+"""Testes da escrita em lote com retentativa e divisão dos lotes que falham."""
+
+import asyncio
+
+from bulk_writer import BulkInsertWriter
+
+
+class FlakyTable:
+    """Tabela falsa: rejeita lotes com linhas inválidas e as primeiras `transient_failures` chamadas."""
+
+    def __init__(self, bad_keys=(), transient_failures=0):
+        self.bad_keys = set(bad_keys)
+        self.transient_failures = transient_failures
+        self.rows = []
+        self.calls = []
+
+    async def insert_rows(self, rows):
+        self.calls.append(len(rows))
+        if self.transient_failures:
+            self.transient_failures -= 1
+            raise RuntimeError("connection reset")
+        bad = [row["key"] for row in rows if row["key"] in self.bad_keys]
+        if bad:
+            raise ValueError(f"invalid row {bad[0]}")
+        self.rows.extend(rows)
+
+
+def write(table, keys, batch_size=4, max_retries=2):
+    async def run():
+        writer = BulkInsertWriter(table.insert_rows, batch_size=batch_size,
+                                  max_retries=max_retries, retry_delay=0)
+        for key in keys:
+            await writer.add(key, {"key": key})
+        return await writer.close()
+    return asyncio.run(run())
+
+
+def test_writes_in_batches():
+    table = FlakyTable()
+
+    result = write(table, range(10))
+
+    assert table.calls == [4, 4, 2]
+    assert result.inserted == list(range(10))
+    assert (result.batches, result.retries, result.errors) == (3, 0, {})
+
+
+def test_transient_failure_is_retried():
+    table = FlakyTable(transient_failures=2)
+
+    result = write(table, range(4))
+
+    assert table.calls == [4, 4, 4]
+    assert result.inserted == list(range(4))
+    assert (result.batches, result.retries, result.errors) == (3, 2, {})
+
+
+def test_failing_batch_is_split_to_isolate_bad_rows():
+    table = FlakyTable(bad_keys={2, 7})
+
+    result = write(table, range(8), batch_size=8, max_retries=1)
+
+    assert sorted(result.inserted) == [0, 1, 3, 4, 5, 6]
+    assert [row["key"] for row in table.rows] == [0, 1, 3, 4, 5, 6]
+    assert result.errors == {2: "invalid row 2", 7: "invalid row 7"}
+    # 2 tentativas do lote de 8; cada metade é dividida até a linha com erro, sem retentar
+    assert table.calls == [8, 8, 4, 2, 2, 1, 1, 4, 2, 2, 1, 1]
+    assert (result.batches, result.retries) == (12, 1)
+
+
+def test_persistent_failure_reports_every_row():
+    table = FlakyTable(transient_failures=100)
+
+    result = write(table, range(3), max_retries=0)
+
+    assert result.inserted == []
+    assert result.errors == {key: "connection reset" for key in range(3)}
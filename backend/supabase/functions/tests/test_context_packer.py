@@ -0,0 +1,62 @@
+"""Testes do empacotamento do contexto dentro do orçamento de tokens."""
+
+from context_packer import CONTEXT_SEPARATOR, count_tokens, pack_context, truncate_to_tokens
+
+ZOT_CHUNK = "Na ZOT 8.2 a altura máxima das edificações é de 52 metros, conforme o Anexo 13.4 do plano diretor."
+EIV_CHUNK = "O estudo de impacto de vizinhança é exigido para empreendimentos com área construída acima de 30 mil m²."
+APP_CHUNK = "As áreas de preservação permanente não admitem edificação, salvo nos casos de utilidade pública."
+LONG_CHUNK = " ".join(f"Art. {number}. O coeficiente de aproveitamento básico é 1,{number} na zona {number}."
+                      for number in range(1, 60))
+
+
+def packed_tokens(chunks):
+    return sum(count_tokens(chunk) for chunk in chunks) + count_tokens(CONTEXT_SEPARATOR) * (len(chunks) - 1)
+
+
+def test_keeps_score_order_within_budget():
+    candidates = [(APP_CHUNK, 0.5), (ZOT_CHUNK, 0.9), (EIV_CHUNK, 0.7)]
+
+    packed = pack_context(candidates, token_budget=10_000)
+
+    assert packed.chunks == [ZOT_CHUNK, EIV_CHUNK, APP_CHUNK]
+    assert packed.tokens == packed_tokens(packed.chunks)
+    assert (packed.duplicates_dropped, packed.over_budget_dropped) == (0, 0)
+
+
+def test_skips_chunks_over_budget_and_tries_smaller_ones():
+    budget = packed_tokens([ZOT_CHUNK, EIV_CHUNK])
+    candidates = [(ZOT_CHUNK, 0.9), (LONG_CHUNK, 0.8), (EIV_CHUNK, 0.7), (APP_CHUNK, 0.6)]
+
+    packed = pack_context(candidates, token_budget=budget)
+
+    assert packed.chunks == [ZOT_CHUNK, EIV_CHUNK]
+    assert packed.tokens <= budget
+    assert packed.over_budget_dropped == 2
+
+
+def test_best_chunk_is_truncated_when_nothing_fits():
+    packed = pack_context([(LONG_CHUNK, 0.9), (ZOT_CHUNK, 0.1)], token_budget=20)
+
+    assert packed.chunks == [truncate_to_tokens(LONG_CHUNK, 20)]
+    assert 0 < packed.tokens <= 20
+    assert packed.over_budget_dropped == 1
+
+
+def test_drops_near_duplicates():
+    reformatted = "  na zot 8.2 a ALTURA máxima das edificações é de 52 metros, conforme o anexo 13.4 do plano diretor"
+    contained = "altura máxima das edificações é de 52 metros, conforme o Anexo 13.4"
+    candidates = [(ZOT_CHUNK, 0.9), (reformatted, 0.8), (contained, 0.7), (EIV_CHUNK, 0.6)]
+
+    packed = pack_context(candidates, token_budget=10_000)
+
+    assert packed.chunks == [ZOT_CHUNK, EIV_CHUNK]
+    assert packed.duplicates_dropped == 2
+
+
+def test_max_chunks_and_blank_candidates():
+    candidates = [("   ", 1.0), (ZOT_CHUNK, 0.9), (EIV_CHUNK, 0.7), (APP_CHUNK, 0.5)]
+
+    packed = pack_context(candidates, token_budget=10_000, max_chunks=2)
+
+    assert packed.chunks == [ZOT_CHUNK, EIV_CHUNK]
+    assert pack_context([], token_budget=100).chunks == []
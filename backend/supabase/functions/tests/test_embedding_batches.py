@@ -0,0 +1,98 @@
+"""Testes dos lotes de embeddings da ingestão (EmbeddingGenerator.embed_chunks)."""
+
+import asyncio
+
+import pytest
+
+from fake_embeddings import FakeEmbeddingProvider
+
+
+def make_items(count):
+    # Tamanhos variados, para que os lotes não tenham todos os mesmos tokens
+    return [
+        (index, f"Chunk {index}: " + "regime urbanístico da zona " * (1 + index % 7))
+        for index in range(count)
+    ]
+
+
+def make_generator(process_document, provider, batch_size=100, max_tokens=50000, concurrency=4):
+    generator = process_document.EmbeddingGenerator(provider, None)
+    generator.embedding_batch_size = batch_size
+    generator.embedding_batch_max_tokens = max_tokens
+    generator.embedding_concurrency = concurrency
+    return generator
+
+
+def embed(generator, items):
+    return asyncio.run(generator.embed_chunks(items))
+
+
+def test_batches_respect_batch_size(process_document):
+    provider = FakeEmbeddingProvider(dimension=8, request_latency_ms=1)
+    items = make_items(50)
+
+    embeddings, errors = embed(make_generator(process_document, provider, batch_size=7), items)
+
+    batch_sizes = [len(batch) for batch in provider.embeddings.batches]
+    assert not errors
+    assert len(embeddings) == len(items)
+    assert max(batch_sizes) == 7
+    assert sum(batch_sizes) == len(items)
+    assert provider.embeddings.requests == 8  # ceil(50 / 7)
+
+
+def test_batches_respect_token_limit(process_document):
+    provider = FakeEmbeddingProvider(dimension=8, request_latency_ms=1)
+    items = make_items(60)
+    max_tokens = 120
+
+    embeddings, errors = embed(make_generator(process_document, provider, max_tokens=max_tokens), items)
+
+    assert not errors
+    assert len(embeddings) == len(items)
+    assert len(provider.embeddings.batches) > 1
+    for batch in provider.embeddings.batches:
+        tokens = sum(process_document.count_tokens(text) for text in batch)
+        # Um chunk sozinho pode passar do limite; dois ou mais, nunca
+        assert len(batch) == 1 or tokens <= max_tokens
+
+
+def test_results_keep_input_order(process_document):
+    # Latência por token alta: lotes menores, enviados depois, terminam antes
+    provider = FakeEmbeddingProvider(dimension=8, request_latency_ms=1, token_latency_ms=0.5)
+    items = make_items(40)[::-1]
+    texts = dict(items)
+
+    embeddings, errors = embed(make_generator(process_document, provider, batch_size=3, concurrency=8), items)
+
+    assert not errors
+    assert list(embeddings) == [index for index, _ in items]
+    for index, vector in embeddings.items():
+        assert vector == provider.embeddings._vector(texts[index])
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_in_flight_requests_bounded_by_concurrency(process_document, concurrency):
+    provider = FakeEmbeddingProvider(dimension=8, request_latency_ms=5)
+    items = make_items(40)
+
+    embeddings, errors = embed(
+        make_generator(process_document, provider, batch_size=2, concurrency=concurrency), items
+    )
+
+    assert not errors
+    assert len(embeddings) == len(items)
+    assert provider.embeddings.max_in_flight == concurrency
+
+
+def test_errors_reported_per_chunk(process_document):
+    provider = FakeEmbeddingProvider(dimension=8, request_latency_ms=1,
+                                     fail_if=lambda text: text.startswith("Chunk 5:"))
+    items = make_items(12)
+
+    embeddings, errors = embed(make_generator(process_document, provider, batch_size=4), items)
+
+    # Só o lote com o chunk 5 (chunks 4 a 7) falha; os demais lotes são gravados
+    assert set(errors) == {4, 5, 6, 7}
+    assert all("Fake embeddings request failed" in error for error in errors.values())
+    assert set(embeddings) == {0, 1, 2, 3, 8, 9, 10, 11}
@@ -0,0 +1,82 @@
+"""Testes do score de keywords do IntelligentSearch contra a fórmula original."""
+
+import pytest
+
+from intelligent_search import KEYWORD_TYPE_BONUS, IntelligentSearch
+from keywords_detector import KeywordDetector
+
+
+@pytest.fixture(scope="module")
+def detector():
+    return KeywordDetector()
+
+
+def baseline_keyword_score(chunk_keywords, query_keywords, chunk_text):
+    """Fórmula anterior à otimização: cada keyword da query procurada no texto do chunk."""
+    if not query_keywords:
+        return 0.0
+    score = 0.0
+    chunk_text_lower = chunk_text.lower()
+    for query_kw in query_keywords:
+        if query_kw.text.lower() in chunk_text_lower:
+            score += 0.3 + KEYWORD_TYPE_BONUS.get(query_kw.type, 0.1)
+    for chunk_kw in chunk_keywords:
+        if chunk_kw.get('type') == 'composite':
+            score += 0.1
+        elif chunk_kw.get('type') == 'legal_reference':
+            score += 0.05
+    return min(1.0, score)
+
+
+def stored_keywords(detector, text):
+    return [
+        {'text': keyword.text, 'type': keyword.type.value, 'confidence': keyword.confidence}
+        for keyword in detector.extract_all_keywords(text)
+    ]
+
+
+CHUNKS = [
+    "O estudo de impacto de vizinhança é exigido conforme a Lei Complementar nº 434 de 1999.",
+    "Na ZOT 8.2 a altura máxima segue o coeficiente de aproveitamento do Anexo 1.",
+    "Texto sem nenhuma referência relevante para a consulta.",
+    "A LC 434/99 e o Decreto nº 5/2020 tratam da área de preservação permanente.",
+    "Regime urbanístico da ZOT 08 no bairro Centro Histórico.",
+]
+
+QUERIES = [
+    "estudo de impacto",
+    "Lei Complementar nº 434",
+    "altura máxima na ZOT 8",
+    "LC 434/99 e área de preservação permanente",
+    "consulta sem keywords",
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("with_stored_keywords", [True, False])
+def test_keyword_scores_match_baseline(detector, query, with_stored_keywords):
+    query_keywords = detector.extract_all_keywords(query)
+    rows = [
+        {'content_chunk': text, 'keywords': stored_keywords(detector, text) if with_stored_keywords else []}
+        for text in CHUNKS
+    ]
+
+    scores = IntelligentSearch._keyword_components(rows, IntelligentSearch._fold_query_keywords(query_keywords))
+
+    expected = [baseline_keyword_score(row['keywords'], query_keywords, row['content_chunk']) for row in rows]
+    assert scores == pytest.approx(expected)
+
+
+def test_query_keyword_scores_substring_of_stored_keyword(detector):
+    # A keyword da query só aparece dentro de uma keyword armazenada mais longa
+    row = {
+        'content_chunk': CHUNKS[0],
+        'keywords': [{'text': 'estudo de impacto de vizinhança', 'type': 'composite'}],
+    }
+    query_keywords = detector.extract_all_keywords("estudo de impacto")
+    assert query_keywords
+
+    score = IntelligentSearch._keyword_components([row], IntelligentSearch._fold_query_keywords(query_keywords))[0]
+
+    assert score == pytest.approx(baseline_keyword_score(row['keywords'], query_keywords, row['content_chunk']))
+    assert score > 0.1
@@ -0,0 +1,60 @@
+"""Testes da detecção de referências legais do KeywordDetector."""
+
+import pytest
+
+from keywords_detector import KeywordDetector, KeywordType, PatternKeywordEngine
+
+
+@pytest.fixture(scope="module")
+def detector():
+    return KeywordDetector()
+
+
+def legal_references(detector, text):
+    return [
+        keyword.text for keyword in detector.extract_all_keywords(text)
+        if keyword.type == KeywordType.LEGAL_REFERENCE
+    ]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Conforme a LC 434/99", ["LC 434/99"]),
+    ("Lei Complementar nº 434 de 1999", ["Lei Complementar nº 434 de 1999"]),
+    ("Lei Complementar nº 646, de 22 de julho de 2010", ["Lei Complementar nº 646, de 22 de julho de 2010"]),
+    ("(LC 12) e o Decreto nº 5/2020", ["LC 12", "Decreto nº 5/2020"]),
+])
+def test_detects_legal_citations(detector, text, expected):
+    assert sorted(legal_references(detector, text)) == sorted(expected)
+
+
+@pytest.mark.parametrize("text", [
+    "O calc 12 e bloc 3/2020 valem",
+    "A sublei 5 e o superdecreto 7 não são citações",
+])
+def test_ignores_prefix_inside_other_words(detector, text):
+    # Regressão: "calc 12" era detectado como "lc 12"
+    assert legal_references(detector, text) == []
+
+
+@pytest.mark.parametrize("pattern, prefix", [
+    (r'\blei\s+\d+', 'lei'),
+    (r'\A(?<!\w)zot\s*\d+', 'zot'),
+    (r'^Anexo\s+\d+', 'anexo'),
+    (r'\d+[º°]\s*distrito', ''),
+])
+def test_literal_prefix_skips_leading_anchors(pattern, prefix):
+    assert PatternKeywordEngine._literal_prefix(pattern) == prefix
+
+
+def test_legal_reference_patterns_use_prefix_scan(detector):
+    # Regressão: com o \b inicial, os padrões caíam no finditer um a um
+    engine = detector.pattern_engine
+    assert all(engine.entries[index][0] != KeywordType.LEGAL_REFERENCE for index in engine._fallback)
+
+
+def test_patterns_version_changes_with_patterns(detector):
+    changed = KeywordDetector()
+    assert changed.patterns_version() == detector.patterns_version()
+
+    changed.regex_patterns[KeywordType.LEGAL_REFERENCE].append(r'\bemenda\s+\d+')
+    assert changed.patterns_version() != detector.patterns_version()
@@ -0,0 +1,42 @@
+"""Testes do processamento concorrente dos documentos da knowledgebase."""
+
+import asyncio
+
+
+def run_with_fake_processing(process_document, monkeypatch, concurrency):
+    """Roda a knowledgebase com processamento falso: (resultados, documentos na ordem de início, pico de concorrência)."""
+    started, running, peak = [], [0], [0]
+
+    async def fake_process(supabase_client, openai_client, doc_info):
+        started.append(doc_info)
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        # Os primeiros a começar demoram mais: a conclusão sai fora de ordem
+        await asyncio.sleep(0.01 * (8 - len(started)))
+        running[0] -= 1
+        return {"file": doc_info["file"], "status": "processed"}
+
+    monkeypatch.setenv("KB_PROCESSING_CONCURRENCY", str(concurrency))
+    monkeypatch.setattr(process_document, "process_knowledgebase_document", fake_process)
+    results = asyncio.run(process_document.process_all_knowledgebase_documents(None, None))
+    return results, started, peak[0]
+
+
+def test_results_follow_document_list_order(process_document, monkeypatch):
+    sequential, _, _ = run_with_fake_processing(process_document, monkeypatch, concurrency=1)
+    concurrent, started, peak = run_with_fake_processing(process_document, monkeypatch, concurrency=3)
+
+    files = [result["file"] for result in concurrent]
+    assert files == [result["file"] for result in sequential]
+    assert files[0] == "PDPOA2025-Minuta_Preliminar_LUOS.docx"
+    assert files[-1] == "PDPOA2025-ZOTs_vs_Bairros.xlsx"
+    assert [doc_info["file"] for doc_info in started] != files
+    assert peak == 3
+
+
+def test_high_priority_documents_start_first(process_document, monkeypatch):
+    _, started, _ = run_with_fake_processing(process_document, monkeypatch, concurrency=2)
+
+    priorities = [process_document.KB_PRIORITY_ORDER[doc_info["priority"]] for doc_info in started]
+    assert len(priorities) == 7
+    assert priorities == sorted(priorities)
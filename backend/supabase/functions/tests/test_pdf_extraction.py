@@ -0,0 +1,110 @@
+"""Testes da extração de PDFs por faixas de páginas."""
+
+from collections import OrderedDict
+
+import pytest
+
+import pdf_extraction
+from pdf_extraction import extract_page_range, page_range_tasks, page_texts
+
+
+class FakePage:
+    def __init__(self, text):
+        self.text = text
+
+    def get_text(self):
+        return self.text
+
+
+class FakePdf(list):
+    """Documento aberto falso: lista de páginas que registra o fechamento."""
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeFitz:
+    """Substitui o PyMuPDF: cada PDF falso é o texto das páginas separado por '|'."""
+
+    def __init__(self):
+        self.opened = []
+
+    def open(self, stream, filetype):
+        pdf = FakePdf(FakePage(text) for text in stream.decode().split("|"))
+        self.opened.append((stream, pdf))
+        return pdf
+
+
+@pytest.fixture
+def fake_fitz(monkeypatch):
+    fitz = FakeFitz()
+    monkeypatch.setattr(pdf_extraction, "fitz", fitz, raising=False)
+    monkeypatch.setattr(pdf_extraction, "FITZ_AVAILABLE", True)
+    monkeypatch.setattr(pdf_extraction, "_worker_documents", OrderedDict())
+    return fitz
+
+
+def fake_pdf_bytes(name, page_count):
+    return "|".join(f"{name} página {page}" for page in range(page_count)).encode()
+
+
+@pytest.mark.parametrize("page_count,parts", [(1, 4), (7, 3), (10, 5), (10, 4), (3, 8), (100, 6)])
+def test_page_ranges_are_contiguous_and_cover_every_page(page_count, parts):
+    tasks = page_range_tasks(b"%PDF", page_count, parts)
+
+    assert len(tasks) <= parts
+    assert tasks[0][2] == 0 and tasks[-1][3] == page_count
+    assert all(previous[3] == current[2] for previous, current in zip(tasks, tasks[1:]))
+    assert all(start < end for _, _, start, end in tasks)
+    assert len({key for key, *_ in tasks}) == 1
+
+
+def test_empty_document_has_no_ranges():
+    assert page_range_tasks(b"%PDF", 0, 4) == []
+
+
+def test_page_texts_reads_the_range():
+    pdf = [FakePage(f"página {page}") for page in range(5)]
+
+    assert page_texts(pdf, 1, 4) == ["página 1", "página 2", "página 3"]
+    assert page_texts(pdf, 2, 2) == []
+
+
+def test_ranges_rebuild_the_document_in_order(fake_fitz):
+    pdf_bytes = fake_pdf_bytes("luos", 11)
+
+    texts = [text for task in page_range_tasks(pdf_bytes, 11, 4) for text in extract_page_range(task)]
+
+    assert texts == [f"luos página {page}" for page in range(11)]
+    # As faixas do mesmo PDF reaproveitam o documento aberto
+    assert [stream for stream, _ in fake_fitz.opened] == [pdf_bytes]
+
+
+def test_worker_keeps_only_recent_documents_open(fake_fitz):
+    documents = [fake_pdf_bytes(name, 2) for name in ("luos", "plano", "anexos")]
+    tasks = [page_range_tasks(pdf_bytes, 2, 1)[0] for pdf_bytes in documents]
+
+    for task in tasks:
+        extract_page_range(task)
+    assert [pdf.closed for _, pdf in fake_fitz.opened] == [True, False, False]
+    assert len(pdf_extraction._worker_documents) == pdf_extraction.WORKER_DOCUMENTS_MAX
+
+    # O mais antigo foi fechado e é reaberto; o mais recente continua aberto
+    assert extract_page_range(tasks[0]) == ["luos página 0", "luos página 1"]
+    extract_page_range(tasks[2])
+    assert [stream for stream, _ in fake_fitz.opened] == documents + [documents[0]]
+
+
+def test_extract_page_range_with_pymupdf():
+    fitz = pytest.importorskip("fitz")
+    document = fitz.open()
+    for page in range(5):
+        document.new_page().insert_text((72, 72), f"Art. {page + 1}. Texto da pagina {page}.")
+    pdf_bytes = document.tobytes()
+
+    tasks = page_range_tasks(pdf_bytes, len(document), 2)
+    texts = [text for task in tasks for text in extract_page_range(task)]
+
+    assert texts == [document[page].get_text() for page in range(5)]
+    assert "Art. 5." in texts[-1]
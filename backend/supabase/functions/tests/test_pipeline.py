@@ -0,0 +1,88 @@
+"""Testes dos estágios assíncronos da ingestão (run_stages, drain, bounded_queue)."""
+
+import asyncio
+
+import pytest
+
+from pipeline import PIPELINE_END, bounded_queue, drain, run_stages
+
+
+async def produce(queue, items):
+    for item in items:
+        await queue.put(item)
+    await queue.put(PIPELINE_END)
+    return len(items)
+
+
+async def transform(inbox, outbox, function):
+    count = 0
+    async for item in drain(inbox):
+        await outbox.put(function(item))
+        count += 1
+    await outbox.put(PIPELINE_END)
+    return count
+
+
+async def collect(inbox):
+    return [item async for item in drain(inbox)]
+
+
+def test_bounded_queue_has_at_least_one_slot():
+    assert bounded_queue(0).maxsize == 1
+    assert bounded_queue(-3).maxsize == 1
+    assert bounded_queue(8).maxsize == 8
+
+
+def test_stages_return_results_in_order():
+    async def run():
+        first, second = bounded_queue(2), bounded_queue(2)
+        return await run_stages(
+            produce(first, list(range(20))),
+            transform(first, second, lambda item: item * 10),
+            collect(second)
+        )
+
+    produced, transformed, collected = asyncio.run(run())
+
+    assert (produced, transformed) == (20, 20)
+    assert collected == [item * 10 for item in range(20)]
+
+
+def test_drain_stops_at_end_marker():
+    async def run():
+        queue = bounded_queue(10)
+        for item in ["a", None, 0, PIPELINE_END, "depois do fim"]:
+            queue.put_nowait(item)
+        return [item async for item in drain(queue)], queue.qsize()
+
+    assert asyncio.run(run()) == (["a", None, 0], 1)
+
+
+def test_failing_stage_cancels_the_others_and_propagates():
+    cancelled = []
+
+    async def failing_transform(inbox, outbox):
+        async for item in drain(inbox):
+            if item == 3:
+                raise ValueError("chunk inválido")
+            await outbox.put(item)
+
+    async def blocked_consumer(inbox):
+        try:
+            return await collect(inbox)
+        except asyncio.CancelledError:
+            cancelled.append("consumer")
+            raise
+
+    async def run():
+        first, second = bounded_queue(1), bounded_queue(1)
+        # Sem o cancelamento, o produtor ficaria preso na fila cheia e o consumidor à espera do fim
+        producer = produce(first, list(range(100)))
+        with pytest.raises(ValueError, match="chunk inválido"):
+            await asyncio.wait_for(
+                run_stages(producer, failing_transform(first, second), blocked_consumer(second)), 1
+            )
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+    assert cancelled == ["consumer"]
@@ -0,0 +1,94 @@
+"""Testes do índice de referências canônicas (ZOTs e citações legais)."""
+
+import pytest
+
+from reference_index import (
+    ReferenceIndex, canonical_legal_citation, canonical_zot_code, chunk_reference_codes, legal_citation_lookup_codes
+)
+
+
+@pytest.mark.parametrize("reference", ["LC 434/99", "Lei Complementar nº 434 de 1999", "lei complementar n° 434/1999",
+                                       "LC nº 434, de 1º de dezembro de 1999"])
+def test_legal_citation_variants_share_canonical_key(reference):
+    assert canonical_legal_citation(reference) == ("LC", 434, 1999)
+
+
+def test_legal_citation_details():
+    assert canonical_legal_citation("Decreto nº 20.611/2020") == ("DECRETO", 20611, 2020)
+    assert canonical_legal_citation("Lei nº 12.651 de 2012") == ("LEI", 12651, 2012)
+    assert canonical_legal_citation("Resolução 5/20") == ("RESOLUCAO", 5, 2020)
+    assert canonical_legal_citation("lei complementar 434") == ("LC", 434, None)
+    assert canonical_legal_citation("altura máxima") is None
+
+
+def test_zot_code_variants():
+    assert canonical_zot_code("ZOT 8.2") == canonical_zot_code("zot 08.2") == "ZOT 08.2"
+    assert canonical_zot_code("ZOT8.2") == canonical_zot_code("zona 8.2") == "ZOT 08.2"
+    assert canonical_zot_code("8") == "ZOT 08"
+    assert canonical_zot_code("ZOT 8.2") != canonical_zot_code("ZOT 8.21")
+    assert canonical_zot_code("ZOT 8.2") != canonical_zot_code("ZOT 8")
+    assert canonical_zot_code("Centro Histórico") is None
+
+
+def test_chunk_codes_include_undated_forms():
+    keywords = [
+        {"text": "LC 434/99", "type": "legal_reference"},
+        {"text": "Decreto nº 5", "type": "legal_reference"},
+        {"text": "ZOT 8.2", "type": "zot_reference"},
+        {"text": "altura máxima", "type": "composite"},
+    ]
+
+    assert chunk_reference_codes(keywords) == {"LC 434/1999", "LC 434", "DECRETO 5", "DECRETO 5/?", "ZOT 08.2"}
+
+
+def chunk(chunk_index, priority_score, *references):
+    keywords = [
+        {"text": reference, "type": "zot_reference" if reference.upper().startswith("ZOT") else "legal_reference"}
+        for reference in references
+    ]
+    return {"content_chunk": f"chunk {chunk_index}", "chunk_index": chunk_index,
+            "priority_score": priority_score, "keywords": keywords}
+
+
+def test_lookup_orders_by_priority_and_filters_documents():
+    index = ReferenceIndex()
+    index.update_document("doc-a", [chunk(0, 0.2, "ZOT 8.2"), chunk(1, 0.9, "zot 08.2", "LC 434/99"), chunk(2, 0.5)])
+    index.update_document("doc-b", [chunk(0, 0.7, "ZOT 8.2"), chunk(1, 0.1, "Lei Complementar nº 434")])
+
+    assert len(index) == 4
+    assert [(row["document_id"], row["chunk_index"]) for row in index.lookup("ZOT 08.2")] == [
+        ("doc-a", 1), ("doc-b", 0), ("doc-a", 0)
+    ]
+    assert [row["chunk_index"] for row in index.lookup("ZOT 08.2", limit=1)] == [1]
+    assert [row["document_id"] for row in index.lookup("ZOT 08.2", document_ids=["doc-b"])] == ["doc-b"]
+    assert index.lookup("ZOT 08.21") == []
+
+
+def test_lookup_any_matches_dated_and_undated_citations():
+    index = ReferenceIndex()
+    index.update_document("doc-a", [chunk(0, 0.9, "LC 434/99"), chunk(1, 0.3, "LC 434/2010")])
+    index.update_document("doc-b", [chunk(0, 0.5, "Lei Complementar nº 434")])
+
+    dated = legal_citation_lookup_codes(canonical_legal_citation("Lei Complementar nº 434 de 1999"))
+    undated = legal_citation_lookup_codes(canonical_legal_citation("LC 434"))
+
+    assert [(row["document_id"], row["chunk_index"]) for row in index.lookup_any(dated)] == [
+        ("doc-a", 0), ("doc-b", 0)
+    ]
+    assert [row["priority_score"] for row in index.lookup_any(undated)] == [0.9, 0.5, 0.3]
+
+
+def test_update_document_replaces_previous_chunks(tmp_path):
+    index = ReferenceIndex()
+    index.update_document("doc-a", [chunk(0, 0.9, "ZOT 8.2"), chunk(1, 0.3, "LC 434/99")])
+
+    assert index.update_document("doc-a", [chunk(0, 0.4, "ZOT 7")]) == 1
+    assert index.lookup("ZOT 08.2") == [] and index.lookup("LC 434/1999") == []
+    assert index.codes() == ["ZOT 07"]
+
+    path = str(tmp_path / "references.json")
+    index.save(path)
+    assert ReferenceIndex.load(path).lookup("ZOT 07") == index.lookup("ZOT 07")
+
+    index.remove_document("doc-a")
+    assert len(index) == 0 and index.codes() == []
@@ -0,0 +1,128 @@
+"""Testes do cache de resultados de busca (SearchResultCache) e do seu uso pelo IntelligentSearch."""
+
+import asyncio
+import time
+
+import pytest
+
+from intelligent_search import IntelligentSearch
+from search_cache import DocumentVersions, SearchResultCache
+
+pytestmark = pytest.mark.usefixtures("without_local_indexes")
+
+
+class CountingStorage:
+    """Envolve um backend contando as leituras de versões dos documentos."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.version_reads = 0
+
+    async def document_versions(self, document_ids=None):
+        self.version_reads += 1
+        return await self.storage.document_versions(document_ids)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+def test_entries_expire_after_ttl():
+    cache = SearchResultCache(max_size=10, ttl_seconds=0.05)
+    cache.put("altura máxima", None, 5, "resposta", ("v1",))
+
+    assert cache.get("Altura   MÁXIMA", None, 5, ("v1",)) == "resposta"
+    time.sleep(0.1)
+    assert cache.get("altura máxima", None, 5, ("v1",)) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SearchResultCache(max_size=2)
+    cache.put("a", None, 5, "A")
+    cache.put("b", None, 5, "B")
+    assert cache.get("a", None, 5) == "A"
+
+    cache.put("c", None, 5, "C")
+
+    assert cache.get("b", None, 5) is None
+    assert cache.get("a", None, 5) == "A"
+    assert cache.get("c", None, 5) == "C"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_local_reingestion_invalidates_filtered_entries():
+    versions = DocumentVersions()
+    cache = SearchResultCache(max_size=10, versions=versions)
+    cache.put("zot 8.2", ["doc-a"], 5, "A")
+    cache.put("zot 8.2", ["doc-b"], 5, "B")
+
+    versions.bump("doc-a")
+
+    assert cache.get("zot 8.2", ["doc-a"], 5) is None
+    assert cache.get("zot 8.2", ["doc-b"], 5) == "B"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_database_versions_expire_after_versions_ttl():
+    cache = SearchResultCache(max_size=10, versions_ttl_seconds=0.05)
+    cache.store_database_versions(["doc-b", "doc-a"], ("v1",))
+
+    assert cache.cached_database_versions(["doc-a", "doc-b"]) == ("v1",)
+    assert cache.cached_database_versions(None) is None
+    time.sleep(0.1)
+    assert cache.cached_database_versions(["doc-a", "doc-b"]) is None
+
+
+def make_search(storage, versions_ttl_seconds):
+    cache = SearchResultCache(max_size=10, versions=DocumentVersions(),
+                              versions_ttl_seconds=versions_ttl_seconds)
+    return IntelligentSearch(None, storage=storage, result_cache=cache), cache
+
+
+def search(service, query="altura máxima na ZOT 8.2"):
+    return asyncio.run(service.search_with_report(query, limit=3))
+
+
+def test_cache_hits_reuse_version_lookup(in_memory_storage):
+    storage = CountingStorage(in_memory_storage)
+    service, cache = make_search(storage, versions_ttl_seconds=60)
+
+    first = search(service)
+    second = search(service)
+
+    assert second.results == first.results
+    assert cache.stats()["hits"] == 1
+    assert storage.version_reads == 1
+
+
+def test_updated_at_change_invalidates_entry(in_memory_storage):
+    storage = CountingStorage(in_memory_storage)
+    service, cache = make_search(storage, versions_ttl_seconds=0)
+
+    search(service)
+    search(service)
+    assert cache.stats()["hits"] == 1
+
+    # Outro processo reingeriu um documento: o updated_at no banco mudou
+    in_memory_storage.documents[0]["updated_at"] = "2025-10-02T00:00:00"
+    search(service)
+
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["hits"] == 1
+    assert storage.version_reads == 3
+
+
+def test_updated_at_change_is_seen_after_versions_ttl(in_memory_storage):
+    storage = CountingStorage(in_memory_storage)
+    service, cache = make_search(storage, versions_ttl_seconds=0.05)
+
+    search(service)
+    in_memory_storage.documents[0]["updated_at"] = "2025-10-02T00:00:00"
+    search(service)
+    assert cache.stats()["hits"] == 1  # Versões ainda dentro do prazo
+
+    time.sleep(0.1)
+    search(service)
+
+    assert cache.stats()["invalidations"] == 1
+    assert storage.version_reads == 2
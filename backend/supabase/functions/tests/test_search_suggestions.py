@@ -0,0 +1,79 @@
+"""Testes do índice de sugestões de busca (autocomplete)."""
+
+import asyncio
+import random
+
+import pytest
+
+from search_suggestions import (
+    HEAVY_PREFIX_RANGE, PRECOMPUTED_TOP_K, SuggestionIndex, normalize_suggestion, refresh_dynamic_sources
+)
+
+
+def brute_force_suggest(items, partial_query, limit):
+    """Referência: todas as sugestões com um início de palavra que começa pelo texto digitado."""
+    prefix = normalize_suggestion(partial_query)
+    matches = [
+        (-weight, len(key), key, text)
+        for key, (text, weight) in items.items()
+        if any(suffix.startswith(prefix) for suffix in [key] + [key[i + 1:] for i, c in enumerate(key) if c == ' '])
+    ]
+    return [text for *_, text in sorted(matches)[:limit]]
+
+
+def test_matches_from_any_word_start():
+    index = SuggestionIndex()
+    index.set_source("bairros", [("Distrito Industrial", 1.0), ("4º Distrito", 3.0), ("Restinga", 1.0)])
+
+    assert index.suggest("distr") == ["4º Distrito", "Distrito Industrial"]
+    assert index.suggest("4o DIST") == ["4º Distrito"]
+    assert index.suggest("strito") == []
+    assert index.suggest("") == []
+
+
+def test_ranks_by_weight_then_length():
+    index = SuggestionIndex()
+    index.set_source("queries", [("zot 8.2 altura", 5.0), ("zot 8.2", 5.0), ("zot 8.1", 9.0)])
+
+    assert index.suggest("zot") == ["zot 8.1", "zot 8.2", "zot 8.2 altura"]
+    assert index.suggest("zot", limit=1) == ["zot 8.1"]
+
+
+def test_sources_merge_by_normalized_text():
+    index = SuggestionIndex()
+    index.set_source("keywords", [("Taxa de Ocupação", 2.0)])
+    index.set_source("queries", [("taxa de ocupacao", 5.0), ("taxa  de ocupação", 1.0), ("Taxa mínima", 7.0)])
+
+    # 2 + 5 + 1 supera o 7 da outra sugestão; fica o texto da primeira fonte
+    assert index.suggest("taxa") == ["Taxa de Ocupação", "Taxa mínima"]
+    assert len(index) == 2
+
+    index.set_source("queries", [])
+    assert index.suggest("taxa") == ["Taxa de Ocupação"]
+
+
+@pytest.mark.parametrize("limit", [1, 10, PRECOMPUTED_TOP_K, PRECOMPUTED_TOP_K + 15])
+def test_heavy_prefixes_match_brute_force(limit):
+    rng = random.Random(17)
+    words = ["zona", "zot", "altura", "area", "recuo", "taxa", "zoneamento", "distrito"]
+    items = {}
+    for number in range(HEAVY_PREFIX_RANGE * 3):
+        text = f"{rng.choice(words)} {rng.choice(words)} {number}"
+        items[normalize_suggestion(text)] = (text, float(rng.randint(1, 50)))
+
+    index = SuggestionIndex()
+    index.set_source("queries", items.values())
+
+    for prefix in ["z", "zo", "zon", "a", "taxa z", "di", "1"]:
+        assert index.suggest(prefix, limit) == brute_force_suggest(items, prefix, limit)
+
+
+def test_refresh_dynamic_sources(in_memory_storage):
+    index = SuggestionIndex()
+
+    counts = asyncio.run(refresh_dynamic_sources(index, in_memory_storage))
+
+    assert counts == {"bairros": 1, "zones": 1, "queries": 1}
+    assert index.suggest("centro") == ["Centro Histórico"]
+    assert index.suggest("altura") == ["altura máxima ZOT 8.2"]
+    assert "ZOT 08" in index.suggest("zot")
@@ -0,0 +1,132 @@
+"""Testes do IntelligentSearch e do KeywordsAdmin sobre o InMemoryStorageBackend."""
+
+import asyncio
+import time
+
+import pytest
+
+from intelligent_search import IntelligentSearch
+from keywords_admin import KeywordsAdmin
+from search_cache import SearchResultCache
+from search_suggestions import SuggestionIndex
+from storage_backend import InMemoryStorageBackend, StorageBackend
+
+
+pytestmark = pytest.mark.usefixtures("without_local_indexes")
+
+
+def make_search(storage):
+    return IntelligentSearch(None, storage=storage, result_cache=SearchResultCache(max_size=0))
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class PartialBackend(StorageBackend):
+        async def count_documents(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        PartialBackend()
+
+
+def test_in_memory_backend_implements_interface():
+    assert not InMemoryStorageBackend.__abstractmethods__
+
+
+def test_search_with_report_ranks_keyword_matches(in_memory_storage):
+    response = asyncio.run(make_search(in_memory_storage).search_with_report("altura máxima na ZOT 8.2", limit=3))
+
+    assert not response.partial
+    assert {status.name: status.status for status in response.retrievers} == {'semantic': 'ok', 'keyword': 'ok'}
+    assert response.results
+    assert "ZOT 8.2" in response.results[0].chunk_text
+    scores = [result.combined_score for result in response.results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_search_filters_documents(in_memory_storage):
+    results = asyncio.run(make_search(in_memory_storage).search_with_keywords(
+        "4º Distrito", document_ids=["doc-plano"], limit=5
+    ))
+
+    assert results
+    assert {result.document_id for result in results} == {"doc-plano"}
+
+
+def test_search_by_legal_reference_uses_backend(in_memory_storage):
+    results = asyncio.run(make_search(in_memory_storage).search_by_legal_reference("LC 434/99"))
+
+    assert [result.chunk_text for result in results] == [in_memory_storage.chunks[1]["content_chunk"]]
+    assert results[0].legal_references_count >= 1
+
+
+def test_search_by_zot_uses_backend(in_memory_storage):
+    results = asyncio.run(make_search(in_memory_storage).search_by_zot("ZOT 08"))
+
+    assert [result.document_id for result in results] == ["doc-plano"]
+
+
+def test_refresh_search_suggestions_reads_backend(in_memory_storage):
+    search = IntelligentSearch(None, storage=in_memory_storage, result_cache=SearchResultCache(max_size=0),
+                               suggestion_index=SuggestionIndex())
+    counts = asyncio.run(search.refresh_search_suggestions())
+
+    assert counts
+    assert any("Centro Histórico" in suggestion for suggestion in search.get_search_suggestions("centro"))
+
+
+def test_keywords_admin_health_report(in_memory_storage):
+    report = asyncio.run(KeywordsAdmin(None, storage=in_memory_storage).generate_system_health_report())
+
+    chunks = in_memory_storage.chunks
+    total_keywords = sum(len(chunk["keywords"]) for chunk in chunks)
+    assert report.total_documents == 2
+    assert report.total_chunks == len(chunks)
+    assert report.chunks_with_keywords == sum(1 for chunk in chunks if chunk["keywords"])
+    assert report.avg_keywords_per_chunk == pytest.approx(total_keywords / len(chunks))
+    assert report.documents_without_keywords == ["DOC-PLANO (doc-plano)"]
+
+    frequencies = [stats.frequency for stats in report.top_keywords]
+    assert frequencies == sorted(frequencies, reverse=True)
+    assert sum(frequencies) == total_keywords
+
+
+def test_in_memory_chunk_writes(in_memory_storage):
+    asyncio.run(in_memory_storage.insert_chunk_rows([
+        {"id": 99, "document_id": "doc-plano", "content_chunk": "Novo chunk", "chunk_index": 2, "keywords": []}
+    ]))
+    asyncio.run(in_memory_storage.update_chunk_positions([{"id": 99, "chunk_index": 0}]))
+
+    assert in_memory_storage.chunks[-1]["chunk_index"] == 0
+    stats = asyncio.run(in_memory_storage.chunk_keyword_stats())
+    assert stats["total_chunks"] == len(in_memory_storage.chunks)
+
+
+class SlowBM25Index:
+    """Índice BM25 cuja busca ocupa a CPU (bloqueante) por `seconds`."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __len__(self):
+        return 1
+
+    def search(self, query, limit, document_ids=None):
+        time.sleep(self.seconds)
+        return []
+
+
+def test_deadline_interrupts_blocking_bm25_search(in_memory_storage):
+    search = IntelligentSearch(None, storage=in_memory_storage, bm25_index=SlowBM25Index(0.5),
+                               result_cache=SearchResultCache(max_size=0))
+
+    async def timed_search():
+        started = time.perf_counter()
+        response = await search.search_with_report("altura máxima na ZOT 8.2", deadline_ms=50)
+        return response, time.perf_counter() - started
+
+    response, elapsed = asyncio.run(timed_search())
+
+    statuses = {status.name: status.status for status in response.retrievers}
+    assert statuses == {'semantic': 'ok', 'keyword': 'timeout'}
+    assert response.partial
+    assert elapsed < 0.3
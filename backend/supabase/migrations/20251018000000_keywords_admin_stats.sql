@@ -0,0 +1,71 @@
+-- Migration com as agregações do KeywordsAdmin
+-- O SupabaseStorageBackend chama estas funções via RPC, e o banco devolve só
+-- os totais, em vez de a API paginar document_embeddings inteira até o cliente.
+-- As consultas são as mesmas do AsyncpgStorageBackend (storage_backend.py).
+
+-- Totais de chunks, chunks com keywords e keywords
+CREATE OR REPLACE FUNCTION keywords_chunk_stats()
+RETURNS TABLE (
+    total_chunks BIGINT,
+    chunks_with_keywords BIGINT,
+    total_keywords BIGINT
+) AS $$
+    SELECT
+        count(*),
+        count(*) FILTER (WHERE jsonb_array_length(COALESCE(keywords, '[]'::jsonb)) > 0),
+        COALESCE(sum(jsonb_array_length(COALESCE(keywords, '[]'::jsonb))), 0)::BIGINT
+    FROM document_embeddings;
+$$ LANGUAGE sql STABLE;
+
+-- Keywords mais frequentes com número de documentos e confiança média
+CREATE OR REPLACE FUNCTION keywords_top_keywords(max_results INTEGER DEFAULT 20)
+RETURNS TABLE (
+    text TEXT,
+    type TEXT,
+    frequency BIGINT,
+    documents_count BIGINT,
+    avg_confidence FLOAT
+) AS $$
+    SELECT
+        COALESCE(kw->>'text', ''),
+        COALESCE(kw->>'type', 'unknown'),
+        count(*),
+        count(DISTINCT de.document_id),
+        avg(COALESCE((kw->>'confidence')::float, 0.0))
+    FROM document_embeddings de,
+         jsonb_array_elements(COALESCE(de.keywords, '[]'::jsonb)) AS kw
+    GROUP BY 1, 2
+    ORDER BY 3 DESC
+    LIMIT max_results;
+$$ LANGUAGE sql STABLE;
+
+-- Chunks longos e quantos deles estão sem keywords
+CREATE OR REPLACE FUNCTION keywords_long_chunk_stats(min_length INTEGER DEFAULT 500)
+RETURNS TABLE (
+    total_long BIGINT,
+    long_without_keywords BIGINT
+) AS $$
+    SELECT
+        count(*),
+        count(*) FILTER (WHERE jsonb_array_length(COALESCE(keywords, '[]'::jsonb)) = 0)
+    FROM document_embeddings
+    WHERE length(content_chunk) > min_length;
+$$ LANGUAGE sql STABLE;
+
+-- Total de keywords e quantas estão abaixo do limiar de confiança
+CREATE OR REPLACE FUNCTION keywords_confidence_stats(threshold FLOAT DEFAULT 0.5)
+RETURNS TABLE (
+    total_keywords BIGINT,
+    low_confidence BIGINT
+) AS $$
+    SELECT
+        count(*),
+        count(*) FILTER (WHERE COALESCE((kw->>'confidence')::float, 1.0) < threshold)
+    FROM document_embeddings de,
+         jsonb_array_elements(COALESCE(de.keywords, '[]'::jsonb)) AS kw;
+$$ LANGUAGE sql STABLE;
+
+GRANT EXECUTE ON FUNCTION keywords_chunk_stats() TO authenticated;
+GRANT EXECUTE ON FUNCTION keywords_top_keywords(INTEGER) TO authenticated;
+GRANT EXECUTE ON FUNCTION keywords_long_chunk_stats(INTEGER) TO authenticated;
+GRANT EXECUTE ON FUNCTION keywords_confidence_stats(FLOAT) TO authenticated;
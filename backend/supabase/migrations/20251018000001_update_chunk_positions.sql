@@ -0,0 +1,18 @@
+-- Migration para corrigir em lote a posição de chunks reaproveitados
+-- Na reingestão, chunks inalterados mantêm embedding e keywords e só mudam de
+-- chunk_index; o SupabaseStorageBackend envia as novas posições de um lote
+-- inteiro nesta função (RPC), em vez de um UPDATE por chunk.
+
+CREATE OR REPLACE FUNCTION update_chunk_positions(positions JSONB)
+RETURNS INTEGER AS $$
+    WITH updated AS (
+        UPDATE document_embeddings de
+        SET chunk_index = p.chunk_index
+        FROM jsonb_to_recordset(positions) AS p(id BIGINT, chunk_index INTEGER)
+        WHERE de.id = p.id
+        RETURNING 1
+    )
+    SELECT count(*)::INTEGER FROM updated;
+$$ LANGUAGE sql;
+
+GRANT EXECUTE ON FUNCTION update_chunk_positions(JSONB) TO authenticated;
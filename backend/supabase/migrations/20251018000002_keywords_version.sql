@@ -0,0 +1,6 @@
+-- Migration com a versão das regras de detecção de keywords de cada chunk
+-- A ingestão incremental só reaproveita chunks (embedding e keywords) cuja
+-- versão é a do KeywordDetector atual (KeywordDetector.patterns_version);
+-- chunks gravados com outras regras, ou antes desta coluna, são reprocessados.
+
+ALTER TABLE document_embeddings ADD COLUMN IF NOT EXISTS keywords_version TEXT;
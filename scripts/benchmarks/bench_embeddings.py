@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de throughput da geração de embeddings na ingestão.
+
+Roda EmbeddingGenerator.embed_chunks contra o provedor falso
+(fake_embeddings.py), que simula a latência da API, e compara a chamada
+sequencial de um chunk por requisição (comportamento anterior) com lotes
+de vários inputs em diferentes níveis de concorrência. Também confere que
+cada vetor voltou para o chunk certo.
+
+Uso:
+    python scripts/benchmarks/bench_embeddings.py [--chunks 1000] [--latency-ms 150]
+        [--batch-sizes 1,50,100] [--concurrency 1,4,8]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+FUNCTIONS_DIR = os.path.join(ROOT, 'backend', 'supabase', 'functions')
+sys.path.append(os.path.join(FUNCTIONS_DIR, 'shared'))
+sys.path.append(os.path.dirname(__file__))
+
+from fake_embeddings import FakeEmbeddingProvider
+from synthetic_corpus import generate_chunks
+
+
+def _load_embedding_generator():
+    """Importa EmbeddingGenerator de process-document (requer as dependências da função)."""
+    try:
+        spec = importlib.util.spec_from_file_location(
+            'process_document_index', os.path.join(FUNCTIONS_DIR, 'process-document', 'index.py')
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.EmbeddingGenerator
+    except ImportError as e:
+        print(f"process-document dependencies not installed ({e})")
+        return None
+
+
+async def run_case(generator_class, items, batch_size, concurrency, args):
+    provider = FakeEmbeddingProvider(dimension=args.dim, request_latency_ms=args.latency_ms)
+    generator = generator_class(provider, None)
+    generator.embedding_batch_size = batch_size
+    generator.embedding_concurrency = concurrency
+
+    started = time.perf_counter()
+    embeddings, errors = await generator.embed_chunks(items)
+    elapsed = time.perf_counter() - started
+
+    texts = dict(items)
+    mapped = all(embeddings[index] == provider.embeddings._vector(texts[index]) for index in embeddings)
+    return elapsed, provider.embeddings.requests, len(errors), mapped and len(embeddings) == len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--chunks', type=int, default=1000)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--latency-ms', type=float, default=150.0, help='Latência fixa por requisição')
+    parser.add_argument('--batch-sizes', default='1,50,100')
+    parser.add_argument('--concurrency', default='1,4,8')
+    args = parser.parse_args()
+
+    generator_class = _load_embedding_generator()
+    if generator_class is None:
+        return
+
+    items = list(enumerate(generate_chunks(args.chunks)))
+    print(f"{'batch':>6} {'conc':>5} {'requests':>9} {'seconds':>9} {'chunks/s':>10}  ok")
+    for batch_size in [int(value) for value in args.batch_sizes.split(',')]:
+        for concurrency in [int(value) for value in args.concurrency.split(',')]:
+            # Um chunk por requisição, sequencial, é o caminho antigo; só vale medir com conc=1
+            if batch_size == 1 and concurrency > 1:
+                continue
+            elapsed, requests, errors, ok = asyncio.run(
+                run_case(generator_class, items, batch_size, concurrency, args)
+            )
+            print(f"{batch_size:>6} {concurrency:>5} {requests:>9} {elapsed:>9.2f} "
+                  f"{len(items) / elapsed:>10.0f}  {'sim' if ok and not errors else 'NÃO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de memória das keywords detectadas (KeywordDetector).
+
+Mede, com tracemalloc, a memória retida pela lista de ChunkKeywords das
+minutas LUOS e Plano Diretor com o Keyword compacto (slots + contexto
+recortado sob demanda) e com a representação anterior, um dataclass que
+copiava o contexto de cada keyword na detecção.
+
+Uso:
+    python scripts/benchmarks/bench_keyword_memory.py [--copies 10]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'backend', 'supabase', 'functions', 'shared'))
+sys.path.append(os.path.dirname(__file__))
+
+from keywords_detector import KeywordDetector, KeywordType, ChunkKeywords
+from bench_keyword_patterns import load_chunks
+
+
+@dataclass
+class EagerKeyword:
+    """Layout anterior de Keyword: dataclass com contexto copiado."""
+    text: str
+    type: KeywordType
+    position: int
+    length: int
+    confidence: float = 1.0
+    context: str = ""
+
+
+def to_eager(chunk_keywords_list):
+    """Converte para o layout anterior, materializando cada contexto."""
+    return [
+        ChunkKeywords(
+            chunk_text=ck.chunk_text,
+            chunk_index=ck.chunk_index,
+            keywords=[
+                EagerKeyword(kw.text, kw.type, kw.position, kw.length,
+                             kw.confidence, kw.context)
+                for kw in ck.keywords
+            ],
+            priority_score=ck.priority_score,
+            has_composite_keywords=ck.has_composite_keywords,
+            legal_references_count=ck.legal_references_count
+        )
+        for ck in chunk_keywords_list
+    ]
+
+
+def retained(build):
+    """Memória retida (bytes) pelo resultado de build(), excluindo os chunks."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--copies', type=int, default=10,
+                        help='Repetições do corpus (simula documentos maiores)')
+    args = parser.parse_args()
+
+    detector = KeywordDetector()
+    chunks = load_chunks() * args.copies
+
+    compact, compact_bytes = retained(lambda: detector.process_document_chunks(chunks))
+    _, eager_bytes = retained(lambda: to_eager(compact))
+    keywords = sum(len(ck.keywords) for ck in compact)
+
+    print(f"Corpus: {len(chunks)} chunks, {keywords} keywords")
+    print(f"{'Dataclass + contexto copiado':<30} {eager_bytes / 1e6:8.2f} MB  {eager_bytes / keywords:6.0f} B/keyword")
+    print(f"{'Slots + contexto sob demanda':<30} {compact_bytes / 1e6:8.2f} MB  {compact_bytes / keywords:6.0f} B/keyword")
+    print(f"Redução: {1 - compact_bytes / eager_bytes:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark da extração de keywords por padrão (KeywordDetector).
+
+Compara a execução de cada padrão regex em sequência, um KeywordType por vez,
+com a varredura única do PatternKeywordEngine, usando o texto das minutas
+LUOS e Plano Diretor da knowledgebase dividido em chunks de ~1000 caracteres
+e um corpus sintético denso em citações legais (onde uma regressão dos
+padrões de LEGAL_REFERENCE para finditer aparece).
+
+Uso:
+    python scripts/benchmarks/bench_keyword_patterns.py [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'backend', 'supabase', 'functions', 'shared'))
+
+from keywords_detector import KeywordDetector, KeywordType
+
+CORPUS_FILES = [
+    'docs/knowledgebase/knowledgebase_chunks/chunks_juridicos/PDPOA2025-Minuta_Preliminar_LUOS/PDPOA2025-Minuta_Preliminar_LUOS_completo.md',
+    'docs/knowledgebase/knowledgebase_chunks/chunks_juridicos/PDPOA2025-Minuta_Preliminar_PLANO_DIRETOR/PDPOA2025-Minuta_Preliminar_PLANO_DIRETOR_completo.md',
+]
+
+
+def load_chunks(chunk_size: int = 1000):
+    """Carrega as minutas e divide em chunks de tamanho fixo."""
+    chunks = []
+    for relative_path in CORPUS_FILES:
+        with open(os.path.join(ROOT, relative_path), encoding='utf-8') as f:
+            text = f.read()
+        chunks.extend(text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+    return chunks
+
+
+LEGAL_CITATIONS = [
+    "LC 434/99", "Lei Complementar nº 434 de 1999", "Lei Complementar nº 646, de 22 de julho de 2010",
+    "Lei nº 8.267/1998", "Decreto nº 18.623/2014", "Resolução nº 12", "Portaria nº 5/2020",
+]
+
+
+def legal_citation_chunks(count: int = 400, chunk_size: int = 1000, seed: int = 19):
+    """Chunks sintéticos com várias citações legais cada, mais texto comum."""
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(count):
+        parts = []
+        while sum(len(part) + 1 for part in parts) < chunk_size:
+            parts.append(f"conforme {rng.choice(LEGAL_CITATIONS)}, observado o cálculo do bloco {rng.randint(1, 99)}.")
+        chunks.append(" ".join(parts)[:chunk_size])
+    return chunks
+
+
+def per_type_scan(detector, chunk):
+    """Caminho anterior: um extract_pattern_keywords por KeywordType."""
+    keywords = []
+    for keyword_type in KeywordType:
+        if keyword_type != KeywordType.COMPOSITE:
+            keywords.extend(detector.extract_pattern_keywords(chunk, keyword_type))
+    return keywords
+
+
+def single_scan(detector, chunk):
+    """Caminho novo: todos os tipos em uma única varredura."""
+    return detector.extract_all_pattern_keywords(chunk)
+
+
+def run(fn, detector, chunks, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for chunk in chunks:
+            fn(detector, chunk)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    detector = KeywordDetector()
+    engine = detector.pattern_engine
+    fallback = [engine.entries[index][0].value for index in engine._fallback]
+    print(f"Padrões sem prefixo literal (finditer): {len(fallback)} {fallback}")
+
+    for name, chunks in (("Minutas", load_chunks()), ("Citações legais", legal_citation_chunks())):
+        total_chars = sum(len(c) for c in chunks)
+
+        # Garante que os dois caminhos produzem as mesmas keywords
+        for chunk in chunks:
+            expected = [(k.text, k.type, k.position) for k in per_type_scan(detector, chunk)]
+            actual = [(k.text, k.type, k.position) for k in single_scan(detector, chunk)]
+            assert expected == actual, f"Divergência no chunk: {chunk[:80]!r}"
+
+        print(f"\nCorpus {name}: {len(chunks)} chunks, {total_chars / 1e3:.0f}k caracteres")
+        baseline = run(per_type_scan, detector, chunks, args.repeat)
+        optimized = run(single_scan, detector, chunks, args.repeat)
+
+        for label, elapsed in (("Por tipo (N varreduras)", baseline), ("Varredura única", optimized)):
+            print(f"{label:<26} {elapsed * 1e3:8.1f} ms  {len(chunks) / elapsed:10.0f} chunks/s")
+        print(f"Speedup: {baseline / optimized:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de recall x latência do índice vetorial (VectorIndex).
+
+Gera embeddings sintéticos agrupados (centros aleatórios mais ruído, como os
+chunks de um mesmo tema) e compara a busca aproximada IVF, para vários valores
+de nprobe, com a busca exata por força bruta: recall@k em relação à força
+bruta e latência média por query.
+
+Uso:
+    python scripts/benchmarks/bench_vector_index.py [--vectors 5000] [--dim 384]
+        [--queries 50] [--k 10] [--snapshot /tmp/vector_index.bin]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'backend', 'supabase', 'functions', 'shared'))
+
+from vector_index import NUMPY_AVAILABLE, VectorIndex
+
+
+def synthetic_vectors(count, dim, clusters, noise=2.5, seed=42):
+    """Vetores em torno de `clusters` centros, com ruído gaussiano."""
+    rng = random.Random(seed)
+    centers = [[rng.gauss(0, 1) for _ in range(dim)] for _ in range(clusters)]
+    vectors = []
+    for _ in range(count):
+        center = centers[rng.randrange(clusters)]
+        vectors.append([value + rng.gauss(0, noise) for value in center])
+    return vectors
+
+
+def timed_search(index, queries, k, **kwargs):
+    started = time.perf_counter()
+    results = [
+        [row['chunk_index'] for _, row in index.search(query, k, **kwargs)]
+        for query in queries
+    ]
+    return results, (time.perf_counter() - started) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vectors', type=int, default=5000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--clusters', type=int, default=50)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--lists', type=int, default=None, help='Listas do IVF (padrão: raiz de N)')
+    parser.add_argument('--snapshot', default=None, help='Também mede gravação/carga do snapshot')
+    args = parser.parse_args()
+
+    print(f"Backend: {'numpy' if NUMPY_AVAILABLE else 'python puro'}")
+    vectors = synthetic_vectors(args.vectors + args.queries, args.dim, args.clusters)
+    queries = vectors[args.vectors:]
+
+    index = VectorIndex()
+    for i, vector in enumerate(vectors[:args.vectors]):
+        index.add(vector, {'document_id': f"doc-{i % 20}", 'chunk_index': i})
+
+    started = time.perf_counter()
+    index.build_ivf(args.lists)
+    print(f"IVF: {len(index.lists)} listas construídas em {time.perf_counter() - started:.2f}s")
+
+    if args.snapshot:
+        started = time.perf_counter()
+        index.save(args.snapshot)
+        saved = time.perf_counter() - started
+        started = time.perf_counter()
+        index = VectorIndex.load(args.snapshot)
+        print(f"Snapshot: gravado em {saved:.2f}s, carregado em {time.perf_counter() - started:.2f}s "
+              f"({os.path.getsize(args.snapshot) / 1024 / 1024:.1f} MB)")
+
+    exact, exact_ms = timed_search(index, queries, args.k, exact=True)
+    print(f"\n{'modo':<14} {'recall@' + str(args.k):>10} {'ms/query':>10} {'speedup':>9}")
+    print(f"{'força bruta':<14} {1.0:>10.3f} {exact_ms:>10.2f} {1.0:>8.1f}x")
+
+    nprobe = 1
+    while nprobe <= len(index.lists):
+        approx, approx_ms = timed_search(index, queries, args.k, nprobe=nprobe)
+        hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact))
+        recall = hits / sum(len(e) for e in exact)
+        print(f"{'ivf nprobe=' + str(nprobe):<14} {recall:>10.3f} {approx_ms:>10.2f} "
+              f"{exact_ms / approx_ms:>8.1f}x")
+        nprobe *= 2
+
+
+if __name__ == '__main__':
+    main()
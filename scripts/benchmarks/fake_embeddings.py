@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Provedor de embeddings falso para medir a ingestão offline.
+
+Imita a interface assíncrona do cliente OpenAI usada pelo EmbeddingGenerator
+(``client.embeddings.create(input=..., model=...)``) e simula a latência de
+rede: um custo fixo por requisição mais um custo por token. Os vetores são
+determinísticos (derivados do hash do texto), então execuções repetidas
+geram os mesmos embeddings.
+
+Também registra os lotes recebidos e o pico de requisições simultâneas, e
+pode falhar as requisições que contêm um texto escolhido (``fail_if``), para
+os testes da ingestão.
+"""
+
+import asyncio
+import hashlib
+import random
+from types import SimpleNamespace
+from typing import Callable, List, Optional, Union
+
+
+class FakeEmbeddings:
+    def __init__(self, dimension: int, request_latency_ms: float, token_latency_ms: float,
+                 max_concurrency: int, fail_if: Optional[Callable[[str], bool]] = None):
+        self.dimension = dimension
+        self.request_latency_ms = request_latency_ms
+        self.token_latency_ms = token_latency_ms
+        # Limite de requisições simultâneas do "servidor"; as demais esperam
+        self._server = asyncio.Semaphore(max_concurrency)
+        self.fail_if = fail_if
+        self.requests = 0
+        self.inputs = 0
+        # Inputs de cada requisição concluída, e pico de requisições em andamento
+        self.batches: List[List[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        return [rng.uniform(-1.0, 1.0) for _ in range(self.dimension)]
+
+    async def create(self, input: Union[str, List[str]], model: str):
+        texts = [input] if isinstance(input, str) else list(input)
+        tokens = sum(len(text) // 4 + 1 for text in texts)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            async with self._server:
+                await asyncio.sleep((self.request_latency_ms + tokens * self.token_latency_ms) / 1000)
+        finally:
+            self.in_flight -= 1
+        if self.fail_if is not None and any(self.fail_if(text) for text in texts):
+            raise RuntimeError("Fake embeddings request failed")
+        self.requests += 1
+        self.inputs += len(texts)
+        self.batches.append(texts)
+        return SimpleNamespace(
+            data=[SimpleNamespace(index=i, embedding=self._vector(text)) for i, text in enumerate(texts)],
+            model=model
+        )
+
+
+class FakeEmbeddingProvider:
+    """Cliente falso com o atributo ``embeddings`` do AsyncOpenAI."""
+
+    def __init__(self, dimension: int = 1536, request_latency_ms: float = 150.0,
+                 token_latency_ms: float = 0.002, max_concurrency: int = 16,
+                 fail_if: Optional[Callable[[str], bool]] = None):
+        self.embeddings = FakeEmbeddings(dimension, request_latency_ms, token_latency_ms,
+                                         max_concurrency, fail_if)
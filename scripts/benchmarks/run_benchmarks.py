@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Suíte de benchmarks dos caminhos críticos de chunking e detecção de keywords.
+
+Roda offline sobre o corpus sintético (synthetic_corpus.py) em vários
+tamanhos e mede, para cada operação, throughput, latência p50/p99 e pico de
+memória (tracemalloc). Os resultados podem ser salvos como baseline em JSON
+e comparados com execuções posteriores para detectar regressões.
+
+Operações medidas:
+    chunk_text               TextProcessor.chunk_text, por documento de 100 chunks
+    extract_all_keywords     KeywordDetector.extract_all_keywords, por chunk
+    process_document_chunks  KeywordDetector.process_document_chunks, por documento
+    process_document_chunks_large_serial
+    process_document_chunks_large_parallel
+                             process_document_chunks em documentos acima de
+                             PARALLEL_MIN_CHUNKS, com workers=1 e com o pool
+                             compartilhado (--workers processos), lado a lado
+    filter_chunks_by_query   filter_chunks_by_query, por requisição de 20 chunks
+    bm25_search              BM25Index.search sobre todo o corpus, por query
+    search_suggestions       SuggestionIndex.suggest, por tecla digitada nas queries
+
+Uso:
+    python scripts/benchmarks/run_benchmarks.py --sizes 1000,10000,100000 --output atual.json
+    python scripts/benchmarks/run_benchmarks.py --save-baseline baseline.json
+    python scripts/benchmarks/run_benchmarks.py --baseline baseline.json --tolerance 0.15
+    python scripts/benchmarks/run_benchmarks.py --only process_document_chunks_large_serial,process_document_chunks_large_parallel --workers 4
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+FUNCTIONS_DIR = os.path.join(ROOT, 'backend', 'supabase', 'functions')
+sys.path.append(os.path.join(FUNCTIONS_DIR, 'shared'))
+sys.path.append(os.path.dirname(__file__))
+
+import keywords_detector
+from keywords_detector import PARALLEL_MIN_CHUNKS, KeywordDetector, filter_chunks_by_query, get_chunk_keywords_cache
+from bm25_index import BM25Index
+from process_pool import process_pool_size
+from search_suggestions import COMMON_PATTERNS, SuggestionIndex
+from synthetic_corpus import QUERIES, generate_chunks
+
+CHUNKS_PER_DOCUMENT = 100
+# Documentos grandes o bastante para process_document_chunks usar o pool
+LARGE_DOCUMENT_CHUNKS = 2 * PARALLEL_MIN_CHUNKS
+CHUNKS_PER_REQUEST = 20
+BM25_QUERIES = 200
+
+# Cada benchmark recebe os chunks do corpus e devolve (itens processados, operações);
+# cada operação é um callable cuja duração vira uma amostra de latência.
+Benchmark = Callable[[List[str]], Tuple[int, List[Callable[[], object]]]]
+
+
+def _documents(chunks: List[str]) -> List[List[str]]:
+    return [chunks[i:i + CHUNKS_PER_DOCUMENT] for i in range(0, len(chunks), CHUNKS_PER_DOCUMENT)]
+
+
+def _load_text_processor():
+    """Importa TextProcessor de process-document (requer as dependências da função)."""
+    sys.path.append(os.path.join(FUNCTIONS_DIR, 'process-document'))
+    try:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(
+            'process_document_index', os.path.join(FUNCTIONS_DIR, 'process-document', 'index.py')
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.TextProcessor
+    except ImportError as e:
+        print(f"Skipping chunk_text: process-document dependencies not installed ({e})")
+        return None
+
+
+def bench_chunk_text(chunks: List[str]):
+    text_processor = _load_text_processor()
+    if text_processor is None:
+        return None
+    texts = [" ".join(document) for document in _documents(chunks)]
+    return len(chunks), [lambda text=text: text_processor.chunk_text(text) for text in texts]
+
+
+def bench_extract_all_keywords(chunks: List[str]):
+    detector = KeywordDetector()
+    return len(chunks), [lambda chunk=chunk: detector.extract_all_keywords(chunk) for chunk in chunks]
+
+
+def bench_process_document_chunks(chunks: List[str], workers: int = 1):
+    detector = KeywordDetector()
+    return len(chunks), [
+        lambda document=document: detector.process_document_chunks(document, workers=workers)
+        for document in _documents(chunks)
+    ]
+
+
+def _large_documents(chunks: List[str]) -> List[List[str]]:
+    # Corpus menor que um documento grande é repetido até o tamanho mínimo
+    if len(chunks) < LARGE_DOCUMENT_CHUNKS:
+        return [[chunks[i % len(chunks)] for i in range(LARGE_DOCUMENT_CHUNKS)]]
+    return [chunks[i:i + LARGE_DOCUMENT_CHUNKS]
+            for i in range(0, len(chunks) - LARGE_DOCUMENT_CHUNKS + 1, LARGE_DOCUMENT_CHUNKS)]
+
+
+def bench_process_document_chunks_large(chunks: List[str], workers: int):
+    detector = KeywordDetector()
+    documents = _large_documents(chunks)
+    if workers != 1:
+        # Sobe o pool compartilhado fora da medição
+        detector.process_document_chunks(documents[0][:PARALLEL_MIN_CHUNKS], workers=workers)
+    return sum(len(document) for document in documents), [
+        lambda document=document: detector.process_document_chunks(document, workers=workers)
+        for document in documents
+    ]
+
+
+def bench_filter_chunks_by_query(chunks: List[str]):
+    # Requisições com popularidade concentrada (poucos chunks muito frequentes),
+    # começando com o cache frio
+    get_chunk_keywords_cache().clear()
+    rng = random.Random(7)
+    requests = []
+    for i in range(max(1, len(chunks) // CHUNKS_PER_REQUEST)):
+        context = [chunks[min(len(chunks) - 1, int(rng.paretovariate(1.2)) - 1)]
+                   for _ in range(CHUNKS_PER_REQUEST)]
+        requests.append((context, QUERIES[i % len(QUERIES)]))
+    return len(requests), [
+        lambda context=context, query=query: filter_chunks_by_query(context, query)
+        for context, query in requests
+    ]
+
+
+def bench_bm25_search(chunks: List[str]):
+    # A indexação fica fora da medição; mede-se só a consulta
+    index = BM25Index()
+    for i, document in enumerate(_documents(chunks)):
+        index.update_document(f"doc-{i}", [
+            {"content_chunk": chunk, "chunk_index": j} for j, chunk in enumerate(document)
+        ])
+    queries = [QUERIES[i % len(QUERIES)] for i in range(BM25_QUERIES)]
+    return len(queries), [lambda query=query: index.search(query, 20) for query in queries]
+
+
+def bench_search_suggestions(chunks: List[str]):
+    # Um "log de perguntas" por chunk (início do texto) com popularidade
+    # aleatória; a montagem do índice fica fora da medição
+    rng = random.Random(42)
+    index = SuggestionIndex()
+    index.set_source("keywords", KeywordDetector().composite_keywords.items())
+    index.set_source("patterns", ((pattern, 1.0) for pattern in COMMON_PATTERNS))
+    index.set_source("queries", ((chunk[:60], rng.randrange(1000)) for chunk in chunks))
+    index.suggest("a")
+
+    keystrokes = [query[:length] for query in QUERIES for length in range(1, len(query) + 1)]
+    return len(keystrokes), [lambda prefix=prefix: index.suggest(prefix) for prefix in keystrokes]
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "chunk_text": bench_chunk_text,
+    "extract_all_keywords": bench_extract_all_keywords,
+    "process_document_chunks": bench_process_document_chunks,
+    "process_document_chunks_large_serial":
+        lambda chunks: bench_process_document_chunks_large(chunks, workers=1),
+    "process_document_chunks_large_parallel":
+        lambda chunks: bench_process_document_chunks_large(chunks, workers=0),
+    "filter_chunks_by_query": bench_filter_chunks_by_query,
+    "bm25_search": bench_bm25_search,
+    "search_suggestions": bench_search_suggestions,
+}
+
+
+def _percentile(samples: List[float], percentile: float) -> float:
+    ordered = sorted(samples)
+    position = min(len(ordered) - 1, max(0, round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[position]
+
+
+def run_benchmark(benchmark: Benchmark, chunks: List[str], measure_memory: bool,
+                  repeat: int = 1) -> Optional[Dict]:
+    """Executa um benchmark e devolve suas métricas (None se não puder rodar)."""
+    elapsed = float('inf')
+    for _ in range(max(1, repeat)):
+        prepared = benchmark(chunks)
+        if prepared is None:
+            return None
+        items, operations = prepared
+
+        # Mantém a repetição mais rápida, a menos afetada por ruído da máquina
+        run_latencies = []
+        started = time.perf_counter()
+        for operation in operations:
+            start = time.perf_counter()
+            operation()
+            run_latencies.append(time.perf_counter() - start)
+        run_elapsed = time.perf_counter() - started
+        if run_elapsed < elapsed:
+            elapsed, latencies = run_elapsed, run_latencies
+
+    peak_memory = None
+    if measure_memory:
+        # Segunda passada, instrumentada, só para o pico de memória
+        _, operations = benchmark(chunks)
+        tracemalloc.start()
+        for operation in operations:
+            operation()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "items": items,
+        "operations": len(operations),
+        "elapsed_s": elapsed,
+        "throughput_per_s": items / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1e3,
+        "p99_ms": _percentile(latencies, 99) * 1e3,
+        "peak_memory_mb": peak_memory / 1e6 if peak_memory is not None else None,
+    }
+
+
+def run_suite(sizes: List[int], names: List[str], measure_memory: bool, repeat: int = 1) -> Dict:
+    results: Dict[str, Dict[str, Dict]] = {name: {} for name in names}
+    for size in sizes:
+        chunks = generate_chunks(size)
+        for name in names:
+            metrics = run_benchmark(BENCHMARKS[name], chunks, measure_memory, repeat)
+            if metrics is None:
+                continue
+            results[name][str(size)] = metrics
+            memory = f"{metrics['peak_memory_mb']:8.1f} MB" if metrics['peak_memory_mb'] is not None else ""
+            print(f"{name:<40} {size:>7} chunks  {metrics['throughput_per_s']:10.0f} itens/s  "
+                  f"p50 {metrics['p50_ms']:8.3f} ms  p99 {metrics['p99_ms']:8.3f} ms  {memory}")
+
+        serial = results.get("process_document_chunks_large_serial", {}).get(str(size))
+        parallel = results.get("process_document_chunks_large_parallel", {}).get(str(size))
+        if serial and parallel:
+            print(f"{'  workers=1 vs workers=' + str(process_pool_size()):<40} {size:>7} chunks  "
+                  f"{serial['elapsed_s']:8.3f} s vs {parallel['elapsed_s']:8.3f} s  "
+                  f"({serial['elapsed_s'] / max(parallel['elapsed_s'], 1e-12):.2f}x)")
+
+    return {
+        "meta": {
+            "generated_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "repeat": repeat,
+            "keywords_detector": os.path.relpath(keywords_detector.__file__, ROOT),
+            "process_workers": process_pool_size(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Lista regressões de throughput/p50 acima da tolerância em relação ao baseline."""
+    regressions = []
+    for name, by_size in current["results"].items():
+        for size, metrics in by_size.items():
+            reference = baseline.get("results", {}).get(name, {}).get(size)
+            if not reference:
+                continue
+            throughput_ratio = metrics["throughput_per_s"] / max(reference["throughput_per_s"], 1e-12)
+            p50_ratio = metrics["p50_ms"] / max(reference["p50_ms"], 1e-12)
+            p99_ratio = metrics["p99_ms"] / max(reference["p99_ms"], 1e-12)
+            print(f"{name:<40} {size:>7} chunks  throughput {throughput_ratio:6.2f}x  "
+                  f"p50 {p50_ratio:6.2f}x  p99 {p99_ratio:6.2f}x")
+            # p99 é reportado mas não reprova: em execuções curtas ele é dominado por ruído
+            if throughput_ratio < 1 - tolerance:
+                regressions.append(f"{name}@{size}: throughput {throughput_ratio:.2f}x do baseline")
+            if p50_ratio > 1 + tolerance:
+                regressions.append(f"{name}@{size}: p50 {p50_ratio:.2f}x do baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='Tamanhos do corpus em chunks, separados por vírgula')
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help='Benchmarks a executar, separados por vírgula')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Repetições por benchmark (vale a mais rápida)')
+    parser.add_argument('--no-memory', action='store_true', help='Não mede pico de memória')
+    parser.add_argument('--workers', type=int,
+                        help='Processos do pool compartilhado (INGESTION_PROCESS_WORKERS)')
+    parser.add_argument('--output', help='Salva os resultados desta execução em JSON')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Salva os resultados como baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='Compara com um baseline salvo')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Variação tolerada antes de acusar regressão (0.15 = 15%%)')
+    args = parser.parse_args()
+
+    if args.workers is not None:
+        os.environ["INGESTION_PROCESS_WORKERS"] = str(args.workers)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    names = [name for name in args.only.split(',') if name]
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Benchmarks desconhecidos: {', '.join(sorted(unknown))}")
+
+    current = run_suite(sizes, names, measure_memory=not args.no_memory, repeat=args.repeat)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2, ensure_ascii=False)
+        print(f"Resultados salvos em {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressões detectadas:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\nNenhuma regressão acima da tolerância.")
+
+
+if __name__ == '__main__':
+    main()
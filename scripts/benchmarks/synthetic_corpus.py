@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Gerador determinístico de corpus sintético no estilo das minutas do Plano Diretor.
+
+Produz artigos com a mesma mistura de termos que o KeywordDetector procura
+(keywords compostas, ZOTs, leis, anexos, distritos e termos ambientais)
+intercalados com texto comum, para benchmarks offline reprodutíveis.
+"""
+
+import random
+from typing import List
+
+SUBJECTS = [
+    "Os empreendimentos", "As edificações", "Os lotes", "Os projetos", "As atividades",
+    "Os imóveis", "As áreas públicas", "Os parcelamentos do solo", "As intervenções urbanas",
+]
+
+VERBS = [
+    "devem observar", "atenderão", "respeitarão", "deverão cumprir", "seguirão",
+    "terão como referência", "consideram",
+]
+
+TOPICS = [
+    "a altura máxima definida para a zona", "o coeficiente de aproveitamento básico",
+    "a taxa de ocupação prevista no regime urbanístico", "o índice de permeabilidade mínimo",
+    "o estudo de impacto de vizinhança", "a certificação em sustentabilidade ambiental",
+    "as áreas de preservação permanente", "o limite de altura da ZOT {zot}",
+    "a ZOT {zot} descrita no Anexo {annex}", "o {district}º Distrito",
+    "a Lei Complementar nº {law} de {year}", "o Decreto nº {decree}",
+    "o sistema viário estrutural", "o patrimônio histórico cultural",
+    "o licenciamento ambiental", "a área de proteção ambiental", "a Tabela {annex}",
+    "os recursos hídricos da bacia", "a zona {zone} do zoneamento urbano",
+]
+
+FILLER = [
+    "conforme regulamento específico", "nos termos desta Lei", "observadas as diretrizes municipais",
+    "mediante análise do órgão competente", "sem prejuízo das demais exigências",
+    "garantida a função social da propriedade", "de acordo com o Plano Diretor",
+]
+
+
+def _sentence(rng: random.Random) -> str:
+    topic = rng.choice(TOPICS).format(
+        zot=f"{rng.randint(1, 16):02d}" + (f".{rng.randint(1, 4)}" if rng.random() < 0.5 else ""),
+        annex=f"{rng.randint(1, 14)}.{rng.randint(1, 6)}",
+        district=rng.randint(1, 6),
+        law=rng.choice(["434", "646", "312", "9.988"]),
+        year=rng.choice(["1999", "2010", "2024"]),
+        decree=f"{rng.randint(10, 22)}.{rng.randint(100, 999)}",
+        zone=rng.randint(1, 20),
+    )
+    return f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {topic}, {rng.choice(FILLER)}."
+
+
+def generate_article(rng: random.Random, number: int, target_size: int = 950) -> str:
+    """Gera um artigo com aproximadamente ``target_size`` caracteres."""
+    parts = [f"Art. {number}."]
+    size = len(parts[0])
+    while size < target_size:
+        sentence = _sentence(rng)
+        parts.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(parts)
+
+
+def generate_chunks(count: int, seed: int = 42, target_size: int = 950) -> List[str]:
+    """Gera ``count`` chunks (um artigo cada) de forma reprodutível."""
+    rng = random.Random(seed)
+    return [generate_article(rng, i + 1, target_size) for i in range(count)]
+
+
+def generate_document(chunk_count: int, seed: int = 42) -> str:
+    """Gera o texto completo de um documento com ~``chunk_count`` chunks de 1000 caracteres."""
+    return " ".join(generate_chunks(chunk_count, seed=seed))
+
+
+QUERIES = [
+    "Qual a altura máxima na ZOT 08.2?",
+    "O que diz a Lei Complementar nº 434 de 1999?",
+    "Quais são as regras do 4º Distrito?",
+    "Como funciona a certificação em sustentabilidade ambiental?",
+    "Qual o coeficiente de aproveitamento no Anexo 13.4?",
+    "Onde exige estudo de impacto de vizinhança?",
+    "taxa de ocupação",
+    "áreas de preservação permanente",
+]